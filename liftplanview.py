@@ -1,12 +1,28 @@
-from nicegui import ui, observables, events
+from nicegui import ui, observables, events, app
+from fastapi import Response, HTTPException
+from fastapi.responses import StreamingResponse
 from pathlib import Path
-from pyweaving.wif import WIFReader, Draft
+from pyweaving import Draft
+from pyweaving.lint import WIFLinter
+from pyweaving.formats import (load_draft as parse_draft, format_for_filename,
+                               split_compression, sniff_format, write_bytes,
+                               read_bytes)
 import sqlite3
 import hashlib
-from PIL import Image, ImageDraw, ImageFont
-import io
+from PIL import Image, ImageDraw
 import base64
-from pyweaving.render import ImageRenderer
+import io
+from threading import Lock
+from pyweaving.arrays import DraftArrays
+from pyweaving.render import ArrayImageRenderer, CompactSVGRenderer, side_names
+from pyweaving.tiles import TileRenderer
+from pyweaving.fabric import FabricRenderer
+from pyweaving.floats import FloatRenderer
+from pyweaving.cache import RenderCache
+from pyweaving.fonts import get_atlas
+from pyweaving.images import encode_image
+from pyweaving.pages import PageRenderer, paper_sizes
+from pyweaving.thumbs import make_thumbnails, read_index, index_name
 from datetime import datetime
 
 
@@ -19,6 +35,25 @@ DB_PATH = Path("db")
 DB_PATH.mkdir(exist_ok=True)
 DB_FILE = DB_PATH / "index_store.db"
 
+# Rendered images are cached by draft content, so revisiting a view is instant
+CACHE_PATH = Path("cache")
+render_cache = RenderCache(directory=str(CACHE_PATH))
+
+# Drawdown thumbnails of the uploads, remade only when a file changes. Kept
+# apart from the render cache, which owns every file in its directory.
+THUMBS_PATH = Path("thumbs")
+thumbnails = {}
+# Held while thumbnails are remade, so requests never write the same file
+thumbnails_lock = Lock()
+
+# Number of picks shown either side of the current one in the lift plan view
+LIFT_PLAN_WINDOW = 20
+
+# Largest scale and image size requested renders are clamped to, so a single
+# request can't allocate an arbitrarily large image
+MAX_RENDER_SCALE = 40
+MAX_RENDER_PIXELS = 8192
+
 
 # File selection section
 select : ui.select
@@ -28,6 +63,8 @@ selected_file = None
 working_file = None
 weft_index = 1
 curr_file_hash = None
+tile_renderer = None
+draft_arrays = None
 
 
 
@@ -41,8 +78,17 @@ def get_file_list():
     global file_list
     file_list.clear()  # Clear the existing list
     for f in UPLOAD_FOLDER.iterdir():
-        if f.suffix == ".wif":
+        if format_for_filename(f.name):
             file_list.append(f.name)
+    update_thumbnails()
+
+def update_thumbnails():
+    """Make thumbnails of new or changed uploads, and load their index."""
+    global thumbnails
+    # Unchanged uploads are skipped, so this only costs a hash per file.
+    with thumbnails_lock:
+        make_thumbnails([str(UPLOAD_FOLDER)], str(THUMBS_PATH), workers=1)
+        thumbnails = read_index(str(THUMBS_PATH))['thumbnails']
 
 def select_file(filename):
     """Select a file from the list."""
@@ -52,6 +98,7 @@ def select_file(filename):
     global weft_index
     selected_file = filename
     working_file = None
+    thumbnail_image.set_source(thumbnails.get(filename, {}).get('image', ''))
     weft_index = 0
     
     #ui.notify(f'Selected file: {selected_file}')
@@ -155,7 +202,7 @@ def get_saved_index(file_hash):
 
 def load_draft(file_path):
     """Load the draft from the file."""
-    return WIFReader(file_path).read()
+    return parse_draft(file_path)
 
 # Load button functionality
 def load_file():
@@ -164,11 +211,15 @@ def load_file():
     global working_file
     global weft_index
     global curr_file_hash
+    global tile_renderer
+    global draft_arrays
     if selected_file:
         file_path = UPLOAD_FOLDER / selected_file
         try:
             # Load the draft
             draft = load_draft(str(file_path))
+            tile_renderer = None
+            draft_arrays = None
 
             # Generate file hash for persistence
             file_hash = get_file_hash(file_path)
@@ -249,12 +300,11 @@ def draw_weft_lift(index, textcolor="black", caption=None):
     im = Image.new("RGB", (boxwidth, boxheight), (255, 255, 255))
     next_draw = ImageDraw.Draw(im)
                 
-    # Load a font for the text
-    font_size = int(next_square_size * 0.7)  # Font size to fill most of the box
-    try:
-        font = ImageFont.truetype("arial12.ttf", font_size)  # Use a system font
-    except IOError:
-        font = ImageFont.load_default(size=font_size)  # Fallback to default font if "arial.ttf" is not available
+    # Font size to fill most of the box. Fonts are loaded once per process,
+    # falling back to the default font if "arial12.ttf" is not available.
+    font_size = int(next_square_size * 0.7)
+    atlas = get_atlas("arial12.ttf", font_size, fallback=True)
+    font = atlas.font
 
     # Draw the color bar
     color_x0 = padding
@@ -281,7 +331,7 @@ def draw_weft_lift(index, textcolor="black", caption=None):
 
         if i + 1 in next_selected_weft:
             text = str(i + 1)
-            text_bbox = font.getbbox(text)
+            text_bbox = atlas.bbox(text)
             text_width = text_bbox[2] - text_bbox[0]
             text_height = text_bbox[3] - text_bbox[1]
             text_x = x0 + (next_square_size - text_width) // 2
@@ -302,9 +352,7 @@ def genLiftCard(index, textcolor="black", caption=''):
     #im.show()
 
     # Convert the image to a format that can be displayed in NiceGUI
-    buffered = io.BytesIO()
-    im.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
+    img_str = base64.b64encode(encode_image(im, "png", compress_level=1)).decode()
 
     newcard = ui.card().tight().style('width: 80%;')
     with newcard:
@@ -373,18 +421,18 @@ def render_lift_plan():
 
     # Clear existing cards
     clear_cards()
-    renderer = ImageRenderer(draft, scale=100)
-    bufferspace = (len(str(len(draft.weft))) * 50)
-    width = 60 + bufferspace + renderer.pixels_per_square * len(draft.shafts)
-    height = 6 + renderer.pixels_per_square * len(draft.weft)
-    im = Image.new("RGB", (width, height), (255, 255, 255))
-    draw = ImageDraw.Draw(im)
-    renderer.paint_liftplan(draw)
-    buffered = io.BytesIO()
-    im.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-
-    caption = f"Lift Plan for in {working_file}"
+    # Only render the picks around the current one, so long drafts are as
+    # quick to show as short ones. Pick numbers stay absolute.
+    first_pick = max(0, weft_index - 1 - LIFT_PLAN_WINDOW)
+    last_pick = min(len(draft.weft), weft_index + LIFT_PLAN_WINDOW)
+    png = render_cache.render(draft, ArrayImageRenderer,
+                              region={'ends': slice(0, 0),
+                                      'picks': slice(first_pick, last_pick),
+                                      'panels': ['liftplan']},
+                              liftplan=True, scale=100, margin_pixels=0)
+    img_str = base64.b64encode(png).decode()
+
+    caption = f"Lift Plan for in {working_file} (picks {first_pick + 1}-{last_pick})"
     newcard = ui.card().tight().style('width: 80%;')
     with lift_plan_container:
         with ui.row().classes('w-full justify-center items-center'):
@@ -434,12 +482,8 @@ def render_design():
 
     # Clear existing cards
     clear_cards()
-    renderer = ImageRenderer(draft)
-    im = renderer.make_pil_image()
-    draw = ImageDraw.Draw(im)
-    buffered = io.BytesIO()
-    im.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
+    png = render_cache.render(draft, ArrayImageRenderer)
+    img_str = base64.b64encode(png).decode()
 
     caption = f"Rendered design for in {working_file}"
     with lift_plan_container:
@@ -449,6 +493,113 @@ def render_design():
                 ui.image(f'data:image/png;base64,{img_str}').style('width: 100%;')
                 
 
+def get_tile_renderer():
+    """Return the tile renderer for the loaded draft, creating it on first use."""
+    global tile_renderer
+    if not working_file:
+        raise HTTPException(status_code=404, detail='No draft loaded')
+    if tile_renderer is None:
+        tile_renderer = TileRenderer(draft)
+    return tile_renderer
+
+def get_draft_arrays():
+    """Return the DraftArrays of the loaded draft, creating them on first use."""
+    global draft_arrays
+    if draft_arrays is None:
+        draft_arrays = DraftArrays(draft)
+    return draft_arrays
+
+def clamp_scale(scale, proportional=False):
+    """Clamp a requested pixels-per-square scale to what the loaded draft can be rendered at."""
+    arrays = get_draft_arrays()
+    scale = max(1, min(scale, MAX_RENDER_SCALE))
+    while scale > 1:
+        # With proportional spacing, threads can be much wider than a square.
+        x_edges, y_edges = arrays.edges(scale, proportional)
+        size = max(x_edges[-1], y_edges[-1])
+        if size <= MAX_RENDER_PIXELS:
+            break
+        scale = max(1, min(scale - 1, scale * MAX_RENDER_PIXELS // size))
+    return scale
+
+def tile_response(render_tile, *args):
+    """Render one tile of the loaded draft as a PNG response, cached."""
+    renderer = get_tile_renderer()
+    key = render_cache.key(draft, render_tile.__name__, region=args)
+    data = render_cache.get(key)
+    if data is None:
+        try:
+            im = render_tile(renderer, *args)
+        except IndexError:
+            raise HTTPException(status_code=404, detail='No such tile')
+        data = renderer.tile_bytes(im)
+        render_cache.put(key, data)
+    return Response(data, media_type='image/png')
+
+@app.get('/tiles/draft.dzi')
+def deepzoom_descriptor():
+    """DeepZoom descriptor for the loaded draft's drawdown, for pan and zoom viewers."""
+    return Response(get_tile_renderer().dzi(), media_type='application/xml')
+
+@app.get('/tiles/draft_files/{level}/{col}_{row}.png')
+def deepzoom_tile(level: int, col: int, row: int):
+    """Render a DeepZoom tile of the loaded draft on demand."""
+    return tile_response(TileRenderer.tile, level, col, row)
+
+@app.get('/tiles/xyz/{z}/{x}/{y}.png')
+def xyz_tile(z: int, x: int, y: int):
+    """Render an XYZ tile of the loaded draft on demand."""
+    return tile_response(TileRenderer.xyz_tile, z, x, y)
+
+@app.get('/design.svg')
+def design_svg():
+    """Stream the loaded draft as an SVG document, however large it is."""
+    if not working_file:
+        raise HTTPException(status_code=404, detail='No draft loaded')
+    renderer = CompactSVGRenderer(draft)
+    return StreamingResponse(renderer.iter_chunks(), media_type='image/svg+xml')
+
+@app.get('/fabric.png')
+def fabric_png(scale: int = 10, noise: float = 0.05, proportional: bool = False):
+    """Render the loaded draft as shaded, woven cloth, optionally to scale."""
+    if not working_file:
+        raise HTTPException(status_code=404, detail='No draft loaded')
+    png = render_cache.render(draft, FabricRenderer, scale=clamp_scale(scale, proportional), noise=noise,
+                              proportional=proportional)
+    return Response(png, media_type='image/png')
+
+@app.get('/thumbs/index.json')
+def thumbs_index():
+    """Serve the thumbnails of every upload, inline, in one response."""
+    # The index is kept up to date at startup and on upload, and replaced
+    # atomically, so it can be served as it is.
+    if not (THUMBS_PATH / index_name).exists():
+        update_thumbnails()
+    return Response((THUMBS_PATH / index_name).read_bytes(), media_type='application/json')
+
+@app.get('/floats.png')
+def floats_png(scale: int = 4, threshold: int = None, overlay: bool = False, side: str = 'face'):
+    """Render a heatmap of the loaded draft's float lengths, highlighting long floats."""
+    if not working_file:
+        raise HTTPException(status_code=404, detail='No draft loaded')
+    if side not in side_names:
+        raise HTTPException(status_code=400, detail=f'Unknown side: {side}')
+    png = render_cache.render(draft, FloatRenderer, scale=clamp_scale(scale),
+                              threshold=threshold, overlay=overlay, side=side)
+    return Response(png, media_type='image/png')
+
+@app.get('/liftplan.pdf')
+def liftplan_pdf(paper: str = 'letter', landscape: bool = False, liftplan: bool = True):
+    """Print the loaded draft's lift plan (or treadling) as a paginated PDF."""
+    if not working_file:
+        raise HTTPException(status_code=404, detail='No draft loaded')
+    if paper not in paper_sizes:
+        raise HTTPException(status_code=400, detail=f'Unknown paper size: {paper}')
+    f = io.BytesIO()
+    PageRenderer(draft, liftplan=liftplan, paper=paper,
+                 landscape=landscape).save_pdf(f)
+    return Response(f.getvalue(), media_type='application/pdf')
+
 # Function to validate and navigate to the specified weft index
 def validate_weft_input(value):
     try:
@@ -463,28 +614,51 @@ def validate_weft_input(value):
 
 
 def handle_upload(e: events.UploadEventArguments):
-    file = e.content.read()
     """Handle the file upload."""
     global selected_file
     global curr_file_hash
     global working_file
     global weft_index
-    
-    file_path = UPLOAD_FOLDER / e.name
-    
-    if file_path.suffix == '.wif':
-        
-        # Load the draft from the uploaded file
-        try:
-            with open(file_path, 'wb') as f:
-                f.write(file)
-            get_file_list()
-            ui.notify(f'File uploaded and loaded successfully: {file_path.name}')
-        except Exception as exc:
-            ui.notify(f'Error loading uploaded file: {exc}', type='negative')
-    else:
-        ui.notify('Please upload a valid .wif file.', type='negative')
-        
+
+    data = read_bytes(e.content)
+
+    # Validate WIFs up front, repairing common problems where possible, and
+    # parse the upload in memory, so only valid drafts are persisted.
+    try:
+        format = sniff_format(data)
+        if format == 'wif':
+            linter = WIFLinter(data)
+            linter.lint()
+            if linter.errors:
+                repaired = linter.repair().encode('utf-8')
+                remaining = WIFLinter(repaired)
+                remaining.lint()
+                if remaining.errors:
+                    ui.notify(f'Invalid WIF file: {remaining.errors[0]}', type='negative')
+                    return
+                ui.notify(f'Repaired {len(linter.errors)} problem(s) in the upload.', type='warning')
+                data = repaired
+        parse_draft(data)
+    except Exception as exc:
+        ui.notify(f'Please upload a valid draft file: {exc}', type='negative')
+        return
+
+    name = split_compression(Path(e.name).name)[0]
+    if not format_for_filename(name):
+        if format is None:
+            ui.notify(f'Unrecognized draft format: {e.name}', type='negative')
+            return
+        name += '.' + format
+    # Drafts are stored gzipped, they compress extremely well.
+    file_path = UPLOAD_FOLDER / (name + '.gz')
+
+    try:
+        write_bytes(str(file_path), data)
+        get_file_list()
+        ui.notify(f'File uploaded and loaded successfully: {file_path.name}')
+    except Exception as exc:
+        ui.notify(f'Error saving uploaded file: {exc}', type='negative')
+
 def home():
     """Navigate to the home screen."""
     global working_file
@@ -511,7 +685,7 @@ upload_file_dialog = ui.dialog()
 with upload_file_dialog:
     with ui.card():
         ui.label('Upload a WIF File').classes('text-lg font-bold')
-        file_input = ui.upload(multiple=False, on_upload=handle_upload).classes('w-full bg-white text-black').props('accept=.wif')
+        file_input = ui.upload(multiple=False, on_upload=handle_upload).classes('w-full bg-white text-black').props('accept=.wif,.json,.gz,.bz2,.xz,.zst')
         ui.button('Close', color='red', on_click=lambda: [upload_file_dialog.close()]).props('push glossy text-color=black')
 
 # Create a dialog for file selection and loading
@@ -525,6 +699,7 @@ with load_file_dialog:
             on_change=lambda e: select_file(e.value),
             value=None
         ).classes('w-full bg-white text-black')
+        thumbnail_image = ui.image().style('width: 128px; image-rendering: pixelated;').bind_visibility_from(globals(), 'selected_file')
         ui.button('Load File', color='green', icon='file_open', on_click=lambda: [load_file(), load_file_dialog.close]).props('push glossy text-color=black').bind_visibility_from(globals(), 'selected_file')
 
 # Create a dialog for "Go To Weft"
@@ -544,6 +719,7 @@ with ui.header().classes('flex items-center justify-between'):
             ui.menu_item('Load File', on_click=load_file_dialog.open)
             ui.menu_item('Render Design', on_click=render_design).bind_visibility_from(globals(), 'working_file')
             ui.menu_item('Render Lift Plan', on_click=render_lift_plan).bind_visibility_from(globals(), 'working_file')
+            ui.menu_item('Print Lift Plan', on_click=lambda: ui.navigate.to('/liftplan.pdf', new_tab=True)).bind_visibility_from(globals(), 'working_file')
             ui.menu_item('Weft History', on_click=view_weft_history).bind_visibility_from(globals(), 'working_file')
     ui.button(icon='home', color='blue', on_click=home).props('push glossy text_color=black').bind_visibility_from(globals(), 'working_file')
     ui.label('Megan\'s Lift Plan Viewer').classes('text-h5').bind_visibility_from(globals(), 'working_file')
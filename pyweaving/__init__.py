@@ -2,8 +2,7 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import datetime
-import json
-from copy import deepcopy
+from copy import copy, deepcopy
 from collections import defaultdict
 
 
@@ -35,13 +34,16 @@ class Color(object):
 
 class WarpThread(object):
     """
-    Represents a single warp thread.
+    Represents a single warp thread. ``spacing`` (the width it takes up in
+    the cloth) and ``thickness`` are in inches, or None if not known.
     """
-    def __init__(self, color=None, shaft=None):
+    def __init__(self, color=None, shaft=None, spacing=None, thickness=None):
         if color and not isinstance(color, Color):
             color = Color(color)
         self.color = color
         self.shaft = shaft
+        self.spacing = spacing
+        self.thickness = thickness
 
     def __repr__(self):
         return '<WarpThread color:%s shaft:%s>' % (self.color.rgb, self.shaft)
@@ -49,9 +51,11 @@ class WarpThread(object):
 
 class WeftThread(object):
     """
-    Represents a single weft thread.
+    Represents a single weft thread. ``spacing`` and ``thickness`` are as for
+    ``WarpThread``.
     """
-    def __init__(self, color=None, shafts=None, treadles=None):
+    def __init__(self, color=None, shafts=None, treadles=None, spacing=None,
+                 thickness=None):
         if color and not isinstance(color, Color):
             color = Color(color)
         self.color = color
@@ -59,6 +63,8 @@ class WeftThread(object):
             "can't have both shafts (liftplan) and treadles specified"
         self.treadles = treadles or set()
         self.shafts = shafts or set()
+        self.spacing = spacing
+        self.thickness = thickness
 
     @property
     def connected_shafts(self):
@@ -135,58 +141,98 @@ class Draft(object):
     @classmethod
     def from_json(cls, s):
         """
-        Construct a new Draft instance from its JSON representation.
+        Construct a new Draft instance from its JSON representation, in either
+        the plain or the compact form. ``s`` may be a string or bytes.
         Counterpart to ``.to_json()``.
         """
-        obj = json.loads(s)
+        from .compact import loads, decode_draft, FORMAT_NAME
+
+        obj = loads(s)
+        if obj.get('format') == FORMAT_NAME:
+            return decode_draft(cls, obj)
+
         warp = obj.pop('warp')
         weft = obj.pop('weft')
         tieup = obj.pop('tieup')
 
         draft = cls(**obj)
 
+        shafts = draft.shafts
+        treadles = draft.treadles
+
         for thread_obj in warp:
             draft.add_warp_thread(
                 color=thread_obj['color'],
-                shaft=draft.shafts[thread_obj['shaft']],
+                shaft=shafts[thread_obj['shaft']],
+                spacing=thread_obj.get('spacing'),
+                thickness=thread_obj.get('thickness'),
             )
 
         for thread_obj in weft:
+            # 'shafts' is always populated with the connected shafts, so it
+            # only describes the thread when there is no treadling.
+            thread_treadles = set(treadles[n] for n in thread_obj['treadles'])
+            if thread_treadles:
+                thread_shafts = set()
+            else:
+                thread_shafts = set(shafts[n] for n in thread_obj['shafts'])
             draft.add_weft_thread(
                 color=thread_obj['color'],
-                shafts=set(draft.shafts[n] for n in thread_obj['shafts']),
-                treadles=set(draft.treadles[n] for n in
-                             thread_obj['treadles']),
+                shafts=thread_shafts,
+                treadles=thread_treadles,
+                spacing=thread_obj.get('spacing'),
+                thickness=thread_obj.get('thickness'),
             )
 
         for ii, shaft_nos in enumerate(tieup):
-            draft.treadles[ii].shafts = set(draft.shafts[n] for n in shaft_nos)
+            treadles[ii].shafts = set(shafts[n] for n in shaft_nos)
 
         return draft
 
-    def to_json(self):
+    def to_json(self, compact=False, rle=True):
         """
         Serialize a Draft to its JSON representation. Counterpart to
         ``.from_json()``.
+
+        With ``compact``, use the versioned compact schema from
+        ``pyweaving.compact``: a color palette with per-thread color indexes,
+        bitmask liftplan/tie-up rows, and (with ``rle``) run-length encoded
+        thread sequences. This is typically far smaller than the plain form.
         """
-        return json.dumps({
+        from .compact import dumps, encode_draft
+
+        if compact:
+            return dumps(encode_draft(self, rle=rle))
+
+        shaft_index = {shaft: ii for ii, shaft in enumerate(self.shafts)}
+        treadle_index = {treadle: ii
+                         for ii, treadle in enumerate(self.treadles)}
+
+        def thread_obj(thread, **obj):
+            # Sizes are only written when known.
+            obj['color'] = thread.color.rgb
+            if thread.spacing is not None:
+                obj['spacing'] = thread.spacing
+            if thread.thickness is not None:
+                obj['thickness'] = thread.thickness
+            return obj
+
+        return dumps({
             'liftplan': self.liftplan,
             'rising_shed': self.rising_shed,
             'num_shafts': len(self.shafts),
             'num_treadles': len(self.treadles),
-            'warp': [{
-                'color': thread.color.rgb,
-                'shaft': self.shafts.index(thread.shaft),
-            } for thread in self.warp],
-            'weft': [{
-                'color': thread.color.rgb,
-                'treadles': [self.treadles.index(tr)
-                             for tr in thread.treadles],
-                'shafts': [self.shafts.index(sh)
-                           for sh in thread.connected_shafts],
-            } for thread in self.weft],
+            'warp': [thread_obj(
+                thread,
+                shaft=shaft_index[thread.shaft],
+            ) for thread in self.warp],
+            'weft': [thread_obj(
+                thread,
+                treadles=[treadle_index[tr] for tr in thread.treadles],
+                shafts=[shaft_index[sh] for sh in thread.connected_shafts],
+            ) for thread in self.weft],
             'tieup': [
-                [self.shafts.index(sh) for sh in treadle.shafts]
+                [shaft_index[sh] for sh in treadle.shafts]
                 for treadle in self.treadles
             ],
             'date': self.date,
@@ -205,7 +251,8 @@ class Draft(object):
         """
         return deepcopy(self)
 
-    def add_warp_thread(self, color=None, index=None, shaft=0):
+    def add_warp_thread(self, color=None, index=None, shaft=0, spacing=None,
+                        thickness=None):
         """
         Add a warp thread to this draft.
         """
@@ -214,6 +261,8 @@ class Draft(object):
         thread = WarpThread(
             color=color,
             shaft=shaft,
+            spacing=spacing,
+            thickness=thickness,
         )
         if index is None:
             self.warp.append(thread)
@@ -221,7 +270,8 @@ class Draft(object):
             self.warp.insert(index, thread)
 
     def add_weft_thread(self, color=None, index=None,
-                        shafts=None, treadles=None):
+                        shafts=None, treadles=None, spacing=None,
+                        thickness=None):
         """
         Add a weft thread to this draft.
         """
@@ -241,6 +291,8 @@ class Draft(object):
             color=color,
             shafts=shaft_objs,
             treadles=treadle_objs,
+            spacing=spacing,
+            thickness=thickness,
         )
         if index is None:
             self.weft.append(thread)
@@ -279,7 +331,10 @@ class Draft(object):
 
             (start, end, visible, length, thread)
 
-        FIXME: This ignores the back side of the fabric. Should it?
+        Floats which aren't ``visible`` are on the back of the fabric, so
+        every float of both sides is yielded once. See ``.back()`` for the
+        draft of the back, and ``DraftArrays.float_lengths()`` for the length
+        of the float in every square, computed without iterating.
         """
         num_warp_threads = len(self.warp)
         num_weft_threads = len(self.weft)
@@ -316,21 +371,13 @@ class Draft(object):
             length = last[0] - this_start[0]
             yield this_start, last, this_vis_state, length, thread
 
-    def compute_longest_floats(self):
+    def compute_longest_floats(self, side='face'):
         """
-        Return a tuple indicating the longest floats for warp, weft.
-
-        FIXME This might be producing incorrect results.
+        Return a tuple of the longest warp and weft floats, in squares, on
+        the ``'face'`` or ``'back'`` of the fabric.
         """
-        floats = list(self.compute_floats())
-        return (
-            max(length
-                for start, end, visible, length, thread in floats
-                if isinstance(thread, WarpThread)),
-            max(length
-                for start, end, visible, length, thread in floats
-                if isinstance(thread, WeftThread)),
-        )
+        from .arrays import DraftArrays
+        return DraftArrays(self).longest_floats()[side]
 
     def reduce_shafts(self):
         """
@@ -514,6 +561,34 @@ class Draft(object):
         """
         raise NotImplementedError
 
+    def region(self, ends=None, picks=None):
+        """
+        Return a draft holding a contiguous range of this draft's warp and
+        weft threads, given as slices (None for all of them). The threads,
+        shafts and treadles are shared with this draft rather than copied,
+        so this is cheap for a small region of a large draft.
+        """
+        region = copy(self)
+        if ends is not None:
+            assert ends.step in (None, 1), "ends must be contiguous"
+            region.warp = self.warp[ends]
+        if picks is not None:
+            assert picks.step in (None, 1), "picks must be contiguous"
+            region.weft = self.weft[picks]
+        return region
+
+    def back(self):
+        """
+        Return a draft of the back of the fabric, as seen after turning it
+        over sideways: the warp is reversed and the shed inverted, so every
+        interlacement shows the other thread. Like ``.region()``, the threads
+        are shared with this draft rather than copied.
+        """
+        back = copy(self)
+        back.warp = self.warp[::-1]
+        back.rising_shed = not self.rising_shed
+        return back
+
     def repeat(self, n):
         """
         Given a base draft, make it repeat with N units in each direction.
@@ -525,12 +600,16 @@ class Draft(object):
                 self.add_warp_thread(
                     color=thread.color,
                     shaft=thread.shaft,
+                    spacing=thread.spacing,
+                    thickness=thread.thickness,
                 )
             for thread in initial_weft:
                 self.add_weft_thread(
                     color=thread.color,
                     treadles=thread.treadles,
                     shafts=thread.shafts,
+                    spacing=thread.spacing,
+                    thickness=thread.thickness,
                 )
 
     def advance(self):
@@ -0,0 +1,160 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+import numpy as np
+from PIL import Image
+
+from .arrays import DraftArrays, as_rgb, fill_pixels, upscale
+from .fabric import FabricRenderer
+from .images import palette_image, save_animation, save_image
+
+
+class WeavingAnimation(object):
+    """
+    Render a draft being woven, as a sequence of frames which each add the
+    next ``picks_per_frame`` picks. Frames are painted incrementally: each
+    one paints just its new picks into the pixels of the frame before, so
+    animating a draft costs about as much as rendering it once, plus
+    encoding.
+
+    The drawdown is painted at ``scale`` pixels per square, as palette images
+    when it has few enough colors. With ``fabric``, the cloth is shaded as by
+    ``FabricRenderer``, with ``fabric_options`` such as ``noise`` or
+    ``proportional``. Picks are added from the top, in the order of the
+    drawdown, so the last frame is the whole render.
+    """
+    def __init__(self, draft, scale=4, picks_per_frame=10, fabric=False,
+                 background=(255, 255, 255), **fabric_options):
+        assert picks_per_frame > 0, "picks_per_frame must be positive"
+        self.draft = draft
+        self.scale = scale
+        self.picks_per_frame = picks_per_frame
+        self.fabric = fabric
+        self.background = background
+        self.fabric_options = fabric_options
+
+    @property
+    def num_frames(self):
+        num_picks = len(self.draft.weft)
+        return max(1, -(-num_picks // self.picks_per_frame))
+
+    def drawdown_canvas(self):
+        """
+        Return the ``(pixels, y_edges, paint, make_image)`` of the drawdown:
+        the empty pixels, the edges of the picks in them, a function
+        ``paint(pixels, start, stop)`` which paints picks ``start`` to
+        ``stop`` into them, and one which makes a PIL image of them.
+        """
+        arrays = DraftArrays(self.draft)
+        warp_up = arrays.drawdown()
+        s = self.scale
+        x_edges, y_edges = arrays.edges(s)
+        height = y_edges[-1]
+        width = x_edges[-1]
+        num_colors = len(arrays.palette)
+        if num_colors < 256:
+            cells = np.where(warp_up, arrays.warp_colors[np.newaxis, :],
+                             arrays.weft_colors[:, np.newaxis]).astype(
+                                 np.uint8)
+            pixels = np.full((height, width), num_colors, dtype=np.uint8)
+            colors = np.concatenate([arrays.palette,
+                                     [as_rgb(self.background)]])
+
+            def make_image(pixels):
+                return palette_image(pixels, colors)
+        else:
+            cells = arrays.cell_colors(warp_up)
+            pixels = np.empty((height, width, 3), dtype=np.uint8)
+            fill_pixels(pixels, self.background)
+            make_image = Image.fromarray
+
+        def paint(pixels, start, stop):
+            upscale(cells[start:stop], s, out=pixels[start * s:stop * s])
+        return pixels, y_edges, paint, make_image
+
+    def fabric_canvas(self):
+        """
+        Return the ``(pixels, y_edges, paint, make_image)`` of the woven
+        cloth, as for ``.drawdown_canvas()``.
+        """
+        renderer = FabricRenderer(self.draft, scale=self.scale,
+                                  background=self.background,
+                                  **self.fabric_options)
+        layout = renderer.layout()
+        x_edges, y_edges = layout[:2]
+        pixels = np.empty((y_edges[-1], x_edges[-1], 3), dtype=np.uint8)
+        fill_pixels(pixels, as_rgb(self.background))
+        return pixels, y_edges, renderer.painter(layout), Image.fromarray
+
+    def iter_canvas(self):
+        """
+        Generate the ``(make_image, pixels, rows)`` of each frame: the pixels
+        of the whole frame, after painting the ``rows`` of its new picks,
+        and a function which makes a PIL image of them. The pixels are
+        painted in place, so they are only valid until the next frame.
+        """
+        if self.fabric:
+            pixels, y_edges, paint, make_image = self.fabric_canvas()
+        else:
+            pixels, y_edges, paint, make_image = self.drawdown_canvas()
+        num_picks = len(self.draft.weft)
+        if not num_picks:
+            yield make_image, pixels, slice(0, 0)
+            return
+        for start in range(0, num_picks, self.picks_per_frame):
+            stop = min(num_picks, start + self.picks_per_frame)
+            paint(pixels, start, stop)
+            yield make_image, pixels, slice(y_edges[start], y_edges[stop])
+
+    def iter_frames(self):
+        """
+        Generate the frames, as whole PIL images.
+        """
+        for make_image, pixels, rows in self.iter_canvas():
+            yield make_image(pixels.copy())
+
+    def iter_changes(self):
+        """
+        Generate the frames as ``(image, (x, y))`` pairs for
+        ``images.save_animation()``: the first frame whole, then the picks
+        each frame adds, at their place in it.
+        """
+        for no, (make_image, pixels, rows) in enumerate(self.iter_canvas()):
+            if no == 0:
+                yield make_image(pixels.copy()), (0, 0)
+            else:
+                yield make_image(pixels[rows].copy()), (0, rows.start)
+
+    def save(self, filename, format=None, duration=100, hold=None, loop=0):
+        """
+        Save the animation as an animated GIF, or an animated PNG for a
+        ``.png`` or ``.apng`` filename, encoding just the picks each frame
+        adds. Each frame is shown for ``duration`` milliseconds, and the last
+        for ``hold`` milliseconds if given. ``loop`` is the number of times
+        to play it, 0 for ever. GIF frames with more than 256 colors, e.g. of
+        shaded cloth, are quantized.
+        """
+        durations = [duration] * self.num_frames
+        if hold is not None:
+            durations[-1] = hold
+        save_animation(self.iter_changes(), filename, durations,
+                       format=format, loop=loop)
+
+    def save_frames(self, pattern, **options):
+        """
+        Save the frames as a numbered sequence of images, named by a pattern
+        such as ``frames/%04d.png`` and numbered from 1, with options as for
+        ``images.save_image()``. Directories are made as needed. Returns the
+        filenames.
+        """
+        filenames = []
+        for no, frame in enumerate(self.iter_frames(), 1):
+            filename = pattern % no
+            dirname = os.path.dirname(filename)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            save_image(frame, filename, **options)
+            filenames.append(filename)
+        return filenames
@@ -0,0 +1,506 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class DraftArrays(object):
+    """
+    A compact, array-based view of a Draft, for vectorized rendering and
+    analysis. Built once from the draft's object model:
+
+    ``palette``
+        ``(colors, 3)`` uint8 array of the distinct thread colors.
+    ``warp_colors``, ``weft_colors``
+        Per-thread indexes into ``palette``.
+    ``threading``
+        Per-warp-thread shaft index, or -1 for an unthreaded end.
+    ``lift``
+        ``(picks, shafts)`` bool array of the shafts raised on each pick
+        (the liftplan, or the treadling combined with the tie-up).
+    ``treadling``
+        ``(picks, treadles)`` bool array of the treadles used on each pick.
+    ``tieup``
+        ``(treadles, shafts)`` bool array.
+    ``warp_spacing``, ``weft_spacing``, ``warp_thickness``,
+    ``weft_thickness``
+        Per-thread sizes in inches, NaN where not known.
+
+    The drawdown of the whole draft is computed once and kept, so the face
+    and the back (see ``.back()``) share a single pass over it.
+    """
+    def __init__(self, draft):
+        self.rising_shed = draft.rising_shed
+        # The whole drawdown, once it has been computed: see .drawdown().
+        self.warp_up = None
+        shaft_index = {shaft: ii for ii, shaft in enumerate(draft.shafts)}
+        treadle_index = {treadle: ii
+                         for ii, treadle in enumerate(draft.treadles)}
+        num_shafts = len(draft.shafts)
+        num_treadles = len(draft.treadles)
+
+        palette = []
+        palette_index = {}
+
+        def color_no(color):
+            rgb = color.rgb
+            no = palette_index.get(rgb)
+            if no is None:
+                no = palette_index[rgb] = len(palette)
+                palette.append(rgb)
+            return no
+
+        self.warp_colors = np.array([color_no(thread.color)
+                                     for thread in draft.warp], dtype=np.intp)
+        self.weft_colors = np.array([color_no(thread.color)
+                                     for thread in draft.weft], dtype=np.intp)
+        self.palette = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+
+        self.threading = np.array([shaft_index.get(thread.shaft, -1)
+                                   for thread in draft.warp], dtype=np.intp)
+
+        def sizes(threads, attr):
+            return np.array([getattr(thread, attr, None)
+                             for thread in threads], dtype=float)
+
+        self.warp_spacing = sizes(draft.warp, 'spacing')
+        self.weft_spacing = sizes(draft.weft, 'spacing')
+        self.warp_thickness = sizes(draft.warp, 'thickness')
+        self.weft_thickness = sizes(draft.weft, 'thickness')
+
+        self.tieup = np.zeros((num_treadles, num_shafts), dtype=bool)
+        for ii, treadle in enumerate(draft.treadles):
+            for shaft in treadle.shafts:
+                self.tieup[ii, shaft_index[shaft]] = True
+
+        self.lift = np.zeros((len(draft.weft), num_shafts), dtype=bool)
+        self.treadling = np.zeros((len(draft.weft), num_treadles),
+                                  dtype=bool)
+        for ii, thread in enumerate(draft.weft):
+            for treadle in thread.treadles:
+                self.treadling[ii, treadle_index[treadle]] = True
+            for shaft in thread.shafts:
+                self.lift[ii, shaft_index[shaft]] = True
+        treadled = self.treadling.any(axis=1)
+        if treadled.any():
+            # Picks without a direct liftplan lift what their treadles do.
+            lifted = np.dot(self.treadling.astype(np.intp),
+                            self.tieup.astype(np.intp)) > 0
+            self.lift[treadled] |= lifted[treadled]
+
+    @property
+    def num_ends(self):
+        return len(self.warp_colors)
+
+    @property
+    def num_picks(self):
+        return len(self.weft_colors)
+
+    @property
+    def warp_rgb(self):
+        """
+        ``(ends, 3)`` array of warp thread colors.
+        """
+        return self.palette[self.warp_colors]
+
+    @property
+    def weft_rgb(self):
+        """
+        ``(picks, 3)`` array of weft thread colors.
+        """
+        return self.palette[self.weft_colors]
+
+    def edges(self, scale, proportional=False):
+        """
+        Return the ``(x, y)`` pixel offsets of the edges of the warp and weft
+        threads, ``threads + 1`` of each, at ``scale`` pixels per square.
+        With ``proportional``, threads are laid out in proportion to their
+        spacing, as by ``thread_edges()``.
+        """
+        if proportional:
+            return (thread_edges(self.warp_spacing, scale),
+                    thread_edges(self.weft_spacing, scale))
+        return (np.arange(self.num_ends + 1) * scale,
+                np.arange(self.num_picks + 1) * scale)
+
+    def coverage(self, default, proportional=False):
+        """
+        Return the ``(warp, weft)`` fraction of its spacing that each thread
+        covers: its thickness over its spacing when both are known and
+        ``proportional`` is set, otherwise ``default``.
+        """
+        ret = []
+        for spacing, thickness in ((self.warp_spacing, self.warp_thickness),
+                                   (self.weft_spacing, self.weft_thickness)):
+            coverage = np.full(len(spacing), default)
+            if proportional:
+                known = (spacing > 0) & (thickness > 0)
+                coverage[known] = np.clip(thickness[known] / spacing[known],
+                                          0.2, 1)
+            ret.append(coverage)
+        return tuple(ret)
+
+    def drawdown(self, ends=slice(None), picks=slice(None)):
+        """
+        Return a ``(picks, ends)`` bool array which is True where the warp is
+        visible on the face of the cloth, optionally restricted to slices of
+        ends and picks. Equivalent to ``Draft.compute_drawdown()``.
+        """
+        if self.warp_up is not None:
+            return self.warp_up[picks][:, ends]
+        whole = (isinstance(ends, slice) and isinstance(picks, slice) and
+                 ends == slice(None) and picks == slice(None))
+        threading = self.threading[ends]
+        lift = self.lift[picks]
+        # Pad with a never-lifted column for unthreaded ends (index -1).
+        padded = np.zeros((lift.shape[0], lift.shape[1] + 1), dtype=bool)
+        padded[:, :-1] = lift
+        raised = padded[:, threading]
+        warp_up = raised if self.rising_shed else ~raised
+        if whole:
+            self.warp_up = warp_up
+        return warp_up
+
+    def back(self):
+        """
+        Return the arrays of the back of the cloth, as seen after turning it
+        over sideways: the warp is reversed, and every interlacement shows
+        the other thread. The drawdown is derived from this one's rather
+        than computed again.
+        """
+        back = copy.copy(self)
+        for attr in ('warp_colors', 'threading', 'warp_spacing',
+                     'warp_thickness'):
+            setattr(back, attr, getattr(self, attr)[::-1])
+        back.rising_shed = not self.rising_shed
+        back.warp_up = ~self.drawdown()[:, ::-1]
+        return back
+
+    def longest_floats(self):
+        """
+        Return the longest ``(warp, weft)`` floats, in squares, on each side
+        of the cloth, as a dict keyed by ``'face'`` and ``'back'``. The warp
+        floats on the back are where it is down on the face, and vice versa,
+        so both sides come from the same drawdown.
+        """
+        warp_up = self.drawdown()
+
+        def longest(mask):
+            __, starts, stops = runs(mask)
+            return int((stops - starts).max(initial=0))
+        return {
+            'face': (longest(warp_up.T), longest(~warp_up)),
+            'back': (longest(~warp_up.T), longest(warp_up)),
+        }
+
+    def float_lengths(self):
+        """
+        Return the ``(warp, weft)`` float length maps of the face: two
+        ``(picks, ends)`` arrays holding, in every cell where that thread is
+        on top, the length in squares of the float it is part of, and 0
+        elsewhere. Every cell is on top in exactly one of them. The maps of
+        the back are those of ``.back()``.
+        """
+        warp_up = self.drawdown()
+        return run_lengths(warp_up.T).T, run_lengths(~warp_up)
+
+    def cell_colors(self, warp_up):
+        """
+        Return the ``(picks, ends, 3)`` colors of the visible thread in each
+        cell of a drawdown, as returned by ``.drawdown()`` for the whole draft.
+        """
+        return np.where(warp_up[:, :, np.newaxis],
+                        self.warp_rgb[np.newaxis, :, :],
+                        self.weft_rgb[:, np.newaxis, :])
+
+    def drawdown_size(self, scale):
+        """
+        Return the ``(width, height)`` in pixels of the drawdown painted at
+        ``scale`` pixels per square.
+        """
+        return (self.num_ends * scale) + 1, (self.num_picks * scale) + 1
+
+    def render_drawdown(self, scale, foreground, box=None):
+        """
+        Return the pixels of the drawdown painted at ``scale`` pixels per
+        square, as by ``drawdown_pixels()``. If ``box`` (``(startx, starty,
+        endx, endy)`` in drawdown pixels) is given, only that part is painted,
+        so any region of a huge drawdown can be rendered in bounded memory.
+        """
+        width, height = self.drawdown_size(scale)
+        if box is None:
+            box = (0, 0, width, height)
+        startx, starty, endx, endy = box
+        # Include a square either side so lines on the edges of the box are
+        # classified with both of their neighbours.
+        ends = slice(max(0, (startx // scale) - 1),
+                     min(self.num_ends, ((endx - 1) // scale) + 2))
+        picks = slice(max(0, (starty // scale) - 1),
+                      min(self.num_picks, ((endy - 1) // scale) + 2))
+        pixels = drawdown_pixels(self.drawdown(ends, picks),
+                                 self.warp_rgb[ends], self.weft_rgb[picks],
+                                 scale, foreground)
+        offsetx = ends.start * scale
+        offsety = picks.start * scale
+        return pixels[starty - offsety:endy - offsety,
+                      startx - offsetx:endx - offsetx]
+
+    def repeat(self):
+        """
+        Return the smallest ``(ends, picks)`` repeat of the draft: the
+        threading, lifts and thread colors all repeat with these periods, so
+        the drawdown does too. A period equal to the number of threads means
+        that direction doesn't repeat.
+        """
+        return (period(np.column_stack([self.threading, self.warp_colors])),
+                period(np.column_stack([self.lift, self.weft_colors])))
+
+    def paint_drawdown(self, out, scale, foreground, workers=1):
+        """
+        Paint the whole drawdown into ``out``, an array of
+        ``.drawdown_size(scale)``, as by ``drawdown_pixels()``. With more than
+        one worker, horizontal bands are painted in parallel threads, each
+        into its own rows of ``out``, so the result is the same.
+        """
+        if workers <= 1:
+            return drawdown_pixels(self.drawdown(), self.warp_rgb,
+                                   self.weft_rgb, scale, foreground, out=out)
+        height, width = out.shape[:2]
+
+        def paint_band(start, stop):
+            # Bands start on the line above a pick, so each line is painted
+            # once, by the band below it.
+            out[start * scale:stop * scale] = self.render_drawdown(
+                scale, foreground, (0, start * scale, width, stop * scale))
+        parallel_rows(paint_band, self.num_picks, workers)
+        out[-1] = self.render_drawdown(
+            scale, foreground, (0, height - 1, width, height))
+        return out
+
+    def sample_colors(self, ends, picks):
+        """
+        Return the ``(picks, ends, 3)`` colors of the visible thread at a
+        selection of interlacements, e.g. every Nth one for a reduced view.
+        """
+        warp_up = self.drawdown(ends, picks)
+        return np.where(warp_up[:, :, np.newaxis],
+                        self.warp_rgb[ends][np.newaxis, :, :],
+                        self.weft_rgb[picks][:, np.newaxis, :])
+
+
+def period(a):
+    """
+    Return the smallest period ``p`` with which an array repeats along its
+    first axis, i.e. ``a[p:] == a[:-p]``, or its length if it doesn't.
+    """
+    n = len(a)
+    if n < 2:
+        return n
+    __, items = np.unique(a.reshape(n, -1), axis=0, return_inverse=True)
+    items = items.ravel().tolist()
+    # The smallest period is the length less the longest border (a prefix
+    # which is also a suffix), found with the KMP prefix function.
+    border = [0] * n
+    k = 0
+    for ii in range(1, n):
+        while k and items[ii] != items[k]:
+            k = border[k - 1]
+        if items[ii] == items[k]:
+            k += 1
+        border[ii] = k
+    return n - border[-1]
+
+
+def thread_edges(spacing, scale):
+    """
+    Return the pixel offsets of the edges of threads laid out in proportion
+    to their ``spacing``: the cumulative sum of their widths, where the most
+    common spacing is ``scale`` pixels. Threads are at least a pixel wide,
+    and unknown (NaN) spacings count as the most common one.
+    """
+    known = spacing[spacing > 0]
+    if not len(known):
+        return np.arange(len(spacing) + 1) * scale
+    values, counts = np.unique(known, return_counts=True)
+    base = values[np.argmax(counts)]
+    spacing = np.where(spacing > 0, spacing, base)
+    # Round the running total rather than each width, so rounding errors
+    # don't accumulate across the draft.
+    edges = np.zeros(len(spacing) + 1, dtype=np.intp)
+    edges[1:] = np.round(np.cumsum(spacing / base) * scale)
+    widths = np.maximum(1, np.diff(edges))
+    edges[1:] = np.cumsum(widths)
+    return edges
+
+
+def thread_index(edges):
+    """
+    Return the thread under each pixel, given the edges of the threads from
+    ``DraftArrays.edges()``: an index map for filling variable-size squares.
+    """
+    widths = np.diff(edges)
+    return np.repeat(np.arange(len(widths)), widths)
+
+
+def parallel_rows(func, rows, workers):
+    """
+    Call ``func(start, stop)`` for consecutive bands of ``rows`` rows across
+    a pool of ``workers`` threads, which NumPy mostly runs in parallel. Bands
+    must write to separate memory. A few bands per worker keeps them busy
+    when some bands are slower than others.
+    """
+    if workers <= 1 or rows <= 1:
+        func(0, rows)
+        return
+    edges = np.linspace(0, rows, min(rows, workers * 4) + 1).astype(int)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Wait for every band, re-raising the first error.
+        list(executor.map(func, edges[:-1], edges[1:]))
+
+
+def as_rgb(color):
+    return np.asarray(color, dtype=np.uint8)
+
+
+def fill_pixels(pixels, color):
+    """
+    Fill a ``(height, width, 3)`` array with a color. Copying one filled row
+    is much faster than broadcasting a single pixel.
+    """
+    if len(pixels):
+        pixels[0] = as_rgb(color)
+        pixels[1:] = pixels[0]
+
+
+def split_rows(pixels, rows, size):
+    """
+    Return a view of a ``(rows * size, ...)`` array as ``(rows, size, ...)``,
+    for writing a block of ``size`` pixel rows per square. Raises an error
+    rather than silently copying.
+    """
+    view = pixels.view()
+    view.shape = (rows, size) + pixels.shape[1:]
+    return view
+
+
+def upscale(cells, scale, out=None):
+    """
+    Repeat each pixel of a ``(rows, cols, 3)`` (or ``(rows, cols)``) array
+    into a ``scale`` by ``scale`` block, writing to ``out`` if given.
+    """
+    rows, cols = cells.shape[:2]
+    if out is None:
+        out = np.empty((rows * scale, cols * scale) + cells.shape[2:],
+                       dtype=np.uint8)
+    block = split_rows(out, rows, scale)
+    block[...] = np.repeat(cells, scale, axis=1)[:, np.newaxis]
+    return out
+
+
+def marker_mask(marked, scale):
+    """
+    Return a ``(rows * scale + 1, cols * scale + 1)`` bool mask of the filled
+    markers for a grid of squares, given a ``(rows, cols)`` bool array of the
+    marked squares. Markers are inset two pixels from the grid lines, as
+    drawn by ``ImageRenderer.paint_fill_marker()``.
+    """
+    rows, cols = marked.shape
+    tile = np.zeros((scale, scale), dtype=bool)
+    tile[2:scale - 1, 2:scale - 1] = True
+    cells = (marked[:, np.newaxis, :, np.newaxis] &
+             tile[np.newaxis, :, np.newaxis, :])
+    mask = np.zeros((rows * scale + 1, cols * scale + 1), dtype=bool)
+    mask[:-1, :-1] = cells.reshape(rows * scale, cols * scale)
+    return mask
+
+
+def runs(mask):
+    """
+    Find the runs of True along each row of a ``(rows, cols)`` bool array.
+    Returns arrays of the ``rows``, ``starts`` and (exclusive) ``stops`` of
+    every run, in row order.
+    """
+    rows, cols = mask.shape
+    padded = np.zeros((rows, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    run_rows, starts = np.nonzero(edges == 1)
+    __, stops = np.nonzero(edges == -1)
+    return run_rows, starts, stops
+
+
+def run_lengths(mask):
+    """
+    Return a ``(rows, cols)`` array holding, for every True element of a
+    bool array, the length of the run of True along its row that it is part
+    of, and 0 elsewhere. Runs are found once by ``runs()`` and their lengths
+    expanded back over their elements, which are in the same order.
+    """
+    __, starts, stops = runs(mask)
+    lengths = (stops - starts).astype(np.int32)
+    out = np.zeros(mask.shape, dtype=np.int32)
+    out[mask] = np.repeat(lengths, lengths)
+    return out
+
+
+def strip_pixels(rgb, scale, foreground, vertical=False):
+    """
+    Return the pixels of a row (or column) of outlined squares, one per
+    thread, filled with the ``(threads, 3)`` colors ``rgb``.
+    """
+    out = np.empty((scale + 1, len(rgb) * scale + 1, 3), dtype=np.uint8)
+    out[:, :-1] = np.repeat(rgb, scale, axis=0)[np.newaxis]
+    out[::scale, :] = foreground
+    out[:, ::scale] = foreground
+    if vertical:
+        return out.transpose(1, 0, 2)
+    return out
+
+
+def drawdown_pixels(warp_up, warp_rgb, weft_rgb, scale, foreground,
+                    out=None):
+    """
+    Return the pixels of a drawdown as painted by
+    ``ImageRenderer.paint_drawdown()``: each visible float is an outlined box
+    filled with its thread color. ``warp_up`` is a ``(picks, ends)`` bool
+    array; ``warp_rgb`` and ``weft_rgb`` are the thread colors. Pixels are
+    written to ``out`` if given.
+
+    Rather than painting floats, each pixel is classified directly: square
+    interiors take the color of the visible thread, and a grid line between
+    two squares is only hidden when both squares belong to the same float.
+    """
+    picks, ends = warp_up.shape
+    foreground = as_rgb(foreground)
+    if out is None:
+        out = np.empty((picks * scale + 1, ends * scale + 1, 3),
+                       dtype=np.uint8)
+    cells = np.where(warp_up[:, :, np.newaxis],
+                     warp_rgb[np.newaxis, :, :],
+                     weft_rgb[:, np.newaxis, :])
+    upscale(cells, scale, out=out[:-1, :-1])
+
+    # Vertical lines inside a weft float take the weft color.
+    weft_up = ~warp_up
+    vlines = np.empty((picks, ends + 1, 3), dtype=np.uint8)
+    vlines[...] = foreground
+    vlines[:, 1:-1] = np.where(
+        (weft_up[:, :-1] & weft_up[:, 1:])[:, :, np.newaxis],
+        weft_rgb[:, np.newaxis, :], foreground)
+    split_rows(out[:-1, ::scale], picks, scale)[...] = \
+        vlines[:, np.newaxis]
+
+    # Horizontal lines inside a warp float take the warp color. Corners are
+    # always on an outline.
+    hcolors = np.empty((picks + 1, ends, 3), dtype=np.uint8)
+    hcolors[...] = foreground
+    hcolors[1:-1] = np.where(
+        (warp_up[:-1] & warp_up[1:])[:, :, np.newaxis],
+        warp_rgb[np.newaxis, :, :], foreground)
+    hlines = out[::scale]
+    hlines[:, :-1] = np.repeat(hcolors, scale, axis=1)
+    hlines[:, ::scale] = foreground
+    return out
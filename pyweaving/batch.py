@@ -0,0 +1,260 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import csv
+import glob
+import io
+import os
+import os.path
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .compact import dumps
+from .formats import (load_draft, save_draft, format_for_filename,
+                      split_compression, suffix_compressions)
+from .stats import DraftStats
+
+
+glob_chars = set('*?[')
+
+compression_suffixes = {compression: suffix for suffix, compression
+                        in suffix_compressions.items()}
+
+
+def is_pattern(path):
+    return bool(glob_chars.intersection(path))
+
+
+def glob_root(pattern):
+    """
+    Return the leading directory of a glob pattern which contains no
+    wildcards, e.g. ``'archive'`` for ``'archive/**/*.wif'``.
+    """
+    parts = []
+    for part in pattern.split(os.sep):
+        if is_pattern(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or os.curdir
+
+
+def expand_inputs(inputs, exclude=()):
+    """
+    Expand a list of filenames, directories and glob patterns into a sorted
+    list of ``(path, relpath)`` pairs, one per draft file. ``relpath`` is the
+    path relative to the directory or pattern root it was found under, which
+    is used to lay out batch outputs. Files in ``exclude``, such as outputs
+    written among the inputs, are left out.
+    """
+    exclude = set(os.path.abspath(path) for path in exclude)
+    found = {}
+    for spec in inputs:
+        if os.path.isdir(spec):
+            for dirpath, dirnames, filenames in os.walk(spec):
+                dirnames.sort()
+                for filename in filenames:
+                    if format_for_filename(filename):
+                        path = os.path.join(dirpath, filename)
+                        found[path] = os.path.relpath(path, spec)
+        elif is_pattern(spec):
+            root = glob_root(spec)
+            for path in glob.glob(spec, recursive=True):
+                if os.path.isfile(path):
+                    found[path] = os.path.relpath(path, root)
+        else:
+            found[spec] = os.path.basename(spec)
+    return sorted((path, relpath) for path, relpath in found.items()
+                  if os.path.abspath(path) not in exclude)
+
+
+def output_path(relpath, outdir, format, compression=None):
+    """
+    Return the output filename for a batch input, keeping its relative layout
+    under ``outdir`` but replacing its suffixes.
+    """
+    base = os.path.splitext(split_compression(relpath)[0])[0]
+    filename = '%s.%s' % (base, format)
+    if compression:
+        filename += compression_suffixes[compression]
+    return os.path.join(outdir, filename)
+
+
+def is_up_to_date(infile, outfile):
+    """
+    Check whether ``outfile`` exists and is at least as new as ``infile``.
+    """
+    try:
+        return os.path.getmtime(outfile) >= os.path.getmtime(infile)
+    except OSError:
+        return False
+
+
+def error_result(infile, exc):
+    return {
+        'infile': infile,
+        'status': 'error',
+        'error': type(exc).__name__,
+        'message': str(exc),
+    }
+
+
+def split_duplicates(jobs):
+    """
+    Split batch jobs of ``(infile, outfile, options)`` into those whose
+    outputs are distinct, to be run, and error results for every job which
+    shares its output with another, e.g. ``a.wif`` and ``a.json`` both
+    converted to ``a.json``. None of those are run, since which of them ended
+    up in the output would depend on the order they were run in.
+    """
+    infiles = {}
+    for infile, outfile, options in jobs:
+        infiles.setdefault(outfile, []).append(infile)
+    unique = []
+    errors = []
+    for job in jobs:
+        infile, outfile, options = job
+        if len(infiles[outfile]) == 1:
+            unique.append(job)
+            continue
+        others = [other for other in infiles[outfile] if other != infile]
+        result = error_result(infile, ValueError(
+            "output %s is also the output of %s" % (outfile,
+                                                     ', '.join(others))))
+        result['outfile'] = outfile
+        errors.append(result)
+    return unique, errors
+
+
+def convert_one(job):
+    """
+    Convert a single draft. ``job`` is a tuple of ``(infile, outfile,
+    options)``. Returns a result dict: errors are reported in the result
+    instead of being raised, so one malformed draft can't stop a batch.
+    """
+    infile, outfile, options = job
+    if not options.get('force') and is_up_to_date(infile, outfile):
+        return {'infile': infile, 'outfile': outfile, 'status': 'skipped'}
+    start = time.time()
+    try:
+        draft = load_draft(infile)
+        outdir = os.path.dirname(outfile)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        save_draft(draft, outfile,
+                   liftplan=options.get('liftplan', False),
+                   compact=options.get('compact', False))
+    except Exception as exc:
+        return error_result(infile, exc)
+    return {
+        'infile': infile,
+        'outfile': outfile,
+        'status': 'ok',
+        'elapsed': time.time() - start,
+    }
+
+
+def draft_stats(draft, arrays=None):
+    """
+    Return the statistics printed by ``pyweaving stats`` as a dict: the
+    draft's title, author and date, and its ``DraftStats``, computed from
+    ``arrays`` when given.
+    """
+    stats = {
+        'title': draft.title,
+        'author': draft.author,
+        'date': draft.date,
+    }
+    stats.update(DraftStats(draft, arrays).as_dict())
+    return stats
+
+
+def stats_one(infile):
+    """
+    Compute statistics for a single draft file, returning a result dict.
+    """
+    try:
+        stats = draft_stats(load_draft(infile))
+    except Exception as exc:
+        return error_result(infile, exc)
+    result = {'infile': infile, 'status': 'ok'}
+    result.update(stats)
+    return result
+
+
+class Progress(object):
+    """
+    A minimal progress display written to a stream (stderr by default).
+    """
+    def __init__(self, total, stream=None):
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.stream = stream or sys.stderr
+
+    def update(self, result):
+        self.done += 1
+        if result['status'] == 'error':
+            self.errors += 1
+        self.stream.write('\r[%d/%d] %d errors  %s' % (
+            self.done, self.total, self.errors, result['infile'][-40:]))
+        if self.done == self.total:
+            self.stream.write('\n')
+        self.stream.flush()
+
+
+def run_batch(func, jobs, workers=None, progress=None):
+    """
+    Apply ``func`` to every job across a process pool, returning the results
+    in job order. ``workers`` defaults to the number of CPUs; with a single
+    worker, jobs are run in this process. ``progress`` is called with each
+    result as it arrives.
+    """
+    jobs = list(jobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = []
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            result = func(job)
+            if progress:
+                progress(result)
+            results.append(result)
+        return results
+    chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(func, jobs, chunksize=chunksize):
+            if progress:
+                progress(result)
+            results.append(result)
+    return results
+
+
+def write_error_report(results, filename):
+    """
+    Write a JSON report of every failed job.
+    """
+    errors = [result for result in results if result['status'] == 'error']
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(dumps({'errors': errors, 'count': len(errors)}))
+    return errors
+
+
+def write_results(results, f, format='csv'):
+    """
+    Aggregate result dicts into a CSV or JSON document on the text stream
+    ``f``.
+    """
+    if format == 'json':
+        f.write(dumps(results))
+        f.write('\n')
+        return
+    fields = []
+    for result in results:
+        for key in result:
+            if key not in fields:
+                fields.append(key)
+    writer = csv.DictWriter(f, fields, lineterminator='\n')
+    writer.writeheader()
+    for result in results:
+        writer.writerow(result)
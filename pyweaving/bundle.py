@@ -0,0 +1,128 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import os.path
+import zipfile
+
+from . import Draft
+from .compact import dumps, loads
+from .formats import (load_draft, read_bytes, dump_draft, is_path,
+                      sniff_format, split_compression)
+
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 'pyweaving.bundle'
+MANIFEST_VERSION = 1
+
+
+class DraftBundle(object):
+    """
+    A zip archive holding a library of drafts, plus a ``manifest.json`` which
+    describes each member. Members are read one at a time straight from the
+    archive, so a whole library can be processed without extracting it.
+
+    ``source`` is a filename or a seekable binary file object. ``mode`` is
+    ``'r'`` to read an existing bundle or ``'w'`` to create a new one.
+    """
+    def __init__(self, source, mode='r'):
+        assert mode in ('r', 'w'), "bundles can only be read or written"
+        self.mode = mode
+        self.zf = zipfile.ZipFile(source, mode,
+                                  compression=zipfile.ZIP_DEFLATED)
+        self.entries = []
+        if mode == 'r':
+            self.read_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read_manifest(self):
+        try:
+            manifest = loads(self.zf.read(MANIFEST_NAME))
+        except KeyError:
+            # Plain zip of drafts: treat every member as a draft.
+            self.entries = [{'name': info.filename}
+                            for info in self.zf.infolist()
+                            if not info.filename.endswith('/')]
+        else:
+            if manifest.get('version', 0) > MANIFEST_VERSION:
+                raise ValueError("bundle manifest version %r is not "
+                                 "supported" % manifest['version'])
+            self.entries = manifest['drafts']
+
+    def write_manifest(self):
+        self.zf.writestr(MANIFEST_NAME, dumps({
+            'format': MANIFEST_FORMAT,
+            'version': MANIFEST_VERSION,
+            'drafts': self.entries,
+        }))
+
+    def names(self):
+        """
+        Return the member names of all drafts in the bundle.
+        """
+        return [entry['name'] for entry in self.entries]
+
+    def read(self, name):
+        """
+        Load a single draft from the bundle.
+        """
+        with self.zf.open(name) as f:
+            return load_draft(f)
+
+    def __iter__(self):
+        """
+        Iterate over ``(name, draft)`` pairs, loading one member at a time.
+        """
+        for name in self.names():
+            yield name, self.read(name)
+
+    def add(self, source, name=None, format='wif'):
+        """
+        Add a draft to the bundle. ``source`` is either a Draft, which is
+        serialized in ``format``, or anything accepted by
+        ``formats.load_draft()``, which is stored as-is (decompressed) after
+        checking that it parses. Drafts read from files are named after the
+        file by default, and others are numbered. Returns the manifest
+        entry.
+        """
+        assert self.mode == 'w', "bundle is not open for writing"
+        if isinstance(source, Draft):
+            draft = source
+            data = dump_draft(draft, format).encode('utf-8')
+        else:
+            data = bytes(read_bytes(source))
+            draft = load_draft(data)
+            format = sniff_format(data)
+            if name is None and is_path(source):
+                name = os.path.basename(
+                    split_compression(os.fspath(source))[0])
+        if name is None:
+            name = 'draft-%d.%s' % (len(self.entries) + 1, format)
+        self.zf.writestr(name, data)
+        entry = {
+            'name': name,
+            'format': format,
+            'title': draft.title,
+            'warp_threads': len(draft.warp),
+            'weft_threads': len(draft.weft),
+            'shafts': len(draft.shafts),
+            'treadles': len(draft.treadles),
+            'liftplan': draft.liftplan,
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+        }
+        self.entries.append(entry)
+        return entry
+
+    def close(self):
+        if self.zf is None:
+            return
+        if self.mode == 'w':
+            self.write_manifest()
+        self.zf.close()
+        self.zf = None
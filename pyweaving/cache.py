@@ -0,0 +1,240 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import os
+import os.path
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+from .images import encode_image
+
+
+def draft_fingerprint(draft):
+    """
+    Return a hex digest identifying the content of a draft: drafts with the
+    same threads, colors, tie-up and options have the same fingerprint.
+    """
+    return hashlib.sha256(
+        draft.to_json(compact=True).encode('utf-8')).hexdigest()
+
+
+def normalize(value):
+    """
+    Turn an option or region value into a stable, hashable form for a key.
+    """
+    if isinstance(value, slice):
+        return ('slice', value.start, value.stop, value.step)
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [normalize(v) for v in value]
+        if isinstance(value, (set, frozenset)):
+            items.sort()
+        return tuple(items)
+    return value
+
+
+class RenderCache(object):
+    """
+    A content-addressed cache of rendered drafts. Entries are keyed by the
+    draft's fingerprint, the renderer class, its options and the region
+    rendered, so an edited draft or a change of options never returns a
+    stale image.
+
+    Encoded images are kept in memory, up to ``max_bytes``, and optionally in
+    ``directory`` on disk, up to ``max_disk_bytes``. Both tiers evict the
+    least recently used entries first. ``hits``, ``disk_hits`` and
+    ``misses`` count lookups.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None,
+                 max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Fingerprints are remembered per draft object.
+        self.fingerprints = weakref.WeakKeyDictionary()
+        self.lock = threading.RLock()
+
+        self.disk_size = 0
+        if directory:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for name in os.listdir(directory):
+                self.disk_size += os.path.getsize(
+                    os.path.join(directory, name))
+
+    def fingerprint(self, draft):
+        """
+        Return the fingerprint of a draft, computing it once per draft
+        object. Call ``.forget(draft)`` after modifying a draft in place.
+        """
+        with self.lock:
+            try:
+                return self.fingerprints[draft]
+            except KeyError:
+                fingerprint = self.fingerprints[draft] = \
+                    draft_fingerprint(draft)
+                return fingerprint
+
+    def forget(self, draft):
+        """
+        Discard the remembered fingerprint of a draft which has changed.
+        """
+        with self.lock:
+            self.fingerprints.pop(draft, None)
+
+    def key(self, draft, renderer_class, options=None, region=None,
+            format='png'):
+        """
+        Return the cache key for rendering ``draft`` with ``renderer_class``
+        (or any other name for what is rendered) and ``options``.
+        """
+        if isinstance(renderer_class, type):
+            renderer_class = '%s.%s' % (renderer_class.__module__,
+                                        renderer_class.__name__)
+        parts = (self.fingerprint(draft), renderer_class,
+                 normalize(options or {}), normalize(region), format)
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        Return the cached bytes for a key, or None.
+        """
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+            if self.directory:
+                data = self.read_disk(key)
+                if data is not None:
+                    self.disk_hits += 1
+                    self.put_memory(key, data)
+                    return data
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """
+        Store bytes under a key in every tier.
+        """
+        with self.lock:
+            self.put_memory(key, data)
+            if self.directory:
+                self.write_disk(key, data)
+
+    def put_memory(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            __, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def read_disk(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        # Mark as recently used.
+        os.utime(path, None)
+        return data
+
+    def write_disk(self, key, data):
+        if len(data) > self.max_disk_bytes:
+            return
+        path = self.path(key)
+        if os.path.exists(path):
+            self.disk_size -= os.path.getsize(path)
+        # Write atomically, so other processes never see partial entries.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.disk_size += len(data)
+        if self.disk_size > self.max_disk_bytes:
+            self.evict_disk()
+
+    def evict_disk(self):
+        paths = [os.path.join(self.directory, name)
+                 for name in os.listdir(self.directory)
+                 if not name.startswith('.tmp-')]
+        paths.sort(key=os.path.getmtime)
+        for path in paths:
+            if self.disk_size <= self.max_disk_bytes:
+                break
+            self.disk_size -= os.path.getsize(path)
+            os.remove(path)
+
+    def clear(self):
+        """
+        Empty the in-memory tier. The disk tier is left alone.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Return the counters and sizes of the cache as a dict.
+        """
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'disk_bytes': self.disk_size,
+        }
+
+    def render(self, draft, renderer_class, format='png', region=None,
+               save_options=None, **options):
+        """
+        Render ``draft`` with ``renderer_class(draft, **options)``, returning
+        the encoded image as bytes, from the cache if possible. ``region`` is
+        a dict of ``render_region()`` arguments. SVG renderers produce
+        UTF-8 SVG documents; image renderers produce any format PIL can
+        write, encoded with ``images.save_image()`` and ``save_options``.
+        """
+        # Worker counts don't change the output.
+        key_options = {k: v for k, v in options.items() if k != 'workers'}
+        key_format = format
+        if save_options:
+            key_format = (format, normalize(save_options))
+        key = self.key(draft, renderer_class, key_options, region, key_format)
+        data = self.get(key)
+        if data is not None:
+            return data
+        renderer = renderer_class(draft, **options)
+        if region:
+            result = renderer.render_region(**region)
+        elif hasattr(renderer, 'make_pil_image'):
+            result = renderer.make_pil_image()
+        else:
+            result = renderer.make_svg_doc()
+        if isinstance(result, str):
+            data = result.encode('utf-8')
+        else:
+            data = encode_image(result, format, **(save_options or {}))
+        self.put(key, data)
+        return data
@@ -1,49 +1,336 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import os.path
 import sys
 import argparse
 
-from . import Draft, instructions
-from .wif import WIFReader, WIFWriter
-from .render import ImageRenderer, SVGRenderer
+from . import instructions, formats, batch
+from .animate import WeavingAnimation
+from .arrays import DraftArrays
+from .bundle import DraftBundle
+from .cache import RenderCache
+from .compact import dumps
+from .fabric import FabricRenderer
+from .floats import FloatRenderer
+from .images import png_strategies, save_image
+from .lint import WIFLinter
+from .pages import PageRenderer, paper_sizes
+from .stats import DraftStats, YarnUsage
+from .thumbs import make_thumbnails, thumbnail_inputs
+from .tiles import TileRenderer
+from .render import (ImageRenderer, ArrayImageRenderer, SVGRenderer,
+                     CompactSVGRenderer, check_panels, panel_names,
+                     region_renderer, side_names)
 
 
 def load_draft(infile):
-    if infile.endswith('.wif'):
-        return WIFReader(infile).read()
-    elif infile.endswith('.json'):
-        with open(infile) as f:
-            return Draft.from_json(f.read())
-    else:
-        raise ValueError(
-            "filename %r unrecognized: .wif and .json are supported" %
-            infile)
+    if infile == '-':
+        infile = getattr(sys.stdin, 'buffer', sys.stdin)
+    elif '.zip:' in infile:
+        # A single member of a draft bundle, e.g. library.zip:draft.wif
+        path, member = infile.split('.zip:', 1)
+        return formats.load_draft(path + '.zip', member=member)
+    return formats.load_draft(infile)
+
+
+image_renderers = {
+    'array': ArrayImageRenderer,
+    'pil': ImageRenderer,
+}
+
+
+def thread_range(s):
+    """
+    Parse a 1-based, inclusive range of thread numbers like ``480-520`` into
+    a slice.
+    """
+    start, sep, end = s.partition('-')
+    try:
+        start = int(start)
+        end = int(end) if sep else start
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected a range like 480-520")
+    return slice(start - 1, end)
+
+
+def panel_list(s):
+    """
+    Parse a comma separated list of panel names, as in ``--panels``.
+    """
+    panels = s.split(',')
+    try:
+        check_panels(panels)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return panels
+
+
+def jobs(opts):
+    return opts.jobs or os.cpu_count() or 1
+
+
+def save_options(opts):
+    """
+    Return the ``images.save_image()`` options given on the command line.
+    """
+    return {
+        'palette': not opts.rgb,
+        'compress_level': opts.compress_level,
+        'strategy': opts.png_strategy,
+        'optimize': opts.optimize,
+        'quality': opts.quality,
+        'method': opts.webp_method,
+        'lossless': opts.quality is None,
+    }
+
+
+def render_cached(opts, draft, renderer_class, region, **options):
+    """
+    Render through an on-disk cache, writing the encoded output directly.
+    """
+    cache = RenderCache(directory=opts.cache)
+    format = os.path.splitext(opts.outfile)[1][1:].lower()
+    if format == 'jpg':
+        format = 'jpeg'
+    if format != 'svg':
+        options['save_options'] = save_options(opts)
+    data = cache.render(draft, renderer_class, format=format, region=region,
+                        **options)
+    with open(opts.outfile, 'wb') as f:
+        f.write(data)
 
 
 def render(opts):
     draft = load_draft(opts.infile)
-    if opts.outfile:
+    scale = opts.scale
+    if scale is None:
+        scale = 10
+        if opts.drawdown_only:
+            # Grid lines need a square of at least 2 pixels to fit.
+            scale = 4 if opts.grid else 1
+    panels = opts.panels
+    region = opts.ends or opts.picks or panels
+    svg_renderer = CompactSVGRenderer if opts.compact else SVGRenderer
+    if opts.fabric:
+        render_fabric(opts, draft, scale)
+        return
+    if opts.cache and opts.outfile:
+        if region:
+            region = {'ends': opts.ends, 'picks': opts.picks,
+                      'panels': panels}
         if opts.outfile.endswith('.svg'):
-            SVGRenderer(draft).save(opts.outfile)
+            render_cached(opts, draft, svg_renderer, region,
+                          liftplan=opts.liftplan, scale=scale,
+                          side=opts.side)
+        else:
+            render_cached(opts, draft, image_renderers[opts.engine], region,
+                          liftplan=opts.liftplan, scale=scale,
+                          drawdown_only=opts.drawdown_only, grid=opts.grid,
+                          proportional=opts.proportional,
+                          margin_pixels=0 if opts.drawdown_only else 20,
+                          workers=jobs(opts), side=opts.side,
+                          stats=opts.stats)
+        return
+    if opts.outfile and opts.outfile.endswith('.svg'):
+        renderer = svg_renderer(draft, liftplan=opts.liftplan, scale=scale,
+                                side=opts.side)
+        if region:
+            with open(opts.outfile, 'w') as f:
+                region_renderer(renderer, opts.ends, opts.picks,
+                                panels).write_svg(f)
         else:
-            ImageRenderer(draft).save(opts.outfile)
+            renderer.save(opts.outfile)
+        return
+    renderer = image_renderers[opts.engine](
+        draft,
+        liftplan=opts.liftplan,
+        scale=scale,
+        drawdown_only=opts.drawdown_only,
+        grid=opts.grid,
+        proportional=opts.proportional,
+        margin_pixels=0 if opts.drawdown_only else 20,
+        workers=jobs(opts),
+        side=opts.side,
+        stats=opts.stats)
+    if not opts.outfile:
+        if region:
+            renderer.render_region(opts.ends, opts.picks, panels).show()
+        else:
+            renderer.make_pil_image().show()
+    elif region:
+        save_image(renderer.render_region(opts.ends, opts.picks, panels),
+                   opts.outfile, **save_options(opts))
     else:
-        ImageRenderer(draft).show()
+        renderer.save(opts.outfile, **save_options(opts))
 
 
-def convert(opts):
+def render_fabric(opts, draft, scale):
+    """
+    Render the cloth woven from a draft, optionally just some of its
+    threads.
+    """
+    if opts.ends or opts.picks:
+        draft = draft.region(opts.ends, opts.picks)
+    options = dict(scale=scale, noise=opts.noise,
+                   proportional=opts.proportional, workers=jobs(opts),
+                   side=opts.side)
+    if opts.cache and opts.outfile:
+        render_cached(opts, draft, FabricRenderer, None, **options)
+        return
+    renderer = FabricRenderer(draft, **options)
+    if opts.outfile:
+        renderer.save(opts.outfile, **save_options(opts))
+    else:
+        renderer.show()
+
+
+def floats(opts):
+    draft = load_draft(opts.infile)
+    renderer = FloatRenderer(draft, scale=opts.scale, side=opts.side,
+                             overlay=opts.overlay, alpha=opts.alpha,
+                             threshold=opts.threshold,
+                             max_length=opts.max_length, workers=jobs(opts))
+    if opts.outfile:
+        renderer.save(opts.outfile)
+    else:
+        renderer.show()
+
+
+def animate(opts):
+    draft = load_draft(opts.infile)
+    animation = WeavingAnimation(draft, scale=opts.scale,
+                                 picks_per_frame=opts.picks_per_frame,
+                                 fabric=opts.fabric, noise=opts.noise,
+                                 proportional=opts.proportional)
+    if '%' in opts.outfile:
+        animation.save_frames(opts.outfile)
+    else:
+        animation.save(opts.outfile, duration=opts.duration, hold=opts.hold,
+                       loop=opts.loop)
+
+
+def pages(opts):
+    draft = load_draft(opts.infile)
+    renderer = PageRenderer(draft, liftplan=opts.liftplan, paper=opts.paper,
+                            landscape=opts.landscape, dpi=opts.dpi,
+                            square=opts.square)
+    if '%' in opts.outfile:
+        renderer.save_pages(opts.outfile)
+    else:
+        renderer.save_pdf(opts.outfile)
+
+
+def tiles(opts):
     draft = load_draft(opts.infile)
-    if opts.outfile.endswith('.wif'):
-        WIFWriter(draft).write(opts.outfile)
-    elif opts.outfile.endswith('.json'):
-        with open(opts.outfile, 'w') as f:
-            f.write(draft.to_json())
+    renderer = TileRenderer(draft, scale=opts.scale,
+                            tile_size=opts.tile_size, overlap=opts.overlap,
+                            format=opts.format, workers=jobs(opts))
+    if opts.layout == 'xyz':
+        renderer.save_xyz(opts.outfile)
+    else:
+        renderer.save_deepzoom(opts.outfile)
+
+
+def is_batch(infiles):
+    return ((len(infiles) > 1) or
+            os.path.isdir(infiles[0]) or
+            batch.is_pattern(infiles[0]))
+
+
+def run_batch(opts, func, jobs, failed=()):
+    """
+    Run a batch with the options common to batch commands. ``failed`` are
+    results of jobs which failed without being run, which are reported with
+    the rest.
+    """
+    progress = None if opts.quiet else batch.Progress(len(jobs)).update
+    results = batch.run_batch(func, jobs, workers=opts.jobs,
+                              progress=progress)
+    results.extend(failed)
+    if opts.errors:
+        batch.write_error_report(results, opts.errors)
+    return results
+
+
+def convert(opts):
+    if not is_batch(opts.infiles):
+        draft = load_draft(opts.infiles[0])
+        formats.save_draft(draft, opts.outfile,
+                           format=opts.format,
+                           liftplan=opts.liftplan,
+                           compact=opts.compact)
+        return
+
+    if not opts.format:
+        raise SystemExit("--format is required to convert multiple drafts")
+    options = {
+        'force': opts.force,
+        'liftplan': opts.liftplan,
+        'compact': opts.compact,
+    }
+    jobs = [(path,
+             batch.output_path(relpath, opts.outfile, opts.format,
+                               opts.compression),
+             options)
+            for path, relpath in batch.expand_inputs(opts.infiles)]
+    jobs, failed = batch.split_duplicates(jobs)
+    for result in failed:
+        print("%s: %s" % (result['infile'], result['message']),
+              file=sys.stderr)
+    results = run_batch(opts, batch.convert_one, jobs, failed)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print("Converted %d, skipped %d, failed %d." % (
+        counts.get('ok', 0), counts.get('skipped', 0), counts.get('error', 0)))
+    return 1 if counts.get('error') else 0
+
+
+def bundle(opts):
+    if opts.list:
+        with DraftBundle(opts.outfile) as b:
+            for entry in b.entries:
+                print(entry['name'], entry.get('title', ''))
+        return
+    with DraftBundle(opts.outfile, 'w') as b:
+        for infile in opts.infiles:
+            b.add(infile)
+
+
+def lint(opts):
+    data = formats.read_bytes(opts.infile)
+    linter = WIFLinter(data)
+    diagnostics = linter.lint()
+    if opts.json:
+        print(dumps([d.as_dict() for d in diagnostics]))
+    else:
+        for diagnostic in diagnostics:
+            print(diagnostic)
+    if opts.fix:
+        fixed = linter.repair()
+        formats.write_bytes(opts.fix, fixed.encode('utf-8'))
+        remaining = WIFLinter(fixed.encode('utf-8'))
+        remaining.lint()
+        return 1 if remaining.errors else 0
+    return 1 if linter.errors else 0
 
 
 def thread(opts):
     draft = load_draft(opts.infile)
-    instructions.threading(draft, opts.repeats)
+    if not (opts.plan or opts.json or opts.output):
+        instructions.threading(draft, opts.repeats)
+        return
+    plan = instructions.ThreadingPlan(draft, opts.repeats)
+    if opts.json or (opts.output and opts.output.endswith('.json')):
+        text = dumps(plan.as_dict())
+    else:
+        text = '\n'.join(plan.lines())
+    if opts.output and opts.output != '-':
+        with open(opts.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
 
 
 def weave(opts):
@@ -63,9 +350,40 @@ def tieup(opts):
     instructions.tieup(draft)
 
 
+def thumbs(opts):
+    found = thumbnail_inputs(opts.infiles, opts.outdir)
+    progress = None
+    if not opts.quiet:
+        progress = batch.Progress(len(found)).update
+    results = make_thumbnails(opts.infiles, opts.outdir, size=opts.size,
+                              workers=opts.jobs, force=opts.force,
+                              progress=progress, found=found)
+    if opts.errors:
+        batch.write_error_report(results, opts.errors)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print("Made %d, skipped %d, failed %d." % (
+        counts.get('ok', 0), counts.get('skipped', 0), counts.get('error', 0)))
+    return 1 if counts.get('error') else 0
+
+
 def stats(opts):
-    draft = load_draft(opts.infile)
-    warp_longest, weft_longest = draft.compute_longest_floats()
+    if is_batch(opts.infiles):
+        return batch_stats(opts)
+    draft = load_draft(opts.infiles[0])
+    # One set of arrays, so the drawdown is computed once for all the stats.
+    arrays = DraftArrays(draft)
+    usage = YarnUsage(draft, arrays, epi=opts.epi, ppi=opts.ppi,
+                      take_up=opts.take_up, repeats=opts.repeats,
+                      loom_waste=opts.loom_waste)
+    if opts.json:
+        stats = batch.draft_stats(draft, arrays)
+        stats['cloth_width'] = usage.cloth_width
+        stats['cloth_length'] = usage.cloth_length
+        stats['colors'] = usage.colors()
+        print(dumps(stats))
+        return
     print("Title:", draft.title)
     print("Author:", draft.author)
     print("Address:", draft.address)
@@ -75,12 +393,36 @@ def stats(opts):
     print("Notes:", draft.notes)
     print("Date:", draft.date)
     print("***")
-    print("Warp Threads:", len(draft.warp))
-    print("Weft Threads:", len(draft.weft))
-    print("Shafts:", len(draft.shafts))
-    print("Treadles:", len(draft.treadles))
-    print("Longest Float (Warp):", warp_longest)
-    print("Longest Float (Weft):", weft_longest)
+    for label, text in DraftStats(draft, arrays).rows():
+        print("%s:" % label, text)
+    print("***")
+    if usage.known:
+        print("Cloth: %.1f x %.1f in" % (usage.cloth_width,
+                                         usage.cloth_length))
+    for label, text in usage.rows():
+        print("%s:" % label, text)
+
+
+def batch_stats(opts):
+    paths = [path for path, relpath in batch.expand_inputs(opts.infiles)]
+    results = run_batch(opts, batch.stats_one, paths)
+    if opts.output and opts.output != '-':
+        format = 'json' if opts.output.endswith('.json') else 'csv'
+        with open(opts.output, 'w') as f:
+            batch.write_results(results, f, format=format)
+    else:
+        batch.write_results(results, sys.stdout,
+                            format='json' if opts.json else 'csv')
+    return 1 if any(r['status'] == 'error' for r in results) else 0
+
+
+def add_batch_arguments(p):
+    p.add_argument('--jobs', '-j', type=int, default=None,
+                   help='Number of worker processes (default: CPU count).')
+    p.add_argument('--errors', metavar='REPORT',
+                   help='Write a JSON report of drafts that failed.')
+    p.add_argument('--quiet', '-q', action='store_true',
+                   help="Don't show progress.")
 
 
 def main(argv=sys.argv):
@@ -93,21 +435,212 @@ def main(argv=sys.argv):
     p_render.add_argument('infile')
     p_render.add_argument('outfile', nargs='?')
     p_render.add_argument('--liftplan', action='store_true')
+    p_render.add_argument('--engine', choices=sorted(image_renderers),
+                          default='array',
+                          help='Raster engine: NumPy arrays (default) or '
+                          'one PIL call per square')
+    p_render.add_argument('--scale', type=int, default=None,
+                          help='Pixels per square (default 10, or 1 with '
+                          '--drawdown-only, 4 with --grid too)')
+    p_render.add_argument('--drawdown-only', action='store_true',
+                          help='Render just the drawdown, without threading, '
+                          'tie-up or treadling')
+    p_render.add_argument('--grid', action='store_true',
+                          help='Add grid lines to a --drawdown-only render')
+    p_render.add_argument('--proportional', action='store_true',
+                          help='Size threads by their spacing and thickness '
+                          'in --drawdown-only and --fabric renders')
+    p_render.add_argument('--ends', type=thread_range, metavar='FIRST-LAST',
+                          help='Render only this range of warp threads')
+    p_render.add_argument('--picks', type=thread_range, metavar='FIRST-LAST',
+                          help='Render only this range of weft threads')
+    p_render.add_argument('--panels', type=panel_list, metavar='PANEL,...',
+                          help='Render only these panels, cropped to fit: '
+                          '%s' % ', '.join(panel_names))
+    p_render.add_argument('--jobs', '-j', type=int, default=None,
+                          help='Number of threads painting the drawdown '
+                          '(default: CPU count)')
+    p_render.add_argument('--fabric', action='store_true',
+                          help='Render the woven cloth, shaded, instead of '
+                          'the draft')
+    p_render.add_argument('--side', choices=side_names, default='face',
+                          help='Side of the fabric to render: the face '
+                          '(default), the back, or both side by side')
+    p_render.add_argument('--stats', action='store_true',
+                          help='Add a table of the draft\'s statistics '
+                          'beside an image render')
+    p_render.add_argument('--noise', type=float, default=0.0,
+                          help='Yarn texture for --fabric (0-1, default 0)')
+    p_render.add_argument('--compact', action='store_true',
+                          help='Write compact SVG, with shared definitions, '
+                          'CSS classes and merged paths')
+    p_render.add_argument('--cache', metavar='DIR',
+                          help='Reuse renders of unchanged drafts from this '
+                          'directory')
+    p_render.add_argument('--rgb', action='store_true',
+                          help='Save PNG and GIF as RGB, not palette images')
+    p_render.add_argument('--compress-level', type=int, default=None,
+                          choices=range(10), metavar='0-9',
+                          help='PNG compression level (lower is faster)')
+    p_render.add_argument('--png-strategy', choices=sorted(png_strategies),
+                          default=None, help='PNG zlib compression strategy')
+    p_render.add_argument('--optimize', action='store_true',
+                          help='Search for the smallest PNG encoding')
+    p_render.add_argument('--quality', type=int, default=None,
+                          help='Lossy WebP or JPEG quality (0-100); WebP is '
+                          'lossless without it')
+    p_render.add_argument('--webp-method', type=int, default=None,
+                          choices=range(7), metavar='0-6',
+                          help='WebP encoding method (lower is faster)')
     p_render.set_defaults(function=render)
 
+    p_tiles = subparsers.add_parser(
+        'tiles',
+        help='Render a drawdown as a pyramid of tiles for pan and zoom.')
+    p_tiles.add_argument('infile')
+    p_tiles.add_argument('outfile',
+                         help='DeepZoom .dzi file, or directory for XYZ.')
+    p_tiles.add_argument('--layout', choices=('deepzoom', 'xyz'),
+                         default='deepzoom')
+    p_tiles.add_argument('--scale', type=int, default=10,
+                         help='Pixels per square at the most detailed level.')
+    p_tiles.add_argument('--tile-size', type=int, default=256)
+    p_tiles.add_argument('--overlap', type=int, default=0,
+                         help='Pixels of overlap between DeepZoom tiles.')
+    p_tiles.add_argument('--format', choices=('png', 'jpeg', 'webp'),
+                         default='png')
+    p_tiles.add_argument('--jobs', '-j', type=int, default=None,
+                         help='Number of threads rendering tiles '
+                         '(default: CPU count)')
+    p_tiles.set_defaults(function=tiles)
+
+    p_floats = subparsers.add_parser(
+        'floats', help='Render a heatmap of the float lengths of a draft.')
+    p_floats.add_argument('infile')
+    p_floats.add_argument('outfile', nargs='?')
+    p_floats.add_argument('--scale', type=int, default=4,
+                          help='Pixels per square (default 4)')
+    p_floats.add_argument('--side', choices=side_names, default='face',
+                          help='Side of the fabric to render: the face '
+                          '(default), the back, or both side by side')
+    p_floats.add_argument('--threshold', type=int, default=None,
+                          help='Highlight floats longer than this many '
+                          'squares')
+    p_floats.add_argument('--overlay', action='store_true',
+                          help='Blend the heatmap over the drawdown')
+    p_floats.add_argument('--alpha', type=float, default=0.6,
+                          help='Strength of the --overlay heatmap (0-1, '
+                          'default 0.6; 0 shows only highlights)')
+    p_floats.add_argument('--max-length', type=int, default=None,
+                          help='Float length shown in red (default: the '
+                          'longest float)')
+    p_floats.add_argument('--jobs', '-j', type=int, default=None,
+                          help='Number of threads painting the heatmap '
+                          '(default: CPU count)')
+    p_floats.set_defaults(function=floats)
+
+    p_animate = subparsers.add_parser(
+        'animate', help='Animate a draft being woven, pick by pick.')
+    p_animate.add_argument('infile')
+    p_animate.add_argument('outfile',
+                           help='Animated .gif, .png or .apng file, or a '
+                           'pattern such as frames/%%04d.png for numbered '
+                           'frames.')
+    p_animate.add_argument('--scale', type=int, default=4,
+                           help='Pixels per square (default 4)')
+    p_animate.add_argument('--picks-per-frame', type=int, default=10,
+                           help='Picks woven in each frame (default 10)')
+    p_animate.add_argument('--fabric', action='store_true',
+                           help='Animate the shaded cloth instead of the '
+                           'drawdown')
+    p_animate.add_argument('--noise', type=float, default=0.0,
+                           help='Yarn texture for --fabric (0-1, default 0)')
+    p_animate.add_argument('--proportional', action='store_true',
+                           help='Size threads by their spacing and '
+                           'thickness in --fabric animations')
+    p_animate.add_argument('--duration', type=int, default=100,
+                           help='Milliseconds per frame (default 100)')
+    p_animate.add_argument('--hold', type=int, default=None,
+                           help='Milliseconds to show the last frame')
+    p_animate.add_argument('--loop', type=int, default=0,
+                           help='Times to play the animation (default 0, '
+                           'for ever)')
+    p_animate.set_defaults(function=animate)
+
+    p_pages = subparsers.add_parser(
+        'pages', help='Print the lift plan or treadling of a draft, '
+        'split into pages.')
+    p_pages.add_argument('infile')
+    p_pages.add_argument('outfile',
+                         help='PDF file, or a pattern such as '
+                         'pages/%%03d.png for numbered page images.')
+    p_pages.add_argument('--liftplan', dest='liftplan', action='store_true',
+                         default=None,
+                         help='Print a lift plan (the default for drafts '
+                         'without treadles)')
+    p_pages.add_argument('--treadling', dest='liftplan',
+                         action='store_false',
+                         help='Print the tie-up and treadling')
+    p_pages.add_argument('--paper', choices=sorted(paper_sizes),
+                         default='letter')
+    p_pages.add_argument('--landscape', action='store_true')
+    p_pages.add_argument('--dpi', type=int, default=150,
+                         help='Dots per inch (default 150)')
+    p_pages.add_argument('--square', type=float, default=0.2,
+                         help='Size of each square in inches (default 0.2)')
+    p_pages.set_defaults(function=pages)
+
     p_convert = subparsers.add_parser(
         'convert',
         help='Convert between draft file types.')
-    p_convert.add_argument('infile')
-    p_convert.add_argument('outfile')
+    p_convert.add_argument('infiles', nargs='+', metavar='infile',
+                           help='Draft files, directories or glob patterns.')
+    p_convert.add_argument('outfile',
+                           help='Output file, or directory for many inputs.')
     p_convert.add_argument('--liftplan', action='store_true')
+    p_convert.add_argument('--compact', action='store_true',
+                           help='Use the compact JSON encoding.')
+    p_convert.add_argument('--format', choices=('wif', 'json'),
+                           help='Output format (required for many inputs).')
+    p_convert.add_argument('--compression',
+                           choices=sorted(batch.compression_suffixes),
+                           help='Compress outputs of a batch conversion.')
+    p_convert.add_argument('--force', action='store_true',
+                           help='Convert even if outputs are up to date.')
+    add_batch_arguments(p_convert)
     p_convert.set_defaults(function=convert)
 
+    p_bundle = subparsers.add_parser(
+        'bundle',
+        help='Pack drafts into a zip bundle, or list its contents.')
+    p_bundle.add_argument('outfile')
+    p_bundle.add_argument('infiles', nargs='*')
+    p_bundle.add_argument('--list', action='store_true')
+    p_bundle.set_defaults(function=bundle)
+
+    p_lint = subparsers.add_parser(
+        'lint',
+        help='Check a WIF file for problems, optionally repairing them.')
+    p_lint.add_argument('infile')
+    p_lint.add_argument('--fix', metavar='OUTFILE',
+                        help='Write a repaired copy of the WIF.')
+    p_lint.add_argument('--json', action='store_true',
+                        help='Print diagnostics as JSON.')
+    p_lint.set_defaults(function=lint)
+
     p_thread = subparsers.add_parser(
         'thread',
         help='Show threading instructions for a draft.')
     p_thread.add_argument('infile')
     p_thread.add_argument('--repeats', type=int, default=1)
+    p_thread.add_argument('--plan', action='store_true',
+                          help='Print the threading plan, instead of '
+                          'stepping through each end.')
+    p_thread.add_argument('--json', action='store_true',
+                          help='Print the threading plan as JSON.')
+    p_thread.add_argument('--output', '-o',
+                          help='Save the threading plan to a text or .json '
+                          'file.')
     p_thread.set_defaults(function=thread)
 
     p_weave = subparsers.add_parser(
@@ -125,11 +658,48 @@ def main(argv=sys.argv):
         help='Show tie-up instructions for a draft.')
     p_tieup.add_argument('infile')
 
+    p_thumbs = subparsers.add_parser(
+        'thumbs',
+        help='Make drawdown thumbnails of many drafts, with an index.')
+    p_thumbs.add_argument('infiles', nargs='+', metavar='infile',
+                          help='Draft files, directories or glob patterns.')
+    p_thumbs.add_argument('outdir',
+                          help='Directory for the thumbnails and index.json.')
+    p_thumbs.add_argument('--size', type=int, default=128,
+                          help='Width and height of thumbnails in pixels '
+                          '(default 128)')
+    p_thumbs.add_argument('--force', action='store_true',
+                          help='Remake thumbnails of unchanged drafts.')
+    add_batch_arguments(p_thumbs)
+    p_thumbs.set_defaults(function=thumbs)
+
     p_stats = subparsers.add_parser(
         'stats',
-        help='Print stats for a draft.')
-    p_stats.add_argument('infile')
+        help='Print stats for a draft, or a CSV/JSON table for many.')
+    p_stats.add_argument('infiles', nargs='+', metavar='infile',
+                         help='Draft files, directories or glob patterns.')
+    p_stats.add_argument('--output', '-o',
+                         help='Write batch results to a .csv or .json file.')
+    p_stats.add_argument('--json', action='store_true',
+                         help='Print the statistics as JSON.')
+    p_stats.add_argument('--epi', type=float,
+                         help='Ends per inch, for yarn lengths of drafts '
+                         'without thread spacing.')
+    p_stats.add_argument('--ppi', type=float,
+                         help='Picks per inch, for yarn lengths of drafts '
+                         'without thread spacing.')
+    p_stats.add_argument('--take-up', type=float, default=0.1,
+                         help='Extra fraction of yarn taken up by weaving '
+                         '(default 0.1)')
+    p_stats.add_argument('--repeats', type=float, default=1,
+                         help='Number of times the picks are woven '
+                         '(default 1)')
+    p_stats.add_argument('--loom-waste', type=float, default=0,
+                         help='Inches of unwoven warp per end (default 0)')
+    add_batch_arguments(p_stats)
     p_stats.set_defaults(function=stats)
 
     opts, args = p.parse_known_args(argv[1:])
+    if getattr(opts, 'grid', False) and (opts.scale or 2) < 2:
+        p_render.error('--grid needs a --scale of at least 2')
     return opts.function(opts)
@@ -0,0 +1,282 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from . import Color, WarpThread, WeftThread
+
+
+FORMAT_NAME = 'pyweaving.compact'
+FORMAT_VERSION = 1
+
+# Liftplan and tie-up rows are stored as integer bitmasks. Past this many
+# shafts the masks would no longer survive a round trip through a browser's
+# double-precision numbers, so rows fall back to lists of shaft indexes.
+MAX_MASK_BITS = 52
+
+# Longest block considered when searching for repeats in a sequence.
+MAX_BLOCK = 64
+
+
+def dumps(obj):
+    """
+    Serialize ``obj`` to a compact JSON string, using orjson if it is
+    available.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def loads(s):
+    """
+    Parse a JSON string or bytes, using orjson if it is available.
+    """
+    if orjson is not None:
+        return orjson.loads(s)
+    if isinstance(s, bytes):
+        s = s.decode('utf-8')
+    return json.loads(s)
+
+
+def rle_encode(seq, max_block=MAX_BLOCK):
+    """
+    Run-length encode a sequence as a list of ``[count, block]`` pairs, where
+    ``block`` is a list of values which is repeated ``count`` times. Repeated
+    blocks of up to ``max_block`` values are detected, so e.g. a straight
+    draw threading collapses to a single pair.
+    """
+    seq = list(seq)
+    n = len(seq)
+    runs = []
+    literal = []
+    ii = 0
+    while ii < n:
+        best_size = best_count = 1
+        for size in range(1, min(max_block, (n - ii) // 2) + 1):
+            block = seq[ii:ii + size]
+            count = 1
+            jj = ii + size
+            while seq[jj:jj + size] == block:
+                count += 1
+                jj += size
+            if (count - 1) * size > (best_count - 1) * best_size:
+                best_size, best_count = size, count
+        if best_count > 1:
+            if literal:
+                runs.append([1, literal])
+                literal = []
+            runs.append([best_count, seq[ii:ii + best_size]])
+            ii += best_size * best_count
+        else:
+            literal.append(seq[ii])
+            ii += 1
+    if literal:
+        runs.append([1, literal])
+    return runs
+
+
+def rle_decode(runs):
+    """
+    Expand a list of ``[count, block]`` pairs produced by ``rle_encode()``.
+    """
+    ret = []
+    for count, block in runs:
+        ret.extend(block * count)
+    return ret
+
+
+def encode_seq(seq, rle):
+    if rle:
+        runs = rle_encode(seq)
+        # Only worth it if it actually saves entries.
+        if sum(len(block) for count, block in runs) + len(runs) < len(seq):
+            return {'rle': runs}
+    return list(seq)
+
+
+def decode_seq(obj):
+    if isinstance(obj, dict):
+        return rle_decode(obj['rle'])
+    return obj
+
+
+def mask_for(indexes, use_masks):
+    if not use_masks:
+        return sorted(indexes)
+    mask = 0
+    for index in indexes:
+        mask |= 1 << index
+    return mask
+
+
+def unmask(row, items, cache):
+    """
+    Return a new set of the ``items`` selected by a bitmask (or index list)
+    row. Decoded rows are memoized in ``cache`` since liftplans tend to reuse
+    a handful of distinct rows.
+    """
+    key = row if isinstance(row, int) else tuple(row)
+    selected = cache.get(key)
+    if selected is None:
+        if isinstance(row, int):
+            selected = []
+            index = 0
+            while row:
+                if row & 1:
+                    selected.append(items[index])
+                row >>= 1
+                index += 1
+        else:
+            selected = [items[index] for index in row]
+        cache[key] = selected
+    return set(selected)
+
+
+def encode_draft(draft, rle=True):
+    """
+    Return the compact representation of ``draft`` as a JSON-compatible dict.
+
+    Thread colors are stored as indexes into a palette, shafts and treadles
+    as indexes, and liftplan, treadling and tie-up rows as bitmasks. With
+    ``rle``, each per-thread sequence is run-length encoded when that makes
+    it smaller.
+    """
+    shaft_index = {shaft: ii for ii, shaft in enumerate(draft.shafts)}
+    treadle_index = {treadle: ii for ii, treadle in enumerate(draft.treadles)}
+    use_masks = max(len(draft.shafts), len(draft.treadles)) <= MAX_MASK_BITS
+
+    palette = []
+    palette_index = {}
+
+    def color_no(color):
+        if color is None:
+            return None
+        no = palette_index.get(color.rgb)
+        if no is None:
+            no = palette_index[color.rgb] = len(palette)
+            palette.append(list(color.rgb))
+        return no
+
+    warp_colors = [color_no(thread.color) for thread in draft.warp]
+    warp_shafts = [shaft_index.get(thread.shaft) for thread in draft.warp]
+
+    weft_colors = [color_no(thread.color) for thread in draft.weft]
+    weft_shafts = [mask_for([shaft_index[sh] for sh in thread.shafts],
+                            use_masks)
+                   for thread in draft.weft]
+    weft_treadles = [mask_for([treadle_index[tr] for tr in thread.treadles],
+                              use_masks)
+                     for thread in draft.weft]
+
+    tieup = [mask_for([shaft_index[sh] for sh in treadle.shafts], use_masks)
+             for treadle in draft.treadles]
+
+    warp = {
+        'colors': encode_seq(warp_colors, rle),
+        'shafts': encode_seq(warp_shafts, rle),
+    }
+    weft = {
+        'colors': encode_seq(weft_colors, rle),
+        'shafts': encode_seq(weft_shafts, rle),
+        'treadles': encode_seq(weft_treadles, rle),
+    }
+    # Thread sizes are optional, and only stored when some are known.
+    for obj, threads in ((warp, draft.warp), (weft, draft.weft)):
+        for attr in ('spacing', 'thickness'):
+            values = [getattr(thread, attr) for thread in threads]
+            if any(value is not None for value in values):
+                obj[attr] = encode_seq(values, rle)
+
+    return {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'liftplan': draft.liftplan,
+        'rising_shed': draft.rising_shed,
+        'start_at_lowest_thread': draft.start_at_lowest_thread,
+        'num_shafts': len(draft.shafts),
+        'num_treadles': len(draft.treadles),
+        'palette': palette,
+        'warp': warp,
+        'weft': weft,
+        'tieup': tieup,
+        'date': draft.date,
+        'title': draft.title,
+        'author': draft.author,
+        'address': draft.address,
+        'email': draft.email,
+        'telephone': draft.telephone,
+        'fax': draft.fax,
+        'notes': draft.notes,
+    }
+
+
+def decode_draft(cls, obj):
+    """
+    Construct a new ``cls`` (a Draft class) instance from its compact
+    representation. Counterpart to ``encode_draft()``.
+    """
+    if obj.get('version', 0) > FORMAT_VERSION:
+        raise ValueError("compact draft version %r is not supported" %
+                         obj['version'])
+
+    draft = cls(num_shafts=obj['num_shafts'],
+                num_treadles=obj['num_treadles'],
+                liftplan=obj['liftplan'],
+                rising_shed=obj['rising_shed'],
+                start_at_lowest_thread=obj.get('start_at_lowest_thread',
+                                               True),
+                date=obj.get('date'),
+                title=obj.get('title', ''),
+                author=obj.get('author', ''),
+                address=obj.get('address', ''),
+                email=obj.get('email', ''),
+                telephone=obj.get('telephone', ''),
+                fax=obj.get('fax', ''),
+                notes=obj.get('notes', ''))
+
+    palette = [Color(rgb) for rgb in obj['palette']]
+
+    def color(no):
+        return None if no is None else palette[no]
+
+    shafts = draft.shafts
+    treadles = draft.treadles
+
+    warp = obj['warp']
+    for color_no, shaft_no in zip(decode_seq(warp['colors']),
+                                  decode_seq(warp['shafts'])):
+        draft.warp.append(WarpThread(
+            color=color(color_no),
+            shaft=None if shaft_no is None else shafts[shaft_no],
+        ))
+
+    weft = obj['weft']
+    shaft_cache = {}
+    treadle_cache = {}
+    for color_no, shaft_row, treadle_row in zip(
+            decode_seq(weft['colors']),
+            decode_seq(weft['shafts']),
+            decode_seq(weft['treadles'])):
+        draft.weft.append(WeftThread(
+            color=color(color_no),
+            shafts=unmask(shaft_row, shafts, shaft_cache),
+            treadles=unmask(treadle_row, treadles, treadle_cache),
+        ))
+
+    for seq, threads in ((warp, draft.warp), (weft, draft.weft)):
+        for attr in ('spacing', 'thickness'):
+            if attr in seq:
+                for thread, value in zip(threads, decode_seq(seq[attr])):
+                    setattr(thread, attr, value)
+
+    tieup_cache = {}
+    for treadle, row in zip(treadles, obj['tieup']):
+        treadle.shafts = unmask(row, shafts, tieup_cache)
+
+    return draft
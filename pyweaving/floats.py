@@ -0,0 +1,166 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import copy
+
+import numpy as np
+from PIL import Image
+
+from .arrays import DraftArrays, as_rgb, parallel_rows, upscale
+from .images import join_images, palette_image, save_image
+
+
+# Colors of the heatmap, from the shortest floats to the longest.
+heat_stops = np.array([
+    (44, 123, 182),
+    (171, 217, 233),
+    (255, 255, 191),
+    (253, 174, 97),
+    (215, 25, 28),
+], dtype=float)
+
+
+def heat_colors(max_length):
+    """
+    Return a ``(max_length + 1, 3)`` table of the heatmap color of each
+    float length, from 1 square (blue) to ``max_length`` (red). Length 0 is
+    black.
+    """
+    t = np.linspace(0, 1, max(1, max_length))
+    position = t * (len(heat_stops) - 1)
+    low = np.minimum(position.astype(int), len(heat_stops) - 2)
+    frac = (position - low)[:, np.newaxis]
+    colors = np.zeros((max_length + 1, 3), dtype=np.uint8)
+    colors[1:] = np.round((heat_stops[low] * (1 - frac)) +
+                          (heat_stops[low + 1] * frac))[:max_length]
+    return colors
+
+
+class FloatRenderer(object):
+    """
+    Render the length of the float in every square of a draft: a heatmap
+    which makes long floats, the main structural risk of a weave, stand out
+    across a whole draft.
+
+    Each square is colored by the length of the float on top of it, warp or
+    weft, from blue for the shortest to red for floats of ``max_length``
+    squares or more (the draft's longest float by default, so colors can be
+    compared between drafts by fixing it). Floats longer than ``threshold``
+    squares are painted in the ``highlight`` color instead. With
+    ``overlay``, the heat is blended over the drawdown, ``alpha`` of the way
+    (0 to just highlight long floats).
+
+    ``side`` is the side of the cloth to render: ``'face'``, ``'back'`` or
+    ``'both'``, side by side. With ``workers``, bands of picks are painted
+    in parallel.
+    """
+    def __init__(self, draft, scale=4, side='face', overlay=False, alpha=0.6,
+                 threshold=None, max_length=None, highlight=(255, 0, 255),
+                 background=(255, 255, 255), workers=1):
+        self.arrays = DraftArrays(draft)
+        self.scale = scale
+        self.side = side
+        self.overlay = overlay
+        self.alpha = alpha
+        self.threshold = threshold
+        self.max_length = max_length
+        self.highlight = highlight
+        self.background = background
+        self.workers = workers
+
+    def float_map(self):
+        """
+        Return the ``(picks, ends)`` length of the float on top of every
+        square.
+        """
+        warp, weft = self.arrays.float_lengths()
+        # Each square is on top in just one of them.
+        warp += weft
+        return warp
+
+    def colors(self, max_length):
+        """
+        Return the table of the color of each float length up to
+        ``max_length``, with the lengths above the threshold highlighted.
+        """
+        heat_length = self.max_length or max_length
+        colors = heat_colors(heat_length)
+        if max_length > heat_length:
+            # Floats longer than max_length are as red as it is.
+            colors = np.concatenate([colors, np.repeat(
+                colors[-1:], max_length - heat_length, axis=0)])
+        colors = colors[:max_length + 1]
+        if self.threshold is not None:
+            colors[self.threshold + 1:] = as_rgb(self.highlight)
+        return colors
+
+    def make_pil_image(self):
+        if self.side != 'face':
+            face = copy.copy(self)
+            face.side = 'face'
+            back = copy.copy(face)
+            back.arrays = self.arrays.back()
+            if self.side == 'both' and self.max_length is None:
+                # Color both sides on the same scale.
+                face.max_length = back.max_length = max(
+                    max(floats)
+                    for floats in self.arrays.longest_floats().values())
+            if self.side == 'back':
+                return back.make_pil_image()
+            assert self.side == 'both', "unknown side: %r" % self.side
+            images = [face.make_pil_image(), back.make_pil_image()]
+            if images[0].mode != images[1].mode:
+                images = [im.convert('RGB') for im in images]
+            return join_images(images, 2 * self.scale,
+                               as_rgb(self.background))
+        lengths = self.float_map()
+        # Both sides of the fabric share one table, up to the longest float
+        # of either.
+        max_length = max(int(lengths.max(initial=0)), self.max_length or 0)
+        colors = self.colors(max_length)
+        s = self.scale
+        picks, ends = lengths.shape
+
+        if not self.overlay and max_length < 256:
+            # One palette entry per float length.
+            cells = lengths.astype(np.uint8)
+            pixels = np.empty((picks * s, ends * s), dtype=np.uint8)
+
+            def paint_band(start, stop):
+                upscale(cells[start:stop], s,
+                        out=pixels[start * s:stop * s])
+            parallel_rows(paint_band, picks, self.workers)
+            return palette_image(pixels, colors)
+
+        arrays = self.arrays
+        warp_up = arrays.drawdown()
+        pixels = np.empty((picks * s, ends * s, 3), dtype=np.uint8)
+
+        def paint_band(start, stop):
+            heat = colors[lengths[start:stop]]
+            if self.overlay:
+                cells = np.where(warp_up[start:stop, :, np.newaxis],
+                                 arrays.warp_rgb[np.newaxis, :, :],
+                                 arrays.weft_rgb[start:stop, np.newaxis, :])
+                if self.alpha:
+                    cells = np.round((cells * (1 - self.alpha)) +
+                                     (heat * self.alpha)).astype(np.uint8)
+                if self.threshold is not None:
+                    risky = lengths[start:stop] > self.threshold
+                    cells[risky] = as_rgb(self.highlight)
+            else:
+                cells = heat
+            upscale(cells, s, out=pixels[start * s:stop * s])
+        parallel_rows(paint_band, picks, self.workers)
+        return Image.fromarray(pixels)
+
+    def show(self):
+        im = self.make_pil_image()
+        im.show()
+
+    def save(self, filename, **options):
+        """
+        Save the rendered heatmap, with options as for
+        ``images.save_image()``.
+        """
+        save_image(self.make_pil_image(), filename, **options)
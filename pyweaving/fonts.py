@@ -0,0 +1,107 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+lock = threading.Lock()
+fonts = {}
+atlases = {}
+
+
+def get_font(path, size, fallback=False):
+    """
+    Return the TrueType font at ``path`` in ``size`` pixels, loading each
+    font only once per process. If ``fallback`` is true, PIL's default font
+    is used when the font can't be loaded.
+    """
+    key = (path, size, fallback)
+    with lock:
+        font = fonts.get(key)
+        if font is None:
+            try:
+                font = ImageFont.truetype(path, size)
+            except IOError:
+                if not fallback:
+                    raise
+                font = ImageFont.load_default(size=size)
+            fonts[key] = font
+        return font
+
+
+def get_atlas(path, size, fallback=False):
+    """
+    Return the shared ``GlyphAtlas`` for a font, as loaded by ``get_font()``.
+    """
+    key = (path, size, fallback)
+    with lock:
+        atlas = atlases.get(key)
+    if atlas is None:
+        atlas = GlyphAtlas(get_font(path, size, fallback))
+        with lock:
+            atlas = atlases.setdefault(key, atlas)
+    return atlas
+
+
+class GlyphAtlas(object):
+    """
+    Rasterized labels for a font. Each string (typically a thread or shaft
+    number) is laid out and rasterized once, into an antialiased mask which
+    is then pasted wherever the label is drawn, with the same result as
+    ``ImageDraw.text()``. The digits are rasterized up front.
+    """
+    def __init__(self, font, preload='0123456789'):
+        self.font = font
+        self.glyphs = {}
+        for text in preload:
+            self.glyph(text)
+
+    def glyph(self, text):
+        """
+        Return ``(mask, bbox)`` for a string, where ``mask`` is an 'L' image
+        and ``bbox`` is its ``(left, top, right, bottom)`` relative to the
+        drawing origin.
+        """
+        glyph = self.glyphs.get(text)
+        if glyph is None:
+            left, top, right, bottom = bbox = self.font.getbbox(text)
+            mask = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), text, font=self.font,
+                                      fill=255)
+            glyph = self.glyphs[text] = (mask, bbox)
+        return glyph
+
+    def bbox(self, text):
+        """
+        Return the ``(left, top, right, bottom)`` of a string drawn at the
+        origin, as ``ImageDraw.textbbox()`` would.
+        """
+        return self.glyph(text)[1]
+
+    def alpha(self, text):
+        """
+        Return the mask of a string as a ``(height, width, 1)`` array, for
+        blending with ``blend()``.
+        """
+        mask, bbox = self.glyph(text)
+        return np.asarray(mask, dtype=np.uint32)[:, :, np.newaxis]
+
+    def draw(self, draw, xy, text, fill):
+        """
+        Draw a string with its top left at ``xy`` on a PIL ImageDraw.
+        """
+        mask, (left, top, right, bottom) = self.glyph(text)
+        draw.bitmap((xy[0] + left, xy[1] + top), mask, fill=fill)
+
+
+def blend(pixels, alpha, color):
+    """
+    Blend ``color`` over a ``(height, width, 3)`` array of pixels in place,
+    through an alpha mask, rounding as PIL does when drawing bitmaps.
+    """
+    color = np.asarray(color, dtype=np.uint32)
+    tmp = (color * alpha) + (pixels * (255 - alpha)) + 128
+    pixels[...] = ((tmp >> 8) + tmp) >> 8
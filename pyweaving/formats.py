@@ -0,0 +1,295 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import bz2
+import gzip
+import io
+import lzma
+import os.path
+
+from six import string_types
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+# How much of a document to look at when guessing its format.
+SNIFF_BYTES = 4096
+
+suffix_formats = {
+    '.wif': 'wif',
+    '.json': 'json',
+}
+
+suffix_compressions = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+compression_magic = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+zip_magic = b'PK\x03\x04'
+
+
+def is_buffer(source):
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def is_path(source):
+    return isinstance(source, string_types) or hasattr(source, '__fspath__')
+
+
+def sniff_compression(data):
+    """
+    Return the compression used for a bytes-like object, judging by its magic
+    number: one of ``'gzip'``, ``'bz2'``, ``'xz'``, ``'zstd'`` or None.
+    """
+    head = bytes(data[:6])
+    for magic, compression in compression_magic:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def is_bundle(data):
+    """
+    Check whether a bytes-like object is a zip archive, i.e. a draft bundle.
+    """
+    return bytes(data[:4]) == zip_magic
+
+
+def open_compressed(f, compression, mode='rb'):
+    """
+    Wrap the binary file object ``f`` to transparently (de)compress data as it
+    is read or written. Closing the returned object leaves ``f`` open.
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=f, mode=mode, mtime=0)
+    elif compression == 'bz2':
+        return bz2.BZ2File(f, mode)
+    elif compression == 'xz':
+        return lzma.LZMAFile(f, mode)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd support requires the zstandard package")
+        if 'r' in mode:
+            return zstandard.ZstdDecompressor().stream_reader(
+                f, closefd=False)
+        return zstandard.ZstdCompressor().stream_writer(f, closefd=False)
+    raise ValueError("unknown compression %r" % compression)
+
+
+def read_stream(f):
+    """
+    Read a binary (or text) file object to the end, decompressing on the fly
+    if the content is compressed.
+    """
+    if not (hasattr(f, 'seekable') and f.seekable()):
+        data = f.read()
+        if isinstance(data, string_types):
+            return data.encode('utf-8')
+        return read_bytes(data)
+    pos = f.tell()
+    head = f.read(6)
+    if isinstance(head, string_types):
+        return (head + f.read()).encode('utf-8')
+    f.seek(pos)
+    compression = sniff_compression(head)
+    if compression is None:
+        return f.read()
+    with open_compressed(f, compression) as g:
+        return g.read()
+
+
+def read_bytes(source):
+    """
+    Return the contents of ``source`` as a bytes-like object. ``source`` may be
+    a filename or path, bytes, a bytearray, a memoryview, or a file-like object
+    opened in either text or binary mode. Compressed content (gzip, bz2, xz or
+    zstd) is decompressed as it is read. Uncompressed buffers are returned
+    without copying.
+    """
+    if is_buffer(source):
+        compression = sniff_compression(source)
+        if compression is None:
+            return source
+        with open_compressed(io.BytesIO(source), compression) as f:
+            return f.read()
+    if is_path(source):
+        with open(source, 'rb') as f:
+            return read_stream(f)
+    if hasattr(source, 'read'):
+        return read_stream(source)
+    raise TypeError("can't read a draft from %r" % (source,))
+
+
+def decode_text(data):
+    """
+    Decode a bytes-like draft document to text. UTF-8 (with or without a BOM)
+    is tried first, falling back to Latin-1, which is what most older weaving
+    software writes.
+    """
+    if isinstance(data, string_types):
+        return data
+    try:
+        return str(data, 'utf-8-sig')
+    except UnicodeDecodeError:
+        return str(data, 'latin-1')
+
+
+def read_text(source):
+    """
+    Return the contents of ``source`` (anything accepted by ``read_bytes()``)
+    as text.
+    """
+    if isinstance(source, io.TextIOBase):
+        return source.read()
+    return decode_text(read_bytes(source))
+
+
+def sniff_format(data):
+    """
+    Guess the draft format of a document from its content. Returns ``'wif'``,
+    ``'json'``, or None if the content isn't recognized.
+    """
+    head = bytes(data[:SNIFF_BYTES])
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+    head = head.lstrip()
+    if head.startswith(b'{'):
+        return 'json'
+    head = head.lower()
+    if b'[wif]' in head or b'[contents]' in head:
+        return 'wif'
+    return None
+
+
+def split_compression(filename):
+    """
+    Split a filename into its base name and the compression implied by its
+    suffix, e.g. ``('draft.wif', 'gzip')`` for ``'draft.wif.gz'``.
+    """
+    filename = os.fspath(filename)
+    base, suffix = os.path.splitext(filename)
+    compression = suffix_compressions.get(suffix.lower())
+    if compression:
+        return base, compression
+    return filename, None
+
+
+def format_for_filename(filename):
+    """
+    Return the draft format implied by a filename's suffix, or None.
+    Compression suffixes are ignored, so ``'draft.wif.gz'`` is a WIF.
+    """
+    base, compression = split_compression(filename)
+    suffix = os.path.splitext(base)[1].lower()
+    return suffix_formats.get(suffix)
+
+
+def load_draft(source, format=None, member=None):
+    """
+    Load a Draft from ``source``, which may be a filename, a bytes-like object
+    or a file-like object, optionally compressed. Unless ``format`` (``'wif'``
+    or ``'json'``) is given, it is determined by sniffing the content rather
+    than relying on a filename.
+
+    ``source`` may also be a draft bundle (see ``pyweaving.bundle``), in which
+    case ``member`` names the draft to load. It can be omitted for bundles
+    that hold a single draft.
+    """
+    from . import Draft
+    from .wif import WIFReader
+
+    data = read_bytes(source)
+    if is_bundle(data):
+        from .bundle import DraftBundle
+        with DraftBundle(io.BytesIO(data)) as bundle:
+            if member is None:
+                names = bundle.names()
+                if len(names) != 1:
+                    raise ValueError("bundle holds %d drafts: a member name "
+                                     "is required" % len(names))
+                member = names[0]
+            return bundle.read(member)
+    format = format or sniff_format(data)
+    if format == 'wif':
+        return WIFReader(data).read()
+    elif format == 'json':
+        return Draft.from_json(data)
+    else:
+        raise ValueError("unrecognized draft content: WIF and JSON are "
+                         "supported")
+
+
+def dump_draft(draft, format, liftplan=False, compact=False):
+    """
+    Serialize ``draft`` to a string in the given format.
+    """
+    from .wif import WIFWriter
+
+    if format == 'wif':
+        return WIFWriter(draft).dumps(liftplan=liftplan)
+    elif format == 'json':
+        return draft.to_json(compact=compact)
+    raise ValueError("unrecognized draft format %r: .wif and .json are "
+                     "supported" % format)
+
+
+def save_draft(draft, target, format=None, liftplan=False, compact=False,
+               compression=None):
+    """
+    Write ``draft`` to ``target``, a filename or a file-like object opened in
+    text or binary mode. If ``format`` or ``compression`` aren't given they
+    are taken from the filename's suffixes, e.g. ``'draft.wif.xz'``.
+    """
+    if format is None:
+        if not is_path(target):
+            raise ValueError("a format is required when writing to a stream")
+        format = format_for_filename(target)
+    s = dump_draft(draft, format, liftplan=liftplan, compact=compact)
+    if compression or (is_path(target) and split_compression(target)[1]):
+        write_bytes(target, s.encode('utf-8'), compression=compression)
+    else:
+        write_text(target, s)
+
+
+def write_bytes(target, data, compression=None):
+    """
+    Write ``data`` to a filename or a binary file-like object, compressing it
+    on the fly. For filenames the compression defaults to the one implied by
+    the suffix.
+    """
+    if is_path(target):
+        if compression is None:
+            compression = split_compression(target)[1]
+        with open(target, 'wb') as f:
+            write_bytes(f, data, compression=compression)
+    elif compression:
+        with open_compressed(target, compression, 'wb') as f:
+            f.write(data)
+    else:
+        target.write(data)
+
+
+def write_text(target, s):
+    """
+    Write the string ``s`` to a filename, or to a text or binary file-like
+    object.
+    """
+    if is_path(target):
+        with io.open(target, 'w', encoding='utf-8') as f:
+            f.write(s)
+    elif isinstance(target, io.TextIOBase):
+        target.write(s)
+    else:
+        target.write(s.encode('utf-8'))
@@ -0,0 +1,435 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import binascii
+import io
+import os.path
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+
+# zlib strategies for PNG compression, by name.
+png_strategies = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+# Formats which store palette images.
+palette_formats = ('PNG', 'GIF')
+
+
+def palette_image(indices, palette):
+    """
+    Return a 'P' image from a ``(height, width)`` uint8 array of indexes into
+    a ``(colors, 3)`` palette.
+    """
+    height, width = indices.shape
+    im = Image.frombuffer('P', (width, height),
+                          np.ascontiguousarray(indices, dtype=np.uint8),
+                          'raw', 'P', 0, 1)
+    im.putpalette(np.asarray(palette, dtype=np.uint8).ravel().tolist())
+    return im
+
+
+# Odd multipliers tried by color_hash(), from Knuth's multiplicative hashing.
+hash_multipliers = [np.uint32(m) for m in (2654435761, 2246822519,
+                                           3266489917, 668265263)]
+
+
+def to_palette(im):
+    """
+    Return an RGB image as a palette ('P') image with exactly the same pixels,
+    if it has no more than 256 colors. Otherwise, or if it isn't an RGB
+    image, it is returned unchanged.
+
+    Rendered drafts use only their thread colors and a few more, so their
+    palette images are much quicker to encode, and usually smaller.
+    """
+    if im.mode != 'RGB':
+        return im
+    colors = im.getcolors(256)
+    if colors is None:
+        return im
+    palette = np.array([rgb for count, rgb in colors], dtype=np.uint8)
+    # Index pixels through a small lookup table of their packed colors,
+    # hashed without collisions. PIL's own conversion to a given palette is
+    # approximate.
+    keys = packed_colors(im)
+    palette_keys = packed_colors(Image.frombytes('RGB', (len(palette), 1),
+                                                 palette.tobytes()))
+    multiplier, shift = color_hash(palette_keys)
+    lut = np.zeros(1 << (32 - int(shift)), dtype=np.uint8)
+    lut[(palette_keys * multiplier) >> shift] = np.arange(len(palette))
+    # A band of pixels at a time, so the hashes stay in cache.
+    indices = np.empty(len(keys), dtype=np.uint8)
+    band = np.empty(min(len(keys), 1 << 14), dtype=np.uint32)
+    for start in range(0, len(keys), len(band)):
+        stop = min(start + len(band), len(keys))
+        hashes = band[:stop - start]
+        np.multiply(keys[start:stop], multiplier, out=hashes)
+        np.right_shift(hashes, shift, out=hashes)
+        lut.take(hashes, out=indices[start:stop])
+    return palette_image(indices.reshape(im.height, im.width), palette)
+
+
+def packed_colors(im):
+    """
+    Return a flat uint32 array of the colors of an RGB image, each packed
+    into one number, red in the lowest byte.
+    """
+    return np.frombuffer(im.tobytes('raw', 'RGBX'), dtype='<u4')
+
+
+def color_hash(keys):
+    """
+    Return a ``(multiplier, shift)`` which hash distinct packed colors to
+    distinct ``(key * multiplier) >> shift``, with as small a table as
+    possible. Failing that, the hash is the color itself.
+    """
+    for bits in (12, 16, 20):
+        shift = np.uint32(32 - bits)
+        for multiplier in hash_multipliers:
+            hashes = (keys * multiplier) >> shift
+            if len(np.unique(hashes)) == len(hashes):
+                return multiplier, shift
+    # Drop the padding byte.
+    return np.uint32(1 << 8), np.uint32(8)
+
+
+def join_images(images, gap, background):
+    """
+    Return images of the same mode side by side in one image, ``gap`` pixels
+    apart, on a ``background`` color given as RGB. Palette images with the
+    same palette, which holds the background, are joined into a palette
+    image; others are joined as RGB.
+    """
+    width = sum(im.width for im in images) + (gap * (len(images) - 1))
+    height = max(im.height for im in images)
+    mode = images[0].mode
+    if mode == 'P':
+        palette = images[0].getpalette()
+        colors = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+        matches = np.nonzero((colors == background).all(axis=1))[0]
+        if len(matches) and all(im.getpalette() == palette
+                                for im in images[1:]):
+            joined = Image.new('P', (width, height), int(matches[0]))
+            joined.putpalette(palette)
+        else:
+            images = [im.convert('RGB') for im in images]
+            mode = 'RGB'
+    if mode != 'P':
+        joined = Image.new(mode, (width, height),
+                           tuple(int(c) for c in background))
+    x = 0
+    for im in images:
+        joined.paste(im, (x, 0))
+        x += im.width + gap
+    return joined
+
+
+def image_format(filename):
+    """
+    Return the PIL format name for a filename's extension.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    try:
+        return Image.registered_extensions()[ext]
+    except KeyError:
+        raise ValueError("unknown image format: %r" % filename)
+
+
+def save_image(im, fp, format=None, palette=True, compress_level=None,
+               strategy=None, optimize=False, lossless=True, quality=None,
+               method=None):
+    """
+    Save a rendered image to a filename or file-like object, in ``format``
+    or the format of the filename's extension.
+
+    ``palette``
+        Save PNG and GIF images as palette images when they have no more than
+        256 colors (see ``to_palette()``).
+    ``compress_level``, ``strategy``, ``optimize``
+        PNG zlib compression level (0-9, lower is faster), zlib strategy (one
+        of ``png_strategies``), and whether to search for the smallest
+        encoding.
+    ``lossless``, ``quality``, ``method``
+        WebP options: lossless encoding (the default, so squares stay
+        crisp), quality or compression effort (0-100), and encoding method
+        (0-6, lower is faster). ``quality`` also applies to JPEG.
+    """
+    if format is None:
+        format = image_format(fp)
+    format = format.upper()
+    if format == 'JPG':
+        format = 'JPEG'
+
+    options = {}
+    if format in palette_formats and palette:
+        im = to_palette(im)
+    if format == 'PNG':
+        if compress_level is not None:
+            options['compress_level'] = compress_level
+        if strategy is not None:
+            options['compress_type'] = png_strategies[strategy]
+        if optimize:
+            options['optimize'] = True
+    elif format == 'WEBP':
+        options['lossless'] = lossless
+        if method is not None:
+            options['method'] = method
+    if quality is not None and format in ('WEBP', 'JPEG'):
+        options['quality'] = quality
+    if im.mode == 'P' and format not in palette_formats:
+        im = im.convert('RGB')
+    im.save(fp, format=format, **options)
+
+
+def encode_image(im, format='png', **options):
+    """
+    Return an image encoded as bytes, with options as for ``save_image()``.
+    """
+    f = io.BytesIO()
+    save_image(im, f, format=format, **options)
+    return f.getvalue()
+
+
+def gif_frame_data(im):
+    """
+    Encode an image as GIF, returning the ``(flags, color_table, data)`` of
+    its image block: the packed fields of its image descriptor, its color
+    table, and its LZW-compressed pixels.
+    """
+    f = io.BytesIO()
+    im.save(f, format='GIF', optimize=False)
+    gif = f.getvalue()
+    flags = gif[10]
+    pos = 13
+    color_table = b''
+    if flags & 0x80:
+        end = pos + (3 << ((flags & 7) + 1))
+        color_table = gif[pos:end]
+        pos = end
+    while gif[pos:pos + 1] == b'!':
+        # Skip extensions: a label and data sub-blocks.
+        pos += 2
+        while gif[pos]:
+            pos += gif[pos] + 1
+        pos += 1
+    assert gif[pos:pos + 1] == b',', "no image in GIF"
+    image_flags = gif[pos + 9]
+    pos += 10
+    if image_flags & 0x80:
+        end = pos + (3 << ((image_flags & 7) + 1))
+        color_table = gif[pos:end]
+        pos = end
+        flags = image_flags
+    # The LZW code size, then data sub-blocks.
+    start = pos
+    pos += 1
+    while gif[pos]:
+        pos += gif[pos] + 1
+    return ((image_flags & 0x40) | 0x80 | (flags & 7), color_table,
+            gif[start:pos + 1])
+
+
+def write_gif_animation(f, frames, durations, loop=0):
+    """
+    Write an animated GIF to a binary file, one frame at a time: see
+    ``save_animation()``. Every frame has its own color table.
+    """
+    for no, ((im, (x, y)), duration) in enumerate(zip(frames, durations)):
+        if no == 0:
+            f.write(b'GIF89a' +
+                    struct.pack('<HHBBB', im.width, im.height, 0, 0, 0))
+            # Play the frames ``loop`` times (0 for ever).
+            f.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' +
+                    struct.pack('<H', loop) + b'\x00')
+        flags, color_table, data = gif_frame_data(im)
+        # Leave each frame in place for the next to be drawn over.
+        f.write(b'!\xf9\x04' +
+                struct.pack('<BHBB', 1 << 2, int(round(duration / 10)), 0,
+                            0))
+        f.write(b',' + struct.pack('<HHHHB', x, y, im.width, im.height,
+                                   flags))
+        f.write(color_table)
+        f.write(data)
+    f.write(b';')
+
+
+def png_chunk(f, kind, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def write_png_animation(f, frames, durations, loop=0, compress_level=6):
+    """
+    Write an animated PNG to a binary file, one frame at a time: see
+    ``save_animation()``. Frames are RGB, or palette images sharing the
+    palette of the first.
+    """
+    f.write(b'\x89PNG\r\n\x1a\n')
+    sequence = 0
+    for no, ((im, (x, y)), duration) in enumerate(zip(frames, durations)):
+        if no == 0:
+            palette = im.mode == 'P'
+            png_chunk(f, b'IHDR', struct.pack('>IIBBBBB', im.width,
+                                              im.height, 8,
+                                              3 if palette else 2, 0, 0, 0))
+            if palette:
+                png_chunk(f, b'PLTE', bytes(bytearray(im.getpalette())))
+            png_chunk(f, b'acTL', struct.pack('>II', len(durations), loop))
+        else:
+            im = im.convert('P' if palette else 'RGB')
+        png_chunk(f, b'fcTL', struct.pack(
+            '>IIIIIHHBB', sequence, im.width, im.height, x, y,
+            int(round(duration)), 1000, 0, 0))
+        sequence += 1
+        # Unfiltered rows, each prefixed by its filter type (0).
+        pixels = np.asarray(im).reshape(im.height, -1)
+        rows = np.zeros((im.height, pixels.shape[1] + 1), dtype=np.uint8)
+        rows[:, 1:] = pixels
+        data = zlib.compress(rows.tobytes(), compress_level)
+        if no == 0:
+            png_chunk(f, b'IDAT', data)
+        else:
+            png_chunk(f, b'fdAT', struct.pack('>I', sequence) + data)
+            sequence += 1
+    png_chunk(f, b'IEND', b'')
+
+
+def save_animation(frames, fp, durations, format=None, loop=0):
+    """
+    Save an animation to a filename or binary file-like object, as an
+    animated GIF or PNG, in ``format`` or the format of the filename's
+    extension.
+
+    ``frames`` is an iterable of ``(image, (x, y))`` pairs: each image is
+    drawn over the frame before, at ``x``, ``y``, and the first is the size
+    of the whole animation. ``durations`` gives the time each frame is
+    shown for, in milliseconds, and so the number of frames. ``loop`` is the
+    number of times to play it, 0 for ever.
+
+    Frames are encoded and written as they are generated, so only the
+    changes are encoded, and memory use doesn't grow with the number of
+    frames.
+    """
+    if format is None:
+        format = image_format(fp)
+    format = format.upper()
+    writers = {'GIF': write_gif_animation, 'PNG': write_png_animation}
+    if format not in writers:
+        raise ValueError("can't save animations as %s" % format)
+    if hasattr(fp, 'write'):
+        writers[format](fp, frames, durations, loop)
+    else:
+        with open(fp, 'wb') as f:
+            writers[format](f, frames, durations, loop)
+
+
+class CountingWriter(object):
+    """
+    Wrap a binary file, counting the bytes written to it, so offsets are
+    known without seeking.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.offset += len(data)
+
+
+def pdf_string(text):
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return '(%s)' % text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def write_pdf(f, pages, dpi=72, title=None):
+    """
+    Write a PDF document to a binary file, one page at a time: see
+    ``save_pdf()``.
+    """
+    out = CountingWriter(f)
+    offsets = {}
+
+    def write_object(no, body, stream=None):
+        offsets[no] = out.offset
+        out.write(('%d 0 obj\n' % no).encode('latin-1'))
+        if stream is None:
+            out.write(body.encode('latin-1'))
+        else:
+            out.write(('<< %s /Length %d >>\nstream\n' %
+                       (body, len(stream))).encode('latin-1'))
+            out.write(stream)
+            out.write(b'\nendstream')
+        out.write(b'\nendobj\n')
+
+    # The catalog is object 1, the page tree 2 and the document info 3. Each
+    # page is three more objects: its image, its contents and the page.
+    out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    write_object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+    info = '/Producer (pyweaving)'
+    if title:
+        info += ' /Title %s' % pdf_string(title)
+    write_object(3, '<< %s >>' % info)
+    kids = []
+    no = 4
+    for im in pages:
+        im = to_palette(im)
+        if im.mode == 'P':
+            palette = bytes(bytearray(im.getpalette()))
+            colors = len(palette) // 3
+            color_space = '[/Indexed /DeviceRGB %d <%s>]' % (
+                colors - 1, binascii.hexlify(palette).decode('ascii'))
+        else:
+            im = im.convert('RGB')
+            color_space = '/DeviceRGB'
+        write_object(no, '/Type /XObject /Subtype /Image /Width %d '
+                     '/Height %d /ColorSpace %s /BitsPerComponent 8 '
+                     '/Filter /FlateDecode' % (im.width, im.height,
+                                               color_space),
+                     zlib.compress(im.tobytes()))
+        width = im.width * 72.0 / dpi
+        height = im.height * 72.0 / dpi
+        write_object(no + 1, '',
+                     ('q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q' %
+                      (width, height)).encode('latin-1'))
+        write_object(no + 2, '<< /Type /Page /Parent 2 0 R '
+                     '/MediaBox [0 0 %.2f %.2f] '
+                     '/Resources << /XObject << /Im0 %d 0 R >> >> '
+                     '/Contents %d 0 R >>' % (width, height, no, no + 1))
+        kids.append('%d 0 R' % (no + 2))
+        no += 3
+    write_object(2, '<< /Type /Pages /Kids [%s] /Count %d >>' %
+                 (' '.join(kids), len(kids)))
+
+    xref = out.offset
+    out.write(('xref\n0 %d\n0000000000 65535 f \n' % no).encode('latin-1'))
+    for obj in range(1, no):
+        out.write(('%010d 00000 n \n' % offsets[obj]).encode('latin-1'))
+    out.write(('trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\n'
+               'startxref\n%d\n%%%%EOF\n' % (no, xref)).encode('latin-1'))
+
+
+def save_pdf(pages, fp, dpi=72, title=None):
+    """
+    Save images as the pages of a PDF document, to a filename or binary
+    file-like object, each page the size of its image at ``dpi`` dots per
+    inch. Pages are compressed and written as they are generated, so memory
+    use doesn't grow with the number of pages. Images with no more than 256
+    colors are stored with a palette.
+    """
+    if hasattr(fp, 'write'):
+        write_pdf(fp, pages, dpi, title)
+    else:
+        with open(fp, 'wb') as f:
+            write_pdf(f, pages, dpi, title)
@@ -5,8 +5,11 @@ import os.path
 import time
 import json
 
+import numpy as np
 from six.moves import input
 
+from .arrays import period, runs
+
 
 def print_shafts(draft, connected):
     """
@@ -192,28 +195,194 @@ for ii in range(64):
     default_color_table[ii] = default_colors[ii % len(default_colors)]
 
 
+class ThreadingRun(object):
+    """
+    A run of ends threaded with a ``unit`` of shafts (0-indexed, -1 for
+    unthreaded ends) repeated ``count`` times, from end ``start`` (0-indexed).
+    """
+    def __init__(self, start, unit, count=1):
+        self.start = start
+        self.unit = unit
+        self.count = count
+
+    @property
+    def stop(self):
+        return self.start + (len(self.unit) * self.count)
+
+    def __eq__(self, other):
+        return ((self.start, self.unit, self.count) ==
+                (other.start, other.unit, other.count))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ThreadingRun(%d, %r, %d)' % (self.start, self.unit,
+                                              self.count)
+
+    def __str__(self):
+        if self.stop - self.start == 1:
+            text = 'End %d: ' % self.stop
+        else:
+            text = 'Ends %d-%d: ' % (self.start + 1, self.stop)
+        text += ','.join(str(shaft + 1) if shaft >= 0 else '-'
+                         for shaft in self.unit)
+        if self.count > 1:
+            text += ' x%d' % self.count
+        return text
+
+
+class ThreadingPlan(object):
+    """
+    A plan for threading a draft's warp ``repeats`` times: the number of
+    heddles needed on each shaft, and the threading grouped into runs of
+    repeated units, e.g. ``Ends 1-8: 1,2,3,4 x2``.
+
+    The plan is worked out once, from a single pass over the warp, and
+    repeats are only counted, not written out, so the plan of a warp of
+    thousands of ends is ready at once. If the whole threading repeats
+    with a period longer than ``max_unit``, only the first ``unit`` ends
+    are grouped into runs, followed by a note of how often to repeat them.
+    Runs repeat units of up to ``max_unit`` ends, if the repeats cover at
+    least ``min_ends`` ends; ends in no such repeat are grouped into runs of
+    up to ``max_unit`` ends.
+    """
+    def __init__(self, draft, repeats=1, max_unit=24, min_ends=4):
+        shaft_index = {shaft: ii for ii, shaft in enumerate(draft.shafts)}
+        self.threading = np.array([shaft_index.get(thread.shaft, -1)
+                                   for thread in draft.warp], dtype=np.intp)
+        self.repeats = repeats
+        self.ends = len(self.threading) * repeats
+
+        threaded = self.threading[self.threading >= 0]
+        self.heddles = (np.bincount(threaded, minlength=len(draft.shafts)) *
+                        repeats).tolist()
+        self.unthreaded = self.ends - (len(threaded) * repeats)
+        self.unit = period(self.threading)
+        if self.unit <= max_unit or 2 * self.unit > len(self.threading):
+            self.unit = len(self.threading)
+        self.runs = threading_runs(self.threading[:self.unit], max_unit,
+                                   min_ends)
+
+    @property
+    def total_heddles(self):
+        return sum(self.heddles)
+
+    def shaft(self, end):
+        """
+        Return the shaft (0-indexed) of an end of the repeated warp
+        (0-indexed), or -1 if it is unthreaded.
+        """
+        return int(self.threading[end % len(self.threading)])
+
+    def lines(self):
+        """
+        Return the plan as lines of text, for printing or saving.
+        """
+        lines = ['Heddles on shaft %d: %d' % (ii, count)
+                 for ii, count in enumerate(self.heddles, start=1)]
+        lines.append('Total heddles required: %d' % self.total_heddles)
+        if self.unthreaded:
+            lines.append('Unthreaded ends: %d' % self.unthreaded)
+        lines.extend(str(run) for run in self.runs)
+        count, rest = divmod(len(self.threading), max(1, self.unit))
+        if count > 1:
+            line = 'Repeat ends 1-%d x%d' % (self.unit, count)
+            if rest == 1:
+                line += ', then end 1'
+            elif rest:
+                line += ', then ends 1-%d' % rest
+            lines.append(line + '.')
+        if self.repeats > 1 and self.unit:
+            lines.append('Repeat ends 1-%d x%d, for %d ends in all.' % (
+                len(self.threading), self.repeats, self.ends))
+        return lines
+
+    def as_dict(self):
+        """
+        Return the plan as a dict of plain values, for JSON output. Ends and
+        shafts are numbered from 1, and unthreaded ends are shaft 0. The
+        runs cover the first ``unit`` ends, which repeat across the warp.
+        """
+        return {
+            'ends': self.ends,
+            'repeats': self.repeats,
+            'heddles': self.heddles,
+            'total_heddles': self.total_heddles,
+            'unthreaded': self.unthreaded,
+            'unit': self.unit,
+            'runs': [{'start': run.start + 1,
+                      'stop': run.stop,
+                      'shafts': [shaft + 1 for shaft in run.unit],
+                      'count': run.count}
+                     for run in self.runs],
+        }
+
+
+def threading_runs(threading, max_unit=24, min_ends=4):
+    """
+    Group a threading into a list of ``ThreadingRun``, see
+    ``ThreadingPlan``. At each end, the unit which repeats over the most
+    ends from it is taken, preferring the shortest.
+    """
+    n = len(threading)
+    # ahead[p - 1][ii] is how many ends from ii on match the end p later.
+    ahead = np.zeros((max_unit, n + 1), dtype=np.intp)
+    for p in range(1, min(max_unit, n - 1) + 1):
+        same = threading[p:] == threading[:-p]
+        __, starts, stops = runs(same[np.newaxis])
+        ahead[p - 1, np.flatnonzero(same)] = (
+            np.repeat(stops, stops - starts) - np.flatnonzero(same))
+
+    result = []
+    literal = None
+    ii = 0
+    while ii < n:
+        best_ends = best_unit = best_count = 0
+        for p in range(1, min(max_unit, (n - ii) // 2) + 1):
+            count = 1 + int(ahead[p - 1, ii] // p)
+            if count > 1 and p * count > best_ends:
+                best_ends, best_unit, best_count = p * count, p, count
+        if best_ends >= min_ends:
+            unit = tuple(threading[ii:ii + best_unit].tolist())
+            result.append(ThreadingRun(ii, unit, best_count))
+            literal = None
+            ii += best_ends
+            continue
+        if literal is None or len(literal.unit) >= max_unit:
+            literal = ThreadingRun(ii, ())
+            result.append(literal)
+        literal.unit += (int(threading[ii]),)
+        ii += 1
+    return result
+
+
 def threading(draft, repeats=1, color_table=default_color_table):
     """
     Print threading instructions.
     """
     print("\n---- THREADING INSTRUCTIONS ----\n")
-    total_count = 0
-    for ii, shaft in enumerate(draft.shafts, start=1):
-        count = len([thread for thread in draft.warp if thread.shaft == shaft])
-        count *= repeats
-        total_count += count
+    plan = ThreadingPlan(draft, repeats)
+    for ii, count in enumerate(plan.heddles, start=1):
         color = color_table[ii - 1]
         print("Heddles on shaft %d: %d\t\t%s" % (ii, count, color))
 
-    print("Total heddles required: %d" % total_count)
+    print("Total heddles required: %d" % plan.total_heddles)
+    print()
+    for line in plan.lines()[len(plan.heddles) + 1:]:
+        print(line)
 
-    for __ in range(repeats):
-        for ii, warp_thread in enumerate(draft.warp, start=1):
-            shaft_no = draft.shafts.index(warp_thread.shaft) + 1
-            heddle_color = color_table[shaft_no - 1]
+    for ii in range(plan.ends):
+        warp_thread = draft.warp[ii % len(draft.warp)]
+        shaft_no = plan.shaft(ii) + 1
+        if shaft_no:
             print("\nWarp thread %d: shaft %d\tthread: %s\theddle: %s" % (
-                ii, shaft_no, warp_thread.color.rgb, heddle_color))
-            wait_for_key()
+                ii + 1, shaft_no, warp_thread.color.rgb,
+                color_table[shaft_no - 1]))
+        else:
+            print("\nWarp thread %d: unthreaded\tthread: %s" % (
+                ii + 1, warp_thread.color.rgb))
+        wait_for_key()
 
     print("DONE!")
 
@@ -0,0 +1,588 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import OrderedDict
+
+from .formats import read_text
+
+
+ERROR = 'error'
+WARNING = 'warning'
+INFO = 'info'
+
+allowed_units = ('decipoints', 'inches', 'centimeters')
+
+# Common misspellings of units, mapped to the WIF spelling.
+unit_aliases = {
+    'decipoint': 'decipoints',
+    'inch': 'inches',
+    'in': 'inches',
+    'centimeter': 'centimeters',
+    'centimetre': 'centimeters',
+    'centimetres': 'centimeters',
+    'cm': 'centimeters',
+}
+
+# CONTENTS flags which correspond to a section of the same name.
+content_sections = (
+    'COLOR PALETTE', 'TEXT', 'WEAVING', 'WARP', 'WEFT', 'NOTES',
+    'COLOR TABLE', 'THREADING', 'TIEUP', 'TREADLING', 'LIFTPLAN',
+    'WARP COLORS', 'WEFT COLORS', 'WARP SPACING', 'WEFT SPACING',
+    'WARP THICKNESS', 'WEFT THICKNESS',
+)
+
+true_values = ('1', 'yes', 'true', 'on')
+
+
+class Diagnostic(object):
+    """
+    A single problem found in a WIF document. ``line`` is 1-indexed, and may
+    be None for problems which aren't tied to a particular line (e.g. a
+    missing section). ``fix`` is a callable which repairs the problem in the
+    linter's model of the document, or None if it can't be repaired
+    automatically.
+    """
+    def __init__(self, severity, message, section=None, line=None,
+                 fix=None):
+        self.severity = severity
+        self.message = message
+        self.section = section
+        self.line = line
+        self.fix = fix
+
+    @property
+    def fixable(self):
+        return self.fix is not None
+
+    def as_dict(self):
+        return {
+            'severity': self.severity,
+            'message': self.message,
+            'section': self.section,
+            'line': self.line,
+            'fixable': self.fixable,
+        }
+
+    def __str__(self):
+        location = []
+        if self.line is not None:
+            location.append('line %d' % self.line)
+        if self.section is not None:
+            location.append('[%s]' % self.section)
+        return '%s: %s: %s' % (' '.join(location) or '-', self.severity,
+                               self.message)
+
+    def __repr__(self):
+        return '<Diagnostic %s>' % self
+
+
+class Entry(object):
+    def __init__(self, key, value, line):
+        self.key = key
+        self.value = value
+        self.line = line
+
+
+class Section(object):
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key.lower())
+        return None if entry is None else entry.value
+
+    def set(self, key, value):
+        entry = self.entries.get(key.lower())
+        if entry is None:
+            self.entries[key.lower()] = Entry(key, value, None)
+        else:
+            entry.value = value
+
+    def remove(self, key):
+        self.entries.pop(key.lower(), None)
+
+
+def parse_ints(value):
+    """
+    Parse a comma separated list of integers, returning None if it is
+    malformed. An empty value is an empty list.
+    """
+    value = value.strip()
+    if not value:
+        return []
+    try:
+        return [int(el) for el in value.split(',')]
+    except ValueError:
+        return None
+
+
+def parse_int(value):
+    try:
+        return int(value.strip())
+    except (ValueError, AttributeError):
+        return None
+
+
+class WIFLinter(object):
+    """
+    Validate a WIF document in a single pass, collecting every problem found
+    as a ``Diagnostic`` instead of stopping at the first one, as
+    ``WIFReader`` does. ``source`` is anything accepted by ``WIFReader``.
+
+    Usage::
+
+        linter = WIFLinter(data)
+        for diagnostic in linter.lint():
+            print(diagnostic)
+        fixed_text = linter.repair()
+    """
+    def __init__(self, source):
+        self.text = read_text(source)
+        self.diagnostics = None
+
+    def report(self, severity, message, section=None, line=None, fix=None):
+        self.diagnostics.append(Diagnostic(severity, message,
+                                           section=section, line=line,
+                                           fix=fix))
+
+    def parse(self):
+        """
+        Build a model of the document: an ordered mapping of upper-cased
+        section names to ``Section`` instances. Syntax problems and duplicates
+        are reported; the model keeps the last occurrence of each key.
+        """
+        self.sections = OrderedDict()
+        section = None
+        last_entry = None
+        for line_no, line in enumerate(self.text.splitlines(), start=1):
+            stripped = line.strip()
+            if not stripped or stripped[0] in ';#':
+                continue
+            if line[0] in ' \t' and last_entry is not None:
+                # continuation of a multi-line value
+                last_entry.value += '\n' + stripped
+                continue
+            last_entry = None
+            if stripped.startswith('['):
+                if not stripped.endswith(']'):
+                    self.report(ERROR, "malformed section header %r" %
+                                stripped, line=line_no, fix=noop)
+                    section = None
+                    continue
+                name = stripped[1:-1].strip().upper()
+                if name != stripped[1:-1]:
+                    self.report(WARNING, "section names should be upper "
+                                "case: %r" % stripped, section=name,
+                                line=line_no, fix=noop)
+                if name in self.sections:
+                    self.report(ERROR, "duplicate section [%s], first "
+                                "defined on line %d" %
+                                (name, self.sections[name].line),
+                                section=name, line=line_no, fix=noop)
+                    section = self.sections[name]
+                else:
+                    section = self.sections[name] = Section(name, line_no)
+                continue
+            if section is None:
+                self.report(ERROR, "line is outside of any section",
+                            line=line_no, fix=noop)
+                continue
+            delims = [pos for pos in (stripped.find('='), stripped.find(':'))
+                      if pos > 0]
+            if not delims:
+                self.report(ERROR, "can't parse %r" % stripped,
+                            section=section.name, line=line_no, fix=noop)
+                continue
+            key = stripped[:min(delims)].strip()
+            value = stripped[min(delims) + 1:]
+            existing = section.entries.get(key.lower())
+            if existing is not None:
+                # Later definitions win, as in a non-strict ConfigParser.
+                self.report(ERROR, "duplicate key %r overrides line %d" %
+                            (key, existing.line),
+                            section=section.name, line=line_no, fix=noop)
+            last_entry = section.entries[key.lower()] = \
+                Entry(key, value.strip(), line_no)
+
+    def section(self, name):
+        return self.sections.get(name)
+
+    def has(self, name):
+        """
+        Check whether a section is both flagged in CONTENTS and present.
+        """
+        contents = self.section('CONTENTS')
+        flagged = contents is not None and \
+            (contents.get(name) or '').lower() in true_values
+        return flagged and name in self.sections
+
+    def line_of(self, section, key=None):
+        sec = self.section(section)
+        if sec is None:
+            return None
+        if key is not None:
+            entry = sec.entries.get(key.lower())
+            if entry is not None:
+                return entry.line
+        return sec.line
+
+    def get_int(self, section, key, severity=ERROR, fix=None):
+        sec = self.section(section)
+        if sec is None:
+            return None
+        value = sec.get(key)
+        if value is None:
+            self.report(severity, "%s is missing" % key, section=section,
+                        line=sec.line, fix=fix)
+            return None
+        ret = parse_int(value)
+        if ret is None:
+            self.report(severity, "%s must be an integer, not %r" %
+                        (key, value), section=section,
+                        line=self.line_of(section, key), fix=fix)
+        return ret
+
+    def check_contents(self):
+        contents = self.section('CONTENTS')
+        if contents is None:
+            self.report(ERROR, "missing [CONTENTS] section")
+            return
+        if 'WIF' not in self.sections:
+            self.report(ERROR, "missing [WIF] section",
+                        fix=self.adder('WIF', Date=''))
+        elif self.section('WIF').get('Date') is None:
+            self.report(ERROR, "Date is missing", section='WIF',
+                        line=self.section('WIF').line,
+                        fix=setter(self.section('WIF'), 'Date', ''))
+        for entry in list(contents.entries.values()):
+            name = entry.key.upper()
+            flagged = entry.value.lower() in true_values
+            if flagged and name not in self.sections:
+                self.report(ERROR, "%s is listed in CONTENTS but the "
+                            "section is missing" % name, section='CONTENTS',
+                            line=entry.line,
+                            fix=setter(contents, entry.key, 'false'))
+        for name in content_sections:
+            if name in self.sections and \
+                    (contents.get(name) or '').lower() not in true_values:
+                self.report(INFO, "section [%s] is not listed in CONTENTS "
+                            "and will be ignored" % name, section=name,
+                            line=self.sections[name].line)
+        for name in ('WEAVING', 'WARP', 'WEFT', 'THREADING'):
+            if not self.has(name):
+                self.report(ERROR, "missing required section [%s]" % name)
+        if self.has('TREADLING'):
+            if not self.has('TIEUP'):
+                self.report(ERROR, "treadling without a [TIEUP] section")
+        elif not self.has('LIFTPLAN'):
+            self.report(ERROR, "neither a liftplan nor a treadling is "
+                        "present")
+
+    def adder(self, name, **entries):
+        def fix():
+            section = self.sections.setdefault(name, Section(name, None))
+            for key, value in entries.items():
+                section.set(key, value)
+        return fix
+
+    def check_weaving(self):
+        self.num_shafts = self.num_treadles = None
+        if not self.has('WEAVING'):
+            return
+        weaving = self.section('WEAVING')
+        self.num_shafts = self.get_int('WEAVING', 'Shafts')
+        self.num_treadles = self.get_int(
+            'WEAVING', 'Treadles',
+            fix=setter(weaving, 'Treadles', lambda: str(self.used_treadles)))
+        self.liftplan = self.has('LIFTPLAN')
+        self.treadling = self.has('TREADLING')
+        contents = self.section('CONTENTS')
+        if self.liftplan and self.treadling:
+            if self.num_treadles:
+                fix = setter(contents, 'LIFTPLAN', 'false')
+            else:
+                fix = setter(contents, 'TREADLING', 'false')
+            self.report(ERROR, "WIF contains both liftplan and treadling",
+                        section='CONTENTS', line=contents.line, fix=fix)
+        elif self.liftplan and self.num_treadles:
+            self.report(ERROR, "WIF contains liftplan and non-zero treadle "
+                        "count", section='WEAVING',
+                        line=self.line_of('WEAVING', 'Treadles'),
+                        fix=setter(weaving, 'Treadles', '0'))
+
+    def check_palette(self):
+        self.palette = None
+        if not self.has('COLOR TABLE'):
+            return
+        high = 255
+        if self.has('COLOR PALETTE'):
+            value = self.section('COLOR PALETTE').get('Range') or ''
+            bounds = parse_ints(value)
+            if not bounds or len(bounds) != 2:
+                self.report(ERROR, "malformed palette Range %r" % value,
+                            section='COLOR PALETTE',
+                            line=self.line_of('COLOR PALETTE', 'Range'))
+            else:
+                high = bounds[1]
+        self.palette = set()
+        table = self.section('COLOR TABLE')
+        for entry in list(table.entries.values()):
+            color_no = parse_int(entry.key)
+            channels = parse_ints(entry.value)
+            if color_no is None or channels is None or len(channels) != 3:
+                self.report(ERROR, "malformed color %s=%s" %
+                            (entry.key, entry.value), section='COLOR TABLE',
+                            line=entry.line, fix=remover(table, entry.key))
+                continue
+            if not all(0 <= ch <= high for ch in channels):
+                clamped = ','.join(str(min(max(ch, 0), high))
+                                   for ch in channels)
+                self.report(ERROR, "color %d is outside the palette range "
+                            "0-%d" % (color_no, high), section='COLOR TABLE',
+                            line=entry.line,
+                            fix=setter(table, entry.key, clamped))
+            self.palette.add(color_no)
+
+    def check_threads(self, name):
+        """
+        Check the WARP or WEFT section and the matching COLORS section.
+        Returns the thread count, or None.
+        """
+        if not self.has(name):
+            return None
+        sec = self.section(name)
+        count = self.get_int(name, 'Threads')
+
+        units = sec.get('Units')
+        if units is None:
+            self.report(ERROR, "Units is missing", section=name,
+                        line=sec.line, fix=setter(sec, 'Units', 'Inches'))
+        elif units.lower() not in allowed_units:
+            alias = unit_aliases.get(units.lower())
+            self.report(ERROR, "Units of %r is not understood" % units,
+                        section=name, line=self.line_of(name, 'Units'),
+                        fix=alias and setter(sec, 'Units', alias))
+
+        default_color = None
+        if sec.get('Color') is not None:
+            default_color = self.get_int(name, 'Color')
+            if (default_color is not None and self.palette is not None and
+                    default_color not in self.palette):
+                self.report(ERROR, "default color %d is not in the color "
+                            "table" % default_color, section=name,
+                            line=self.line_of(name, 'Color'),
+                            fix=setter(sec, 'Color', str(min(self.palette)))
+                            if self.palette else None)
+                default_color = None
+
+        colors_name = '%s COLORS' % name
+        colored = set()
+        if self.has(colors_name):
+            colors = self.section(colors_name)
+            for entry in list(colors.entries.values()):
+                thread_no = parse_int(entry.key)
+                color_no = parse_int(entry.value)
+                if thread_no is None or color_no is None:
+                    self.report(ERROR, "malformed color assignment %s=%s" %
+                                (entry.key, entry.value),
+                                section=colors_name, line=entry.line,
+                                fix=remover(colors, entry.key))
+                    continue
+                if self.palette is not None and color_no not in self.palette:
+                    self.report(ERROR, "thread %d uses color %d, which is "
+                                "missing from the color table" %
+                                (thread_no, color_no), section=colors_name,
+                                line=entry.line,
+                                fix=remover(colors, entry.key))
+                    continue
+                colored.add(thread_no)
+            self.check_thread_numbers(colors_name, name, colored, count)
+
+        if self.palette is None and (colored or default_color is not None):
+            self.report(ERROR, "%s colors are used but there is no color "
+                        "table" % name.lower(), section=name, line=sec.line)
+        return count, colored, default_color
+
+    def check_thread_numbers(self, section, thread_section, thread_nos, count):
+        if count is None or not thread_nos:
+            return
+        highest = max(thread_nos)
+        if highest > count:
+            sec = self.section(thread_section)
+            self.report(WARNING, "%s refers to thread %d, but Threads=%d; "
+                        "those threads are ignored" %
+                        (section, highest, count), section=section,
+                        line=self.section(section).line,
+                        fix=setter(sec, 'Threads', str(highest)))
+
+    def check_rows(self, name, limit, limit_name, single=False):
+        """
+        Check a section mapping numbers to lists of shafts or treadles, e.g.
+        THREADING or LIFTPLAN. Returns the set of row numbers which are
+        usable.
+        """
+        rows = set()
+        if not self.has(name):
+            return rows
+        sec = self.section(name)
+        for entry in list(sec.entries.values()):
+            row_no = parse_int(entry.key)
+            values = parse_ints(entry.value)
+            if row_no is None or values is None:
+                self.report(ERROR, "malformed entry %s=%s" %
+                            (entry.key, entry.value), section=name,
+                            line=entry.line, fix=remover(sec, entry.key))
+                continue
+            if limit is not None:
+                bad = [val for val in values if not 1 <= val <= limit]
+                if bad:
+                    good = [val for val in values if 1 <= val <= limit]
+                    self.report(ERROR, "%s %s out of range 1-%d" %
+                                (limit_name, ','.join(str(b) for b in bad),
+                                 limit),
+                                section=name, line=entry.line,
+                                fix=(setter(sec, entry.key,
+                                            ','.join(str(g) for g in good))
+                                     if good else remover(sec, entry.key)))
+                    values = good
+            if single and len(values) > 1:
+                self.report(ERROR, "thread %d is threaded on %d shafts" %
+                            (row_no, len(values)), section=name,
+                            line=entry.line,
+                            fix=setter(sec, entry.key, str(values[0])))
+            if values:
+                rows.add(row_no)
+            self.used_rows[name].update(values)
+        return rows
+
+    def check_unused(self, name, count, used, colored, default_color):
+        if count is None:
+            return
+        unused = [no for no in range(1, count + 1) if no not in used]
+        if unused:
+            self.report(WARNING, "%d of %d %s threads have no %s and are "
+                        "ignored (first: %d)" %
+                        (len(unused), count, name.lower(),
+                         'threading' if name == 'WARP' else
+                         'liftplan or treadling', unused[0]),
+                        section=name, line=self.line_of(name, 'Threads'))
+        if default_color is None:
+            uncolored = [no for no in sorted(used) if no not in colored]
+            if uncolored and self.palette:
+                self.report(ERROR, "%d %s threads have no color and there is "
+                            "no default Color (first: %d)" %
+                            (len(uncolored), name.lower(), uncolored[0]),
+                            section=name, line=self.section(name).line,
+                            fix=setter(self.section(name), 'Color',
+                                       str(min(self.palette))))
+
+    def lint(self):
+        """
+        Check the document and return a list of ``Diagnostic`` instances, in
+        document order where possible.
+        """
+        self.diagnostics = []
+        self.used_rows = {'THREADING': set(), 'LIFTPLAN': set(),
+                          'TREADLING': set(), 'TIEUP': set()}
+        self.used_treadles = 0
+        self.parse()
+        self.check_contents()
+        self.check_weaving()
+        self.check_palette()
+        warp = self.check_threads('WARP')
+        weft = self.check_threads('WEFT')
+
+        threaded = self.check_rows('THREADING', self.num_shafts, 'shaft',
+                                   single=True)
+        lifted = self.check_rows('LIFTPLAN', self.num_shafts, 'shaft')
+        treadle_limit = self.num_treadles
+        if self.treadling and self.num_treadles == 0:
+            self.report(ERROR, "Treadles=0 but the draft has a treadling",
+                        section='WEAVING',
+                        line=self.line_of('WEAVING', 'Treadles'),
+                        fix=setter(self.section('WEAVING'), 'Treadles',
+                                   lambda: str(self.used_treadles)))
+            treadle_limit = None
+        treadled = self.check_rows('TREADLING', treadle_limit, 'treadle')
+        self.check_rows('TIEUP', self.num_shafts, 'shaft')
+        if self.has('TIEUP') and self.num_treadles is not None:
+            tieup = self.section('TIEUP')
+            for entry in list(tieup.entries.values()):
+                treadle_no = parse_int(entry.key)
+                if treadle_no is not None and \
+                        not 1 <= treadle_no <= self.num_treadles:
+                    self.report(ERROR, "tie-up for treadle %d but "
+                                "Treadles=%d" % (treadle_no,
+                                                 self.num_treadles),
+                                section='TIEUP', line=entry.line,
+                                fix=remover(tieup, entry.key))
+        self.used_treadles = max(self.used_rows['TREADLING'] or [0])
+
+        if warp:
+            count, colored, default_color = warp
+            self.check_thread_numbers('THREADING', 'WARP', threaded, count)
+            self.check_unused('WARP', count, threaded, colored,
+                              default_color)
+        if weft:
+            count, colored, default_color = weft
+            picks = lifted if self.liftplan else treadled
+            self.check_thread_numbers('LIFTPLAN' if self.liftplan else
+                                      'TREADLING', 'WEFT', picks, count)
+            self.check_unused('WEFT', count, picks, colored, default_color)
+
+        self.diagnostics.sort(key=lambda d: (d.line is None, d.line or 0))
+        return self.diagnostics
+
+    @property
+    def errors(self):
+        return [d for d in self.diagnostics if d.severity == ERROR]
+
+    def repair(self):
+        """
+        Apply every available fix and return the repaired document as text.
+        Call ``lint()`` again on the result to see what remains.
+        """
+        if self.diagnostics is None:
+            self.lint()
+        for diagnostic in self.diagnostics:
+            if diagnostic.fix is not None:
+                diagnostic.fix()
+        return self.dumps()
+
+    def dumps(self):
+        lines = []
+        for section in self.sections.values():
+            lines.append('[%s]' % section.name)
+            for entry in section.entries.values():
+                lines.append('%s=%s' % (entry.key, entry.value))
+            lines.append('')
+        return '\n'.join(lines)
+
+
+def noop():
+    """
+    Fix for problems which are repaired simply by re-serializing the model,
+    such as duplicate keys.
+    """
+    pass
+
+
+def setter(section, key, value):
+    def fix():
+        section.set(key, value() if callable(value) else value)
+    return fix
+
+
+def remover(section, key):
+    def fix():
+        section.remove(key)
+    return fix
+
+
+def lint_wif(source):
+    """
+    Convenience function: return the list of diagnostics for a WIF document.
+    """
+    return WIFLinter(source).lint()
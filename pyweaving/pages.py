@@ -0,0 +1,244 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+from .arrays import DraftArrays
+from .fonts import get_atlas
+from .images import save_image, save_pdf
+from .render import ArrayCanvas, font_path
+
+
+# Paper sizes, in inches.
+paper_sizes = {
+    'letter': (8.5, 11.0),
+    'legal': (8.5, 14.0),
+    'a4': (8.27, 11.69),
+    'a3': (11.69, 16.54),
+}
+
+
+class PageRenderer(object):
+    """
+    Render the lift plan, or the tie-up and treadling, of a draft as pages
+    for printing. Each page holds a range of picks, one numbered row each,
+    under a header which is repeated on every page: the title, the range of
+    picks and the page number, then the numbered shafts of the lift plan, or
+    the tie-up with its numbered treadles and shafts.
+
+    Pages are ``paper`` sized (see ``paper_sizes``), at ``dpi`` dots per
+    inch, inside a ``margin`` in inches. Squares are ``square`` inches, or
+    smaller if the columns wouldn't fit across the page.
+
+    Pages are rendered one at a time, so memory use doesn't depend on the
+    number of picks.
+    """
+    def __init__(self, draft, liftplan=None, paper='letter', landscape=False,
+                 dpi=150, margin=0.5, square=0.2,
+                 foreground=(127, 127, 127), background=(255, 255, 255),
+                 markers=(0, 0, 0), numbering=(200, 0, 0)):
+        self.draft = draft
+        self.arrays = DraftArrays(draft)
+        if liftplan is None:
+            liftplan = bool(draft.liftplan) or not draft.treadles
+        self.liftplan = liftplan
+
+        self.dpi = dpi
+        width, height = paper_sizes[paper]
+        if landscape:
+            width, height = height, width
+        self.page_size = (int(round(width * dpi)), int(round(height * dpi)))
+        self.margin_pixels = int(round(margin * dpi))
+        self.square = square
+
+        self.foreground = foreground
+        self.background = background
+        self.markers = markers
+        self.numbering = numbering
+
+        # Titles are 12 point.
+        self.title_atlas = get_atlas(font_path, int(round(dpi / 6.0)))
+        self.layout()
+
+    def num_columns(self):
+        if self.liftplan:
+            return len(self.draft.shafts)
+        return len(self.draft.treadles)
+
+    def layout(self):
+        """
+        Size the squares and their labels to fit the page, and work out how
+        many picks fit on each page.
+        """
+        width, height = self.page_size
+        width -= 2 * self.margin_pixels
+        height -= 2 * self.margin_pixels
+
+        # Leave four squares beside the rows for the pick numbers.
+        columns = self.num_columns()
+        p = min(int(round(self.square * self.dpi)), width // (columns + 4))
+        assert p >= 4, "too many columns to fit across the page"
+        self.pixels_per_square = p
+        self.atlas = get_atlas(font_path, max(6, int(p * 0.7)))
+
+        self.title_height = 2 * self.title_atlas.font.size
+        if self.liftplan:
+            # A row of shaft numbers.
+            header_height = p
+        else:
+            # The tie-up, with a row of treadle numbers above it and a
+            # square's gap below.
+            header_height = (len(self.draft.shafts) + 2) * p
+        self.grid_y = self.margin_pixels + self.title_height + header_height
+        self.picks_per_page = max(
+            1, (height - self.title_height - header_height - 1) // p)
+
+    @property
+    def num_pages(self):
+        num_picks = len(self.draft.weft)
+        return max(1, -(-num_picks // self.picks_per_page))
+
+    def page_picks(self, no):
+        """
+        Return the ``(start, stop)`` picks on page ``no``, from 0.
+        """
+        start = no * self.picks_per_page
+        return start, min(len(self.draft.weft), start + self.picks_per_page)
+
+    def paint_label(self, canvas, box, text, atlas, fill, center=True):
+        """
+        Paint a label centered in a ``(startx, starty, endx, endy)`` box, or
+        at its left if not ``center``.
+        """
+        startx, starty, endx, endy = box
+        left, top, right, bottom = atlas.bbox(text)
+        x = startx - left
+        if center:
+            x += (endx - startx - (right - left)) // 2
+        y = starty - top + ((endy - starty - (bottom - top)) // 2)
+        canvas.text((x, y), text, atlas, fill)
+
+    def paint_number(self, canvas, box, number):
+        """
+        Paint a pick number at the left of a box, a digit at a time, so the
+        shared atlas isn't filled with every pick number of a long draft.
+        """
+        font = self.atlas.font
+        x = box[0]
+        for digit in str(number):
+            self.paint_label(canvas, (x, box[1], box[2], box[3]), digit,
+                             self.atlas, self.numbering, center=False)
+            x += int(round(font.getlength(digit)))
+
+    def paint_text(self, canvas, xy, text, anchor='la'):
+        """
+        Draw a line of title text, anchored at ``xy`` as for
+        ``ImageDraw.text()``. Titles differ on every page, so they are drawn
+        directly rather than kept in an atlas.
+        """
+        font = self.title_atlas.font
+        x, y = xy
+        left, top, right, bottom = font.getbbox(text, anchor=anchor)
+
+        def draw_text(draw, dx, dy):
+            draw.text((x + dx, y + dy), text, font=font, fill=self.markers,
+                      anchor=anchor)
+        canvas.draw((x + left, y + top, x + right, y + bottom), draw_text)
+
+    def paint_title(self, canvas, no, start, stop):
+        margin = self.margin_pixels
+        num_picks = len(self.draft.weft)
+        if stop > start:
+            picks = 'picks %d-%d of %d' % (start + 1, stop, num_picks)
+        else:
+            picks = 'no picks'
+        title = '%s - %s, %s' % (self.draft.title or 'Untitled',
+                                 'Lift plan' if self.liftplan else
+                                 'Treadling', picks)
+        self.paint_text(canvas, (margin, margin), title)
+        self.paint_text(canvas, (self.page_size[0] - margin, margin),
+                        'Page %d of %d' % (no + 1, self.num_pages),
+                        anchor='ra')
+
+    def paint_column_numbers(self, canvas, y):
+        p = self.pixels_per_square
+        x = self.margin_pixels
+        for ii in range(self.num_columns()):
+            self.paint_label(canvas, (x + (ii * p), y, x + ((ii + 1) * p),
+                                      y + p),
+                             str(ii + 1), self.atlas, self.numbering)
+
+    def paint_tieup(self, canvas):
+        p = self.pixels_per_square
+        x = self.margin_pixels
+        num_shafts = len(self.draft.shafts)
+        y = self.grid_y - ((num_shafts + 1) * p)
+        self.paint_column_numbers(canvas, y - p)
+        # Shafts run bottom to top.
+        canvas.paint_grid(x, y, self.arrays.tieup.T[::-1], p,
+                          self.foreground, self.markers)
+        endx = x + (self.num_columns() * p)
+        for shaft_no in range(1, num_shafts + 1):
+            starty = y + ((num_shafts - shaft_no) * p)
+            self.paint_label(canvas, (endx + (p // 2), starty, endx + (4 * p),
+                                      starty + p),
+                             str(shaft_no), self.atlas, self.numbering,
+                             center=False)
+
+    def make_page(self, no):
+        """
+        Render page ``no``, from 0, as a PIL image.
+        """
+        start, stop = self.page_picks(no)
+        width, height = self.page_size
+        canvas = ArrayCanvas(width, height, self.background)
+        self.paint_title(canvas, no, start, stop)
+
+        p = self.pixels_per_square
+        x = self.margin_pixels
+        if self.liftplan:
+            self.paint_column_numbers(canvas, self.grid_y - p)
+            marked = self.arrays.lift
+        else:
+            self.paint_tieup(canvas)
+            marked = self.arrays.treadling
+        canvas.paint_grid(x, self.grid_y, marked[start:stop], p,
+                          self.foreground, self.markers)
+
+        endx = x + (self.num_columns() * p)
+        for ii in range(stop - start):
+            y = self.grid_y + (ii * p)
+            self.paint_number(canvas, (endx + (p // 2), y, endx + (4 * p),
+                                       y + p), start + ii + 1)
+        return canvas.image()
+
+    def iter_pages(self):
+        """
+        Generate the pages, as PIL images.
+        """
+        for no in range(self.num_pages):
+            yield self.make_page(no)
+
+    def save_pdf(self, fp):
+        """
+        Save the pages as a PDF document, to a filename or binary file-like
+        object, one page at a time.
+        """
+        save_pdf(self.iter_pages(), fp, dpi=self.dpi, title=self.draft.title)
+
+    def save_pages(self, pattern, **options):
+        """
+        Save the pages as a numbered sequence of images, named by a pattern
+        such as ``pages/%03d.png`` and numbered from 1, with options as for
+        ``images.save_image()``. Directories are made as needed. Returns the
+        filenames.
+        """
+        filenames = []
+        for no, page in enumerate(self.iter_pages(), 1):
+            filename = pattern % no
+            dirname = os.path.dirname(filename)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            save_image(page, filename, **options)
+            filenames.append(filename)
+        return filenames
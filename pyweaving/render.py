@@ -1,47 +1,140 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import copy
 import os.path
+from itertools import chain
 
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .arrays import (DraftArrays, as_rgb, fill_pixels, upscale, marker_mask,
+                     runs, strip_pixels, parallel_rows, thread_index)
+from .fonts import get_atlas, blend
+from .images import join_images, palette_image, save_image
+from .stats import DraftStats
 
 
 __here__ = os.path.dirname(__file__)
 
 font_path = os.path.join(__here__, 'data', 'Arial.ttf')
 
+panel_names = ('warp', 'threading', 'weft', 'liftplan', 'tieup', 'treadling',
+               'drawdown')
+
+side_names = ('face', 'back', 'both')
+
+
+def first_multiple(first, n=4):
+    """
+    Return the smallest multiple of ``n`` greater than ``first``: the first
+    thread number to label in a region starting after ``first`` threads.
+    """
+    return first + n - (first % n)
+
+
+def check_panels(panels):
+    """
+    Raise ValueError if any of ``panels`` isn't one of ``panel_names``.
+    """
+    unknown = set(panels) - set(panel_names)
+    if unknown:
+        raise ValueError("unknown panels: %s (choose from %s)" %
+                         (', '.join(sorted(unknown)), ', '.join(panel_names)))
+
+
+def region_renderer(renderer, ends=None, picks=None, panels=None):
+    """
+    Return a copy of ``renderer`` which renders just a region of its draft:
+    contiguous slices of ``ends`` and ``picks`` (None for all of them), and
+    only the named ``panels`` (None for all of them). Thread numbering stays
+    absolute.
+    """
+    if panels is not None:
+        check_panels(panels)
+    region = copy.copy(renderer)
+    region.draft = renderer.draft.region(ends, picks)
+    if ends is not None:
+        region.first_end = (renderer.first_end +
+                            ends.indices(len(renderer.draft.warp))[0])
+    if picks is not None:
+        region.first_pick = (renderer.first_pick +
+                             picks.indices(len(renderer.draft.weft))[0])
+    region.panels = panels
+    region.arrays = None
+    return region
+
+
+def side_renderers(renderer):
+    """
+    Return a list of renderers for the sides of the fabric given by the
+    ``side`` of ``renderer``: the face, the back, or both. The back is
+    rendered from the draft of the back (see ``Draft.back()``), and both
+    sides share one set of ``DraftArrays``, so the drawdown is computed only
+    once.
+    """
+    assert renderer.side in side_names, "unknown side: %r" % renderer.side
+    if renderer.side == 'face':
+        return [renderer]
+    face = copy.copy(renderer)
+    face.side = 'face'
+    face.arrays = renderer.arrays or DraftArrays(renderer.draft)
+    back = copy.copy(face)
+    back.draft = renderer.draft.back()
+    back.arrays = face.arrays.back()
+    if renderer.side == 'back':
+        return [back]
+    return [face, back]
+
 
 class ImageRenderer(object):
     # TODO:
-    # - Add a "drawndown only" option
     # - Add a default tag (like a small delta symbol) to signal the initial
     # shuttle direction
-    # - Add option to render the backside of the fabric
     # - Add option to render a bar graph of the thread crossings along the
     # sides
-    # - Add option to render 'stats table'
-    #   - Number of warp threads
-    #   - Number of weft threads
-    #   - Number of harnesses/shafts
-    #   - Number of treadles
-    #   - Warp unit size / reps
-    #   - Weft unit size / reps
-    #   - Longest warp float
-    #   - Longest weft float
-    #   - Selvedge continuity
     # - Add option to rotate orientation
     # - Add option to render selvedge continuity
     # - Add option to render inset "scale view" rendering of fabric
-    # - Add option to change thread spacing
-    # - Support variable thickness threads
+    # - Lay out the panels around the drawdown in proportion to thread
+    # spacing, as drawdown-only renders are
     # - Add option to render heddle count on each shaft
     def __init__(self, draft, liftplan=None, margin_pixels=20, scale=10,
                  foreground=(127, 127, 127), background=(255, 255, 255),
-                 markers=(0, 0, 0), numbering=(200, 0, 0)):
+                 markers=(0, 0, 0), numbering=(200, 0, 0),
+                 drawdown_only=False, grid=False, proportional=False,
+                 workers=1, side='face', stats=False):
         self.draft = draft
 
+        # Side of the fabric to render: 'face', 'back' or 'both', side by
+        # side. The DraftArrays of the draft, if already computed, are shared
+        # between the sides: see side_renderers().
+        self.side = side
+        self.arrays = None
+
+        # Add a table of DraftStats beside the render.
+        self.stats = stats
+
         self.liftplan = liftplan
 
+        # Threads to paint the drawdown with, in horizontal bands. Only array
+        # painting is split up: see ArrayImageRenderer.
+        self.workers = workers
+
+        # Render just the drawdown, at ``scale`` pixels per interlacement,
+        # optionally with grid lines between them.
+        self.drawdown_only = drawdown_only
+        self.grid = grid
+        # Size the squares of a drawdown-only render in proportion to the
+        # spacing of their threads.
+        self.proportional = proportional
+
+        # Panels to paint, or None for all of them, and the numbers of the
+        # threads before the first end and pick: see .render_region().
+        self.panels = None
+        self.first_end = 0
+        self.first_pick = 0
+
         self.margin_pixels = margin_pixels
         self.pixels_per_square = scale
 
@@ -52,7 +145,9 @@ class ImageRenderer(object):
 
         self.font_size = int(round(scale * 1.2))
 
-        self.font = ImageFont.truetype(font_path, self.font_size)
+        # Fonts and rasterized labels are shared by every renderer.
+        self.atlas = get_atlas(font_path, self.font_size)
+        self.font = self.atlas.font
 
     def pad_image(self, im):
         w, h = im.size
@@ -62,7 +157,7 @@ class ImageRenderer(object):
         new.paste(im, (self.margin_pixels, self.margin_pixels))
         return new
 
-    def make_pil_image(self):
+    def canvas_size(self):
         width_squares = len(self.draft.warp) + 6
         if self.liftplan or self.draft.liftplan:
             width_squares += len(self.draft.shafts)
@@ -75,29 +170,241 @@ class ImageRenderer(object):
         # contents overflows the canvas
         width = (width_squares * self.pixels_per_square) + 1
         height = (height_squares * self.pixels_per_square) + 1
+        return width, height
+
+    def make_sides(self, make):
+        """
+        Return the image made by ``make(renderer)`` for the side of the
+        fabric being rendered, or the face and back side by side, two squares
+        apart.
+        """
+        images = [make(renderer) for renderer in side_renderers(self)]
+        if len(images) == 1:
+            return images[0]
+        return join_images(images, 2 * self.pixels_per_square,
+                           as_rgb(self.background))
+
+    def with_stats(self, make):
+        """
+        Return the image made by ``make(renderer)`` with a table of the
+        draft's statistics beside it. The render and the statistics share one
+        set of ``DraftArrays``.
+        """
+        renderer = copy.copy(self)
+        renderer.stats = False
+        renderer.arrays = self.arrays or DraftArrays(self.draft)
+        im = make(renderer).convert('RGB')
+        panel = self.make_stats_image(DraftStats(self.draft, renderer.arrays))
+        return join_images([im, panel], 0, as_rgb(self.background))
+
+    def make_stats_image(self, stats):
+        """
+        Render the rows of a ``DraftStats`` as a table, with a margin around
+        it. Text is at least 12 pixels high, so the table stays readable
+        beside small drawdowns.
+        """
+        rows = [(label + ':', text) for label, text in stats.rows()]
+        font = get_atlas(font_path, max(12, self.font_size)).font
+        line_height = int(round(font.size * 1.5))
+        label_width = max(font.getbbox(label)[2] for label, text in rows)
+        text_width = max(font.getbbox(text)[2] for label, text in rows)
+        gap = font.size
+        margin = max(self.margin_pixels, gap)
+        im = Image.new('RGB', (label_width + gap + text_width + (2 * margin),
+                               (line_height * len(rows)) + (2 * margin)),
+                       self.background)
+        draw = ImageDraw.Draw(im)
+        for ii, (label, text) in enumerate(rows):
+            y = margin + (ii * line_height)
+            draw.text((margin, y), label, font=font, fill=self.numbering)
+            draw.text((margin + label_width + gap, y), text, font=font,
+                      fill=self.markers)
+        return im
 
-        im = Image.new('RGB', (width, height), self.background)
+    def make_drawdown_image(self, palette=False):
+        """
+        Render just the drawdown, straight from the drawdown matrix: each
+        interlacement is one pixel, repeated to ``scale`` pixels square. With
+        ``grid``, lines in the foreground color are added between them. With
+        ``proportional``, each thread is as wide as its spacing, filled by
+        mapping every pixel to its thread.
+
+        With ``palette``, a palette ('P') image is built directly from the
+        draft's colors, if there are few enough of them.
+        """
+        if self.side != 'face':
+            return self.make_sides(
+                lambda renderer: renderer.make_drawdown_image(palette))
+        arrays = self.arrays or DraftArrays(self.draft)
+        warp_up = arrays.drawdown()
+        p = self.pixels_per_square
+        x_edges, y_edges = arrays.edges(p, self.proportional)
+        width = x_edges[-1]
+        height = y_edges[-1]
+        if self.grid:
+            width += 1
+            height += 1
+        margin = self.margin_pixels
+
+        num_colors = len(arrays.palette)
+        if palette and num_colors + 2 <= 256:
+            cells = np.where(warp_up, arrays.warp_colors[np.newaxis, :],
+                             arrays.weft_colors[:, np.newaxis])
+            foreground = num_colors
+            background = num_colors + 1
+            colors = np.concatenate([arrays.palette,
+                                     [as_rgb(self.foreground),
+                                      as_rgb(self.background)]])
+            pixels = np.empty((height + (2 * margin), width + (2 * margin)),
+                              dtype=np.uint8)
+            pixels[...] = background
+        else:
+            cells = arrays.cell_colors(warp_up)
+            foreground = self.foreground
+            colors = None
+            pixels = np.empty((height + (2 * margin), width + (2 * margin),
+                               3), dtype=np.uint8)
+            if margin:
+                fill_pixels(pixels, self.background)
+        region = pixels[margin:margin + height, margin:margin + width]
+
+        if self.proportional:
+            ends = thread_index(x_edges)
+            picks = thread_index(y_edges)
+
+            def paint_band(start, stop):
+                rows = slice(y_edges[start], y_edges[stop])
+                region[rows, :x_edges[-1]] = cells[picks[rows]][:, ends]
+        else:
+            def paint_band(start, stop):
+                upscale(cells[start:stop], p,
+                        out=region[start * p:stop * p, :x_edges[-1]])
+        parallel_rows(paint_band, arrays.num_picks, self.workers)
+        if self.grid:
+            region[y_edges, :] = foreground
+            region[:, x_edges] = foreground
+        if colors is not None:
+            return palette_image(pixels, colors)
+        return Image.fromarray(pixels)
+
+    def painted(self, panel):
+        return self.panels is None or panel in self.panels
+
+    def label_width(self, number):
+        bbox = self.atlas.bbox(str(number))
+        return bbox[2] + 2
+
+    def panel_boxes(self):
+        """
+        Return a dict of the ``(startx, starty, endx, endy)`` box (before
+        padding) of each panel in the layout, including its numbering.
+        """
+        p = self.pixels_per_square
+        num_ends = len(self.draft.warp)
+        num_picks = len(self.draft.weft)
+        num_shafts = len(self.draft.shafts)
+        num_treadles = len(self.draft.treadles)
+        liftplan = self.liftplan or self.draft.liftplan
+        side = num_shafts if liftplan else num_treadles
+        pick_labels = max(2 * p,
+                          self.label_width(self.first_pick + num_picks))
+        drawdown_y = (6 + num_shafts) * p
+        boxes = {
+            'warp': (0, 0, (num_ends * p) + 1, p + 1),
+            'threading': (0, 3 * p, (num_ends * p) + 1,
+                          ((5 + num_shafts) * p) + 1),
+            'weft': ((num_ends + 5 + side) * p, drawdown_y,
+                     ((num_ends + 6 + side) * p) + 1,
+                     drawdown_y + (num_picks * p) + 1),
+            'drawdown': (0, drawdown_y - 1 - (p // 2), (num_ends * p) + 1,
+                         drawdown_y + (num_picks * p) + 1),
+        }
+        # Pick numbers are drawn above their lines.
+        labels_above = 2 + self.font_size
+        if liftplan:
+            # Offsets are in pixels, see .paint_liftplan().
+            boxes['liftplan'] = (1, min(6, 6 + p - labels_above),
+                                 1 + (num_shafts * p) + pick_labels + 1,
+                                 6 + (num_picks * p) + 1)
+        else:
+            startx = (1 + num_ends) * p
+            endx = startx + (num_treadles * p)
+            boxes['tieup'] = (startx, 3 * p,
+                              endx + max(2 * p, self.label_width(num_shafts)) +
+                              1,
+                              ((5 + num_shafts) * p) + 1)
+            boxes['treadling'] = (startx,
+                                  min(drawdown_y, drawdown_y + p - labels_above),
+                                  endx + pick_labels + 1,
+                                  drawdown_y + (num_picks * p) + 1)
+        return boxes
+
+    def crop_box(self):
+        """
+        Return the box (before padding) which holds the painted panels.
+        """
+        width, height = self.canvas_size()
+        boxes = [box for panel, box in self.panel_boxes().items()
+                 if self.painted(panel)]
+        if not boxes:
+            return (0, 0, 1, 1)
+        return (max(0, min(box[0] for box in boxes)),
+                max(0, min(box[1] for box in boxes)),
+                min(width, max(box[2] for box in boxes)),
+                min(height, max(box[3] for box in boxes)))
+
+    def render_region(self, ends=None, picks=None, panels=None):
+        """
+        Render just a region of the draft, as a PIL image: contiguous slices
+        of ``ends`` (warp threads) and ``picks`` (weft threads), with their
+        threading, tie-up and treadling or liftplan, and only the named
+        ``panels`` (see ``panel_names``). Threads keep their numbering from
+        the whole draft, and the cost depends only on the size of the region.
+        When ``panels`` is given, the image is cropped to those panels.
+        """
+        region = region_renderer(self, ends, picks, panels)
+        return region.make_pil_image()
+
+    def make_pil_image(self):
+        if self.stats:
+            return self.with_stats(lambda renderer: renderer.make_pil_image())
+        if self.drawdown_only:
+            return self.make_drawdown_image()
+        if self.side != 'face':
+            return self.make_sides(
+                lambda renderer: renderer.make_pil_image())
+
+        im = Image.new('RGB', self.canvas_size(), self.background)
 
         draw = ImageDraw.Draw(im)
 
-        self.paint_warp(draw)
-        self.paint_threading(draw)
+        if self.painted('warp'):
+            self.paint_warp(draw)
+        if self.painted('threading'):
+            self.paint_threading(draw)
 
-        self.paint_weft(draw)
+        if self.painted('weft'):
+            self.paint_weft(draw)
         if self.liftplan or self.draft.liftplan:
-            self.paint_liftplan(draw)
+            if self.painted('liftplan'):
+                self.paint_liftplan(draw)
         else:
-            self.paint_tieup(draw)
-            self.paint_treadling(draw)
-
-        self.paint_drawdown(draw)
-        self.paint_start_indicator(draw)
+            if self.painted('tieup'):
+                self.paint_tieup(draw)
+            if self.painted('treadling'):
+                self.paint_treadling(draw)
+
+        if self.painted('drawdown'):
+            self.paint_drawdown(draw)
+            self.paint_start_indicator(draw)
         del draw
 
+        if self.panels is not None:
+            im = im.crop(self.crop_box())
         im = self.pad_image(im)
         return im
 
-    def paint_start_indicator(self, draw):
+    def start_indicator_vertices(self):
         endy = ((len(self.draft.shafts) + 6) * self.pixels_per_square) - 1
         starty = (endy - (self.pixels_per_square // 2))
         if self.draft.start_at_lowest_thread:
@@ -108,12 +415,14 @@ class ImageRenderer(object):
             # left side
             startx = 0
             endx = self.pixels_per_square
-        vertices = [
+        return [
             (startx, starty),
             (endx, starty),
             (startx + (self.pixels_per_square // 2), endy),
         ]
-        draw.polygon(vertices, fill=self.markers)
+
+    def paint_start_indicator(self, draw):
+        draw.polygon(self.start_indicator_vertices(), fill=self.markers)
 
     def paint_warp(self, draw):
         starty = 0
@@ -151,8 +460,8 @@ class ImageRenderer(object):
                     self.paint_fill_marker(draw, (startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
-            thread_no = ii + 1
-            if ((thread_no != num_threads) and
+            thread_no = self.first_end + ii + 1
+            if ((ii + 1 != num_threads) and
                 (thread_no != 0) and
                     (thread_no % 4 == 0)):
                 # draw line
@@ -162,10 +471,8 @@ class ImageRenderer(object):
                 draw.line((startx, starty, endx, endy),
                           fill=self.numbering)
                 # draw text
-                draw.text((startx + 2, starty + 2),
-                          str(thread_no),
-                          font=self.font,
-                          fill=self.numbering)
+                self.atlas.draw(draw, (startx + 2, starty + 2),
+                                str(thread_no), self.numbering)
 
     def paint_weft(self, draw):
         offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
@@ -206,8 +513,8 @@ class ImageRenderer(object):
                     self.paint_fill_marker(draw, (startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
-            thread_no = ii + 1
-            if ((thread_no != num_threads) and
+            thread_no = self.first_pick + ii + 1
+            if ((ii + 1 != num_threads) and
                 (thread_no != 0) and
                     (thread_no % 4 == 0)):
                 # draw line
@@ -218,10 +525,9 @@ class ImageRenderer(object):
                 draw.line((startx, starty, endx, endy),
                           fill=self.numbering)
                 # draw text
-                draw.text((startx + 2, starty - 2 - self.font_size),
-                          str(thread_no),
-                          font=self.font,
-                          fill=self.numbering)
+                self.atlas.draw(draw,
+                                (startx + 2, starty - 2 - self.font_size),
+                                str(thread_no), self.numbering)
 
     def paint_tieup(self, draw):
         offsetx = (1 + len(self.draft.warp)) * self.pixels_per_square
@@ -258,10 +564,9 @@ class ImageRenderer(object):
                         draw.line((line_startx, line_starty,
                                    line_endx, line_endy),
                                   fill=self.numbering)
-                        draw.text((line_startx + 2, line_starty + 2),
-                                  str(shaft_no),
-                                  font=self.font,
-                                  fill=self.numbering)
+                        self.atlas.draw(draw,
+                                        (line_startx + 2, line_starty + 2),
+                                        str(shaft_no), self.numbering)
 
             # paint the number if it's a multiple of 4 and not the first one
             if (treadle_no != 0) and (treadle_no % 4 == 0):
@@ -272,14 +577,10 @@ class ImageRenderer(object):
                 draw.line((startx, starty, endx, endy),
                           fill=self.numbering)
                 # draw text on left side, right justified
-                #textw, texth = draw.textsize(str(treadle_no), font=self.font)
-                bbox = draw.textbbox((0, 0), str(treadle_no), font=self.font)
+                bbox = self.atlas.bbox(str(treadle_no))
                 textw = bbox[2] - bbox[0]
-                texth = bbox[3] - bbox[1]
-                draw.text((startx - textw - 2, starty + 2),
-                          str(treadle_no),
-                          font=self.font,
-                          fill=self.numbering)
+                self.atlas.draw(draw, (startx - textw - 2, starty + 2),
+                                str(treadle_no), self.numbering)
 
     def paint_treadling(self, draw):
         num_threads = len(self.draft.weft)
@@ -301,8 +602,8 @@ class ImageRenderer(object):
                     self.paint_fill_marker(draw, (startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
-            thread_no = ii + 1
-            if ((thread_no != num_threads) and
+            thread_no = self.first_pick + ii + 1
+            if ((ii + 1 != num_threads) and
                 (thread_no != 0) and
                     (thread_no % 4 == 0)):
                 # draw line
@@ -313,10 +614,9 @@ class ImageRenderer(object):
                 draw.line((startx, starty, endx, endy),
                           fill=self.numbering)
                 # draw text
-                draw.text((startx + 2, starty - 2 - self.font_size),
-                          str(thread_no),
-                          font=self.font,
-                          fill=self.numbering)
+                self.atlas.draw(draw,
+                                (startx + 2, starty - 2 - self.font_size),
+                                str(thread_no), self.numbering)
 
     def paint_drawdown(self, draw):
         offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
@@ -336,42 +636,394 @@ class ImageRenderer(object):
         im = self.make_pil_image()
         im.show()
 
-    def save(self, filename):
-        im = self.make_pil_image()
-        im.save(filename)
+    def save(self, filename, **options):
+        """
+        Save the rendered draft, with options as for ``images.save_image()``.
+        Drawdowns are saved as palette images by default.
+        """
+        if (self.drawdown_only and not self.stats and
+                options.get('palette', True)):
+            im = self.make_drawdown_image(palette=True)
+        else:
+            im = self.make_pil_image()
+        save_image(im, filename, **options)
+
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class ArrayCanvas(object):
+    """
+    An RGB canvas backed by a NumPy array, with a margin of background around
+    it. Squares and grids are painted with array operations, and labels are
+    blended from rasterized masks, while lines and polygons are queued and
+    drawn with PIL. Before anything overlaps queued drawing, just the area the
+    queue covers is drawn, so the result is the same as drawing everything in
+    order, and the whole canvas is only converted to an image once.
+
+    Boxes are ``(startx, starty, endx, endy)`` with exclusive ends, in
+    coordinates which exclude the margin.
+    """
+    def __init__(self, width, height, background, margin=0):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.pixels = np.empty((height + (2 * margin), width + (2 * margin),
+                                3), dtype=np.uint8)
+        fill_pixels(self.pixels, background)
+        self.queue = []
+
+    def region(self, x, y, width, height):
+        """
+        Return a writable view of part of the canvas, first drawing any
+        queued items that it overlaps.
+        """
+        box = (x, y, x + width, y + height)
+        if any(overlaps(box, queued) for queued, func in self.queue):
+            self.flush()
+        width = max(0, min(width, self.width - x))
+        height = max(0, min(height, self.height - y))
+        x += self.margin
+        y += self.margin
+        return self.pixels[y:y + height, x:x + width]
+
+    def paste(self, x, y, pixels):
+        height, width = pixels.shape[:2]
+        region = self.region(x, y, width, height)
+        region[...] = pixels[:region.shape[0], :region.shape[1]]
+
+    def paint_grid(self, x, y, marked, scale, foreground, markers):
+        """
+        Paint a grid of outlined squares, filling the marked ones (a
+        ``(rows, cols)`` bool array) with markers.
+        """
+        rows, cols = marked.shape
+        if not (rows and cols):
+            return
+        region = self.region(x, y, cols * scale + 1, rows * scale + 1)
+        region[::scale, :] = foreground
+        region[:, ::scale] = foreground
+        mask = marker_mask(marked, scale)
+        region[mask[:region.shape[0], :region.shape[1]]] = markers
+
+    def draw(self, box, func):
+        """
+        Queue ``func(draw, offsetx, offsety)`` to be called with a PIL
+        ImageDraw, where ``box`` bounds everything it draws and the offsets
+        must be added to its coordinates.
+        """
+        self.queue.append((box, func))
+
+    def line(self, xy, fill):
+        startx, starty, endx, endy = xy
+        box = (min(startx, endx), min(starty, endy),
+               max(startx, endx) + 1, max(starty, endy) + 1)
+
+        def draw_line(draw, dx, dy):
+            draw.line((startx + dx, starty + dy, endx + dx, endy + dy),
+                      fill=fill)
+        self.draw(box, draw_line)
+
+    def text(self, xy, text, atlas, fill):
+        """
+        Blend a label from a ``GlyphAtlas`` onto the canvas, with its top left
+        at ``xy``. Labels may extend into the margin.
+        """
+        x, y = xy
+        left, top, right, bottom = atlas.bbox(text)
+        box = (x + left, y + top, x + right, y + bottom)
+        if any(overlaps(box, queued) for queued, func in self.queue):
+            self.flush()
+        alpha = atlas.alpha(text)
+        height, width = self.pixels.shape[:2]
+        x += left + self.margin
+        y += top + self.margin
+        startx, starty = max(0, x), max(0, y)
+        endx = min(width, x + alpha.shape[1])
+        endy = min(height, y + alpha.shape[0])
+        if startx < endx and starty < endy:
+            blend(self.pixels[starty:endy, startx:endx],
+                  alpha[starty - y:endy - y, startx - x:endx - x], fill)
+
+    def polygon(self, vertices, fill):
+        xs = [x for x, y in vertices]
+        ys = [y for x, y in vertices]
+        box = (min(xs), min(ys), max(xs) + 1, max(ys) + 1)
+
+        def draw_polygon(draw, dx, dy):
+            draw.polygon([(x + dx, y + dy) for x, y in vertices], fill=fill)
+        self.draw(box, draw_polygon)
+
+    def flush(self):
+        """
+        Draw all queued items, each onto just the pixels it covers.
+        """
+        height, width = self.pixels.shape[:2]
+        for box, func in self.queue:
+            startx = max(0, box[0] + self.margin)
+            starty = max(0, box[1] + self.margin)
+            endx = min(width, box[2] + self.margin)
+            endy = min(height, box[3] + self.margin)
+            if startx >= endx or starty >= endy:
+                continue
+            region = self.pixels[starty:endy, startx:endx]
+            im = Image.fromarray(np.ascontiguousarray(region))
+            func(ImageDraw.Draw(im), self.margin - startx,
+                 self.margin - starty)
+            region[...] = np.asarray(im)
+        self.queue = []
+
+    def image(self):
+        self.flush()
+        return Image.fromarray(self.pixels)
+
+
+class ArrayImageRenderer(ImageRenderer):
+    """
+    An ImageRenderer which paints with NumPy array operations instead of one
+    PIL drawing call per square. The output is pixel-for-pixel the same as
+    ImageRenderer's, but large drafts render much faster. With ``workers``,
+    bands of the drawdown are painted in parallel.
+    """
+    def make_pil_image(self):
+        if self.stats:
+            return self.with_stats(lambda renderer: renderer.make_pil_image())
+        if self.drawdown_only:
+            return self.make_drawdown_image()
+        if self.side != 'face':
+            return self.make_sides(
+                lambda renderer: renderer.make_pil_image())
+
+        width, height = self.canvas_size()
+        canvas = ArrayCanvas(width, height, self.background,
+                             margin=self.margin_pixels)
+        arrays = self.arrays or DraftArrays(self.draft)
+
+        if self.painted('warp'):
+            self.paint_warp(canvas, arrays)
+        if self.painted('threading'):
+            self.paint_threading(canvas, arrays)
+
+        if self.painted('weft'):
+            self.paint_weft(canvas, arrays)
+        if self.liftplan or self.draft.liftplan:
+            if self.painted('liftplan'):
+                self.paint_liftplan(canvas, arrays)
+        else:
+            if self.painted('tieup'):
+                self.paint_tieup(canvas, arrays)
+            if self.painted('treadling'):
+                self.paint_treadling(canvas, arrays)
+
+        if self.painted('drawdown'):
+            self.paint_drawdown(canvas, arrays)
+            self.paint_start_indicator(canvas)
+
+        im = canvas.image()
+        if self.panels is not None:
+            # The canvas is already padded: crop to the box, then pad again.
+            startx, starty, endx, endy = self.crop_box()
+            margin = self.margin_pixels
+            im = im.crop((startx + margin, starty + margin,
+                          endx + margin, endy + margin))
+            im = self.pad_image(im)
+        return im
+
+    def paint_start_indicator(self, canvas):
+        canvas.polygon(self.start_indicator_vertices(), fill=self.markers)
+
+    def paint_warp(self, canvas, arrays):
+        if arrays.num_ends:
+            canvas.paste(0, 0, strip_pixels(arrays.warp_rgb,
+                                            self.pixels_per_square,
+                                            self.foreground))
+
+    def paint_threading(self, canvas, arrays):
+        num_threads = arrays.num_ends
+        num_shafts = len(self.draft.shafts)
+        p = self.pixels_per_square
+
+        # Threads run right to left, shafts bottom to top.
+        marked = (arrays.threading[np.newaxis, ::-1] ==
+                  np.arange(num_shafts - 1, -1, -1)[:, np.newaxis])
+        canvas.paint_grid(0, 5 * p, marked, p, self.foreground, self.markers)
+
+        # paint the number of every 4th thread
+        first = self.first_end
+        for thread_no in range(first_multiple(first), first + num_threads, 4):
+            x = (num_threads - (thread_no - first)) * p
+            canvas.line((x, 3 * p, x, (5 * p) - 1), fill=self.numbering)
+            canvas.text((x + 2, (3 * p) + 2), str(thread_no), self.atlas,
+                        self.numbering)
+
+    def paint_weft(self, canvas, arrays):
+        if not arrays.num_picks:
+            return
+        offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
+        startx_squares = arrays.num_ends + 5
+        if self.liftplan or self.draft.liftplan:
+            startx_squares += len(self.draft.shafts)
+        else:
+            startx_squares += len(self.draft.treadles)
+        startx = startx_squares * self.pixels_per_square
+        canvas.paste(startx, offsety,
+                     strip_pixels(arrays.weft_rgb, self.pixels_per_square,
+                                  self.foreground, vertical=True))
+
+    def paint_pick_numbers(self, canvas, offsetx, offsety):
+        p = self.pixels_per_square
+        first = self.first_pick
+        for thread_no in range(first_multiple(first),
+                               first + len(self.draft.weft), 4):
+            y = offsety + ((thread_no - first) * p)
+            # The first pixel of the line is covered by the next pick's box.
+            canvas.line((offsetx + 1, y, offsetx + (2 * p), y),
+                        fill=self.numbering)
+            canvas.text((offsetx + 2, y - 2 - self.font_size),
+                        str(thread_no), self.atlas, self.numbering)
+
+    def paint_liftplan(self, canvas, arrays):
+        # Offsets are in pixels, matching ImageRenderer.paint_liftplan().
+        offsetx = 1
+        offsety = 6
+        canvas.paint_grid(offsetx, offsety, arrays.lift,
+                          self.pixels_per_square, self.foreground,
+                          self.markers)
+        self.paint_pick_numbers(
+            canvas,
+            offsetx + (len(self.draft.shafts) * self.pixels_per_square),
+            offsety)
+
+    def paint_tieup(self, canvas, arrays):
+        p = self.pixels_per_square
+        offsetx = (1 + arrays.num_ends) * p
+        offsety = 5 * p
+
+        num_treadles = len(self.draft.treadles)
+        num_shafts = len(self.draft.shafts)
+
+        # Shafts run bottom to top.
+        canvas.paint_grid(offsetx, offsety, arrays.tieup.T[::-1], p,
+                          self.foreground, self.markers)
+
+        # paint the shaft numbers beside the last treadle
+        if num_treadles:
+            endx = offsetx + (num_treadles * p)
+            for shaft_no in range(4, num_shafts + 1, 4):
+                y = offsety + ((num_shafts - shaft_no) * p)
+                # Below the top shaft, the first pixel of the line is covered
+                # by the next shaft's box.
+                startx = endx if shaft_no == num_shafts else endx + 1
+                canvas.line((startx, y, endx + (2 * p), y),
+                            fill=self.numbering)
+                canvas.text((endx + 2, y + 2), str(shaft_no), self.atlas,
+                            self.numbering)
+
+        # paint the number of every 4th treadle, right justified
+        for treadle_no in range(4, num_treadles + 1, 4):
+            x = (treadle_no * p) + offsetx
+            canvas.line((x, 3 * p, x, (5 * p) - 1), fill=self.numbering)
+            bbox = self.atlas.bbox(str(treadle_no))
+            textw = bbox[2] - bbox[0]
+            canvas.text((x - textw - 2, (3 * p) + 2), str(treadle_no),
+                        self.atlas, self.numbering)
+
+    def paint_treadling(self, canvas, arrays):
+        p = self.pixels_per_square
+        offsetx = (1 + arrays.num_ends) * p
+        offsety = (6 + len(self.draft.shafts)) * p
+        canvas.paint_grid(offsetx, offsety, arrays.treadling, p,
+                          self.foreground, self.markers)
+        self.paint_pick_numbers(
+            canvas, offsetx + (len(self.draft.treadles) * p), offsety)
+
+    def paint_drawdown(self, canvas, arrays):
+        if not (arrays.num_ends and arrays.num_picks):
+            return
+        offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
+        p = self.pixels_per_square
+        region = canvas.region(0, offsety, (arrays.num_ends * p) + 1,
+                               (arrays.num_picks * p) + 1)
+        arrays.paint_drawdown(region, p, self.foreground, self.workers)
 
 
 svg_preamble = '<?xml version="1.0" encoding="utf-8" standalone="no"?>'
 svg_header = '''<svg width="{width}" height="{height}"
-    viewBox="0 0 {width} {height}"
+    viewBox="{x} {y} {width} {height}"
     xmlns="http://www.w3.org/2000/svg"
     xmlns:xlink="http://www.w3.org/1999/xlink">'''
 
 
-class TagGenerator(object):
-    def __getattr__(self, name):
-        def tag(*children, **attrs):
-            inner = ''.join(children)
-            if attrs:
-                attrs = ' '.join(['%s="%s"' % (key.replace('_', '-'), val)
-                                  for key, val in attrs.items()])
-                return '<%s %s>%s</%s>' % (name, attrs, inner, name)
-            else:
-                return '<%s>%s</%s>' % (name, inner, name)
-        return tag
-
-
-SVG = TagGenerator()
+def svg_tag(name, text='', **attrs):
+    """
+    Return an SVG element as a string. Underscores in attribute names become
+    hyphens, e.g. ``text_anchor``.
+    """
+    if attrs:
+        attrs = ' '.join(['%s="%s"' % (key.replace('_', '-'), val)
+                          for key, val in attrs.items()])
+        return '<%s %s>%s</%s>' % (name, attrs, text, name)
+    return '<%s>%s</%s>' % (name, text, name)
+
+
+class SVGWriter(object):
+    """
+    Write the pieces of an SVG document to a file-like object as they are
+    produced, collecting them into chunks of about ``buffer_size``
+    characters, so documents of any size are written in constant memory.
+    """
+    def __init__(self, f, buffer_size=65536):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.pieces = []
+        self.size = 0
+
+    def write(self, piece):
+        self.pieces.append(piece)
+        self.size += len(piece)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.pieces:
+            self.f.write(''.join(self.pieces))
+            self.pieces = []
+            self.size = 0
+
+
+def chunks(pieces, size=65536):
+    """
+    Join an iterator of strings into chunks of about ``size`` characters.
+    """
+    buf = []
+    buf_size = 0
+    for piece in pieces:
+        buf.append(piece)
+        buf_size += len(piece)
+        if buf_size >= size:
+            yield ''.join(buf)
+            buf = []
+            buf_size = 0
+    if buf:
+        yield ''.join(buf)
 
 
 class SVGRenderer(object):
     def __init__(self, draft, liftplan=None, scale=10,
                  foreground='#7f7f7f', background='#ffffff',
-                 markers='#000000', numbering='#c80000'):
+                 markers='#000000', numbering='#c80000', side='face'):
         self.draft = draft
 
         self.liftplan = liftplan
 
+        # Side of the fabric to render, as for ImageRenderer, and the prefix
+        # of the ids of elements defined for one side, so that both sides can
+        # be in one document.
+        self.side = side
+        self.arrays = None
+        self.id_prefix = ''
+
         self.scale = scale
 
         self.background = background
@@ -382,7 +1034,61 @@ class SVGRenderer(object):
         self.font_family = 'Arial, sans-serif'
         self.font_size = 12
 
-    def make_svg_doc(self):
+        # Panels to paint, or None for all of them, and the numbers of the
+        # threads before the first end and pick: see .render_region().
+        self.panels = None
+        self.first_end = 0
+        self.first_pick = 0
+
+    def painted(self, panel):
+        return self.panels is None or panel in self.panels
+
+    def panel_boxes(self):
+        """
+        Return a dict of the ``(startx, starty, endx, endy)`` box of each
+        panel in the layout, including its numbering.
+        """
+        num_ends = len(self.draft.warp)
+        num_picks = len(self.draft.weft)
+        num_shafts = len(self.draft.shafts)
+        num_treadles = len(self.draft.treadles)
+        liftplan = self.liftplan or self.draft.liftplan
+        side = num_shafts if liftplan else num_treadles
+        drawdown_y = 6 + num_shafts
+        # Numbers are drawn beside the liftplan or treadling.
+        labels = 1 + num_ends + side + 4
+        boxes = {
+            'warp': (0, 0, num_ends, 1),
+            'threading': (0, 3, num_ends, 5 + num_shafts),
+            'weft': (num_ends + 5 + side, drawdown_y, num_ends + 6 + side,
+                     drawdown_y + num_picks),
+            'drawdown': (0, drawdown_y, num_ends, drawdown_y + num_picks),
+        }
+        if liftplan:
+            boxes['liftplan'] = (1 + num_ends, drawdown_y - 1, labels,
+                                 drawdown_y + num_picks)
+        else:
+            boxes['tieup'] = (1 + num_ends, 3, labels, 5 + num_shafts)
+            boxes['treadling'] = (1 + num_ends, drawdown_y - 1, labels,
+                                  drawdown_y + num_picks)
+        return {panel: tuple(n * self.scale for n in box)
+                for panel, box in boxes.items()}
+
+    def view_box(self):
+        """
+        Return the ``(x, y, width, height)`` of the document, which is cropped
+        to the painted panels when only some of them are. With both sides,
+        the back is two squares to the right of the face.
+        """
+        x, y, width, height = self.side_view_box()
+        if self.side == 'both':
+            width = (2 * width) + (2 * self.scale)
+        return x, y, width, height
+
+    def side_view_box(self):
+        """
+        Return the ``(x, y, width, height)`` of the drawing of one side.
+        """
         width_squares = len(self.draft.warp) + 6
         if self.liftplan or self.draft.liftplan:
             width_squares += len(self.draft.shafts)
@@ -393,46 +1099,123 @@ class SVGRenderer(object):
 
         width = width_squares * self.scale
         height = height_squares * self.scale
-
-        doc = []
-        # Use a negative starting point so we don't have to offset everything
-        # in the drawing.
-        doc.append(svg_header.format(width=width, height=height))
-
-        self.write_metadata(doc)
-
-        self.paint_warp(doc)
-        self.paint_threading(doc)
-
-        self.paint_weft(doc)
+        if self.panels is None:
+            return 0, 0, width, height
+        boxes = [box for panel, box in self.panel_boxes().items()
+                 if self.painted(panel)]
+        if not boxes:
+            return 0, 0, 1, 1
+        startx = max(0, min(box[0] for box in boxes))
+        starty = max(0, min(box[1] for box in boxes))
+        endx = min(width, max(box[2] for box in boxes))
+        endy = min(height, max(box[3] for box in boxes))
+        return startx, starty, endx - startx, endy - starty
+
+    def render_region(self, ends=None, picks=None, panels=None):
+        """
+        Render just a region of the draft to an SVG string: contiguous slices
+        of ``ends`` (warp threads) and ``picks`` (weft threads), with their
+        threading, tie-up and treadling or liftplan, and only the named
+        ``panels`` (see ``panel_names``). Threads keep their numbering from
+        the whole draft. When ``panels`` is given, the document is cropped to
+        those panels.
+        """
+        region = region_renderer(self, ends, picks, panels)
+        return region.make_svg_doc()
+
+    def iter_svg(self):
+        """
+        Generate the SVG document as a sequence of strings, one element or
+        group tag at a time.
+        """
+        x, y, width, height = self.view_box()
+        yield svg_header.format(x=x, y=y, width=width, height=height)
+
+        sides = side_renderers(self)
+        parts = [sides[0].write_metadata()]
+        if len(sides) == 1:
+            parts.extend(self.panel_parts())
+        else:
+            face, back = sides
+            back.id_prefix = 'back-'
+            offsetx = face.side_view_box()[2] + (2 * self.scale)
+            parts.append(['<g>'])
+            parts.extend(face.panel_parts())
+            parts.append(['</g>\n<g transform="translate(%d 0)">' % offsetx])
+            parts.extend(back.panel_parts())
+            parts.append(['</g>'])
+
+        for part in parts:
+            yield '\n'
+            for piece in part:
+                yield piece
+        yield '\n</svg>'
+
+    def panel_parts(self):
+        """
+        Return a list of generators of the painted panels of one side.
+        """
+        parts = []
+        if self.painted('warp'):
+            parts.append(self.paint_warp())
+        if self.painted('threading'):
+            parts.append(self.paint_threading())
+
+        if self.painted('weft'):
+            parts.append(self.paint_weft())
         if self.liftplan or self.draft.liftplan:
-            self.paint_liftplan(doc)
+            if self.painted('liftplan'):
+                parts.append(self.paint_liftplan())
         else:
-            self.paint_tieup(doc)
-            self.paint_treadling(doc)
+            if self.painted('tieup'):
+                parts.append(self.paint_tieup())
+            if self.painted('treadling'):
+                parts.append(self.paint_treadling())
+
+        if self.painted('drawdown'):
+            parts.append(self.paint_drawdown())
+        return parts
+
+    def iter_chunks(self, size=65536):
+        """
+        Generate the SVG document, with its XML preamble, in chunks of about
+        ``size`` characters, e.g. for a streaming HTTP response.
+        """
+        yield svg_preamble + '\n'
+        for chunk in chunks(self.iter_svg(), size):
+            yield chunk
 
-        self.paint_drawdown(doc)
-        doc.append('</svg>')
-        return '\n'.join(doc)
+    def make_svg_doc(self):
+        return ''.join(self.iter_svg())
 
-    def write_metadata(self, doc):
-        doc.append(SVG.title(self.draft.title))
+    def write_svg(self, f, buffer_size=65536):
+        """
+        Write the SVG document to a file-like object as it is generated.
+        """
+        writer = SVGWriter(f, buffer_size)
+        for piece in self.iter_svg():
+            writer.write(piece)
+        writer.flush()
 
-    def paint_warp(self, doc):
+    def write_metadata(self):
+        yield svg_tag('title', self.draft.title)
+
+    def paint_warp(self):
         starty = 0
-        grp = []
+        yield '<g>'
         for ii, thread in enumerate(self.draft.warp):
             # paint box, outlined with foreground color, filled with thread
             # color
             startx = self.scale * ii
-            grp.append(SVG.rect(
+            yield svg_tag(
+                'rect',
                 x=startx, y=starty,
                 width=self.scale, height=self.scale,
                 style='stroke:%s; fill:%s' % (self.foreground,
-                                              thread.color.css)))
-        doc.append(SVG.g(*grp))
+                                              thread.color.css))
+        yield '</g>'
 
-    def paint_weft(self, doc):
+    def paint_weft(self):
         offsety = (6 + len(self.draft.shafts)) * self.scale
         startx_squares = len(self.draft.warp) + 5
         if self.liftplan or self.draft.liftplan:
@@ -441,34 +1224,36 @@ class SVGRenderer(object):
             startx_squares += len(self.draft.treadles)
         startx = startx_squares * self.scale
 
-        grp = []
+        yield '<g>'
         for ii, thread in enumerate(self.draft.weft):
             # paint box, outlined with foreground color, filled with thread
             # color
             starty = (self.scale * ii) + offsety
-            grp.append(SVG.rect(
+            yield svg_tag(
+                'rect',
                 x=startx, y=starty,
                 width=self.scale, height=self.scale,
                 style='stroke:%s; fill:%s' % (self.foreground,
-                                              thread.color.css)))
-        doc.append(SVG.g(*grp))
+                                              thread.color.css))
+        yield '</g>'
 
-    def paint_fill_marker(self, doc, box):
+    def paint_fill_marker(self, box):
         startx, starty, endx, endy = box
         # XXX FIXME make box setback generated from scale fraction
         assert self.scale > 8
-        doc.append(SVG.rect(
+        return svg_tag(
+            'rect',
             x=startx + 2,
             y=starty + 2,
             width=self.scale - 4,
             height=self.scale - 4,
-            style='fill:%s' % self.markers))
+            style='fill:%s' % self.markers)
 
-    def paint_threading(self, doc):
+    def paint_threading(self):
         num_threads = len(self.draft.warp)
         num_shafts = len(self.draft.shafts)
 
-        grp = []
+        yield '<g>'
         for ii, thread in enumerate(self.draft.warp):
             startx = (num_threads - ii - 1) * self.scale
             endx = startx + self.scale
@@ -476,49 +1261,52 @@ class SVGRenderer(object):
             for jj, shaft in enumerate(self.draft.shafts):
                 starty = (4 + (num_shafts - jj)) * self.scale
                 endy = starty + self.scale
-                grp.append(SVG.rect(
+                yield svg_tag(
+                    'rect',
                     x=startx, y=starty,
                     width=self.scale, height=self.scale,
                     style='stroke:%s; fill:%s' % (self.foreground,
-                                                  self.background)))
+                                                  self.background))
 
                 if shaft == thread.shaft:
                     # draw threading marker
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    yield self.paint_fill_marker((startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
-            thread_no = ii + 1
-            if ((thread_no != num_threads) and
+            thread_no = self.first_end + ii + 1
+            if ((ii + 1 != num_threads) and
                 (thread_no != 0) and
                     (thread_no % 4 == 0)):
                 # draw line
                 startx = endx = (num_threads - ii - 1) * self.scale
                 starty = 3 * self.scale
                 endy = (5 * self.scale) - 1
-                grp.append(SVG.line(
+                yield svg_tag(
+                    'line',
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
-                    style='stroke:%s' % self.numbering))
+                    style='stroke:%s' % self.numbering)
                 # draw text
-                grp.append(SVG.text(
+                yield svg_tag(
+                    'text',
                     str(thread_no),
                     x=(startx + 3),
                     y=(starty + self.font_size),
                     style='font-family:%s; font-size:%s; fill:%s' % (
                         self.font_family,
                         self.font_size,
-                        self.numbering)))
-        doc.append(SVG.g(*grp))
+                        self.numbering))
+        yield '</g>'
 
-    def paint_liftplan(self, doc):
+    def paint_liftplan(self):
         num_threads = len(self.draft.weft)
 
         offsetx = (1 + len(self.draft.warp)) * self.scale
         offsety = (6 + len(self.draft.shafts)) * self.scale
 
-        grp = []
+        yield '<g>'
         for ii, thread in enumerate(self.draft.weft):
             starty = (ii * self.scale) + offsety
             endy = starty + self.scale
@@ -526,21 +1314,22 @@ class SVGRenderer(object):
             for jj, shaft in enumerate(self.draft.shafts):
                 startx = (jj * self.scale) + offsetx
                 endx = startx + self.scale
-                grp.append(SVG.rect(
+                yield svg_tag(
+                    'rect',
                     x=startx,
                     y=starty,
                     width=self.scale,
                     height=self.scale,
                     style='stroke:%s; fill:%s' % (self.foreground,
-                                                  self.background)))
+                                                  self.background))
 
                 if shaft in thread.connected_shafts:
                     # draw liftplan marker
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    yield self.paint_fill_marker((startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
-            thread_no = ii + 1
-            if ((thread_no != num_threads) and
+            thread_no = self.first_pick + ii + 1
+            if ((ii + 1 != num_threads) and
                 (thread_no != 0) and
                     (thread_no % 4 == 0)):
                 # draw line
@@ -548,31 +1337,33 @@ class SVGRenderer(object):
                 starty = endy
                 endx = startx + (2 * self.scale)
                 endy = starty
-                grp.append(SVG.line(
+                yield svg_tag(
+                    'line',
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
-                    style='stroke:%s' % self.numbering))
+                    style='stroke:%s' % self.numbering)
                 # draw text
-                grp.append(SVG.text(
+                yield svg_tag(
+                    'text',
                     str(thread_no),
                     x=(startx + 3),
                     y=(starty - 4),
                     style='font-family:%s; font-size:%s; fill:%s' % (
                         self.font_family,
                         self.font_size,
-                        self.numbering)))
-        doc.append(SVG.g(*grp))
+                        self.numbering))
+        yield '</g>'
 
-    def paint_tieup(self, doc):
+    def paint_tieup(self):
         offsetx = (1 + len(self.draft.warp)) * self.scale
         offsety = 5 * self.scale
 
         num_treadles = len(self.draft.treadles)
         num_shafts = len(self.draft.shafts)
 
-        grp = []
+        yield '<g>'
         for ii, treadle in enumerate(self.draft.treadles):
             startx = (ii * self.scale) + offsetx
             endx = startx + self.scale
@@ -584,16 +1375,17 @@ class SVGRenderer(object):
                           offsety)
                 endy = starty + self.scale
 
-                grp.append(SVG.rect(
+                yield svg_tag(
+                    'rect',
                     x=startx,
                     y=starty,
                     width=self.scale,
                     height=self.scale,
                     style='stroke:%s; fill:%s' % (self.foreground,
-                                                  self.background)))
+                                                  self.background))
 
                 if shaft in treadle.shafts:
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    yield self.paint_fill_marker((startx, starty, endx, endy))
 
                 # on the last treadle, paint the shaft markers
                 if treadle_no == num_treadles:
@@ -603,20 +1395,22 @@ class SVGRenderer(object):
                         line_startx = endx
                         line_endx = line_startx + (2 * self.scale)
                         line_starty = line_endy = starty
-                        grp.append(SVG.line(
+                        yield svg_tag(
+                            'line',
                             x1=line_startx,
                             y1=line_starty,
                             x2=line_endx,
                             y2=line_endy,
-                            style='stroke:%s' % self.numbering))
-                        grp.append(SVG.text(
+                            style='stroke:%s' % self.numbering)
+                        yield svg_tag(
+                            'text',
                             str(shaft_no),
                             x=(line_startx + 3),
                             y=(line_starty + 2 + self.font_size),
                             style='font-family:%s; font-size:%s; fill:%s' % (
                                 self.font_family,
                                 self.font_size,
-                                self.numbering)))
+                                self.numbering))
 
             # paint the number if it's a multiple of 4 and not the first one
             if (treadle_no != 0) and (treadle_no % 4 == 0):
@@ -624,14 +1418,16 @@ class SVGRenderer(object):
                 startx = endx = (treadle_no * self.scale) + offsetx
                 starty = 3 * self.scale
                 endy = (5 * self.scale) - 1
-                grp.append(SVG.line(
+                yield svg_tag(
+                    'line',
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
-                    style='stroke:%s' % self.numbering))
+                    style='stroke:%s' % self.numbering)
                 # draw text on left side, right justified
-                grp.append(SVG.text(
+                yield svg_tag(
+                    'text',
                     str(treadle_no),
                     x=(startx - 3),
                     y=(starty + self.font_size),
@@ -639,16 +1435,16 @@ class SVGRenderer(object):
                     style='font-family:%s; font-size:%s; fill:%s' % (
                         self.font_family,
                         self.font_size,
-                        self.numbering)))
-        doc.append(SVG.g(*grp))
+                        self.numbering))
+        yield '</g>'
 
-    def paint_treadling(self, doc):
+    def paint_treadling(self):
         num_threads = len(self.draft.weft)
 
         offsetx = (1 + len(self.draft.warp)) * self.scale
         offsety = (6 + len(self.draft.shafts)) * self.scale
 
-        grp = []
+        yield '<g>'
         for ii, thread in enumerate(self.draft.weft):
             starty = (ii * self.scale) + offsety
             endy = starty + self.scale
@@ -656,21 +1452,22 @@ class SVGRenderer(object):
             for jj, treadle in enumerate(self.draft.treadles):
                 startx = (jj * self.scale) + offsetx
                 endx = startx + self.scale
-                grp.append(SVG.rect(
+                yield svg_tag(
+                    'rect',
                     x=startx,
                     y=starty,
                     width=self.scale,
                     height=self.scale,
                     style='stroke:%s; fill:%s' % (self.foreground,
-                                                  self.background)))
+                                                  self.background))
 
                 if treadle in thread.treadles:
                     # draw treadling marker
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    yield self.paint_fill_marker((startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
-            thread_no = ii + 1
-            if ((thread_no != num_threads) and
+            thread_no = self.first_pick + ii + 1
+            if ((ii + 1 != num_threads) and
                 (thread_no != 0) and
                     (thread_no % 4 == 0)):
                 # draw line
@@ -678,28 +1475,30 @@ class SVGRenderer(object):
                 starty = endy
                 endx = startx + (2 * self.scale)
                 endy = starty
-                grp.append(SVG.line(
+                yield svg_tag(
+                    'line',
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
-                    style='stroke:%s' % self.numbering))
+                    style='stroke:%s' % self.numbering)
                 # draw text
-                grp.append(SVG.text(
+                yield svg_tag(
+                    'text',
                     str(thread_no),
                     x=(startx + 3),
                     y=(starty - 4),
                     style='font-family:%s; font-size:%s; fill:%s' % (
                         self.font_family,
                         self.font_size,
-                        self.numbering)))
-        doc.append(SVG.g(*grp))
+                        self.numbering))
+        yield '</g>'
 
-    def paint_drawdown(self, doc):
+    def paint_drawdown(self):
         offsety = (6 + len(self.draft.shafts)) * self.scale
         floats = self.draft.compute_floats()
 
-        grp = []
+        yield '<g>'
         for start, end, visible, length, thread in floats:
             if visible:
                 startx = start[0] * self.scale
@@ -708,19 +1507,276 @@ class SVGRenderer(object):
                 endy = ((end[1] + 1) * self.scale) + offsety
                 width = endx - startx
                 height = endy - starty
-                grp.append(SVG.rect(
+                yield svg_tag(
+                    'rect',
                     x=startx,
                     y=starty,
                     width=width,
                     height=height,
                     style='stroke:%s; fill:%s' % (self.foreground,
-                                                  thread.color.css)))
-        doc.append(SVG.g(*grp))
+                                                  thread.color.css))
+        yield '</g>'
 
     def render_to_string(self):
         return self.make_svg_doc()
 
     def save(self, filename):
-        s = svg_preamble + '\n' + self.make_svg_doc()
         with open(filename, 'w') as f:
-            f.write(s)
+            f.write(svg_preamble + '\n')
+            self.write_svg(f)
+
+
+compact_svg_style = '''<style>
+.grid {{ fill: url(#grid); stroke: {foreground}; }}
+.drawdown {{ stroke: {foreground}; }}
+.cell {{ fill: {background}; stroke: {foreground}; }}
+.marker {{ fill: {markers}; }}
+.thread {{ stroke: {foreground}; }}
+.numbers {{ fill: none; stroke: {numbering}; }}
+text {{ font-family: {font_family}; font-size: {font_size}px; fill: {numbering}; }}
+.end {{ text-anchor: end; }}
+{colors}
+</style>'''
+
+
+class CompactSVGRenderer(SVGRenderer):
+    """
+    Renders the same drawing as ``SVGRenderer`` into a much smaller document.
+    Styles are CSS classes, grids are a single rect filled with a cell
+    ``<pattern>``, markers are ``<use>`` references to one marker
+    definition, and all the squares and floats of each color are merged into
+    a single path. When the draft repeats, the drawdown is one repeat defined
+    as a ``<pattern>``, so its size doesn't depend on the length of the
+    draft.
+    """
+    def iter_svg(self):
+        self.arrays = DraftArrays(self.draft)
+        return SVGRenderer.iter_svg(self)
+
+    def color_class(self, no):
+        return 'c%d' % no
+
+    def write_metadata(self):
+        for piece in SVGRenderer.write_metadata(self):
+            yield piece
+        colors = '\n'.join(
+            '.%s { fill: #%02x%02x%02x; }' % ((self.color_class(no),) +
+                                               tuple(rgb))
+            for no, rgb in enumerate(self.arrays.palette))
+        yield '\n'
+        yield compact_svg_style.format(
+            foreground=self.foreground, background=self.background,
+            markers=self.markers, numbering=self.numbering,
+            font_family=self.font_family, font_size=self.font_size,
+            colors=colors)
+        s = self.scale
+        yield '\n'
+        yield (
+            '<defs>'
+            '<pattern id="grid" width="%d" height="%d" '
+            'patternUnits="userSpaceOnUse">'
+            '<path class="cell" d="M0 0H%dV%dH0Z"/></pattern>'
+            '<rect id="marker" class="marker" x="2" y="2" width="%d" '
+            'height="%d"/>'
+            '</defs>' % (s, s, s, s, s - 4, s - 4))
+
+    def paint_boxes(self, boxes, colors):
+        """
+        Paint outlined boxes, given as ``(x, y, width, height)`` arrays, with
+        one path per color, given as palette indexes.
+        """
+        yield '<g class="thread">'
+        x, y, width, height = boxes
+        for no in np.unique(colors):
+            selected = colors == no
+            d = ''.join('M%d %dh%dv%dh%dz' % box for box in zip(
+                x[selected], y[selected], width[selected],
+                height[selected], -width[selected]))
+            yield '<path class="%s" d="%s"/>' % (self.color_class(no), d)
+        yield '</g>'
+
+    def paint_strip(self, colors, vertical, x, y):
+        s = self.scale
+        offsets = np.arange(len(colors)) * s
+        fixed = np.zeros(len(colors), dtype=int)
+        size = np.full(len(colors), s)
+        if vertical:
+            boxes = (fixed + x, offsets + y, size, size)
+        else:
+            boxes = (offsets + x, fixed + y, size, size)
+        return self.paint_boxes(boxes, colors)
+
+    def paint_grid(self, x, y, marked):
+        """
+        Paint a grid of cells at ``x``, ``y``, with a marker in each cell of
+        the ``(rows, cols)`` bool array ``marked``.
+        """
+        rows, cols = marked.shape
+        if not (rows and cols):
+            return
+        s = self.scale
+        yield ('<rect class="grid" x="%d" y="%d" width="%d" height="%d"/>' %
+               (x, y, cols * s, rows * s))
+        for row, col in zip(*np.nonzero(marked)):
+            yield ('<use xlink:href="#marker" x="%d" y="%d"/>' %
+                   (x + (col * s), y + (row * s)))
+
+    def paint_numbers(self, lines, labels):
+        """
+        Paint numbering: ``lines`` are ``(x1, y1, x2, y2)``, merged into one
+        path, and ``labels`` are ``(x, y, text, right_justified)``.
+        """
+        if lines:
+            yield '<path class="numbers" d="%s"/>' % ''.join(
+                'M%d %dL%d %d' % line for line in lines)
+        for x, y, text, right in labels:
+            yield ('<text x="%d" y="%d"%s>%s</text>' %
+                   (x, y, ' class="end"' if right else '', text))
+
+    def pick_numbers(self, x):
+        """
+        Return the numbering lines and labels beside a column of picks, whose
+        right edge is at ``x``.
+        """
+        s = self.scale
+        offsety = (6 + len(self.draft.shafts)) * s
+        num_threads = len(self.draft.weft)
+        first = self.first_pick
+        lines = []
+        labels = []
+        for thread_no in range(first_multiple(first), first + num_threads, 4):
+            y = ((thread_no - first) * s) + offsety
+            lines.append((x, y, x + (2 * s), y))
+            labels.append((x + 3, y - 4, thread_no, False))
+        return lines, labels
+
+    def paint_warp(self):
+        return self.paint_strip(self.arrays.warp_colors, False, 0, 0)
+
+    def paint_weft(self):
+        startx_squares = len(self.draft.warp) + 5
+        if self.liftplan or self.draft.liftplan:
+            startx_squares += len(self.draft.shafts)
+        else:
+            startx_squares += len(self.draft.treadles)
+        return self.paint_strip(self.arrays.weft_colors, True,
+                                startx_squares * self.scale,
+                                (6 + len(self.draft.shafts)) * self.scale)
+
+    def paint_threading(self):
+        s = self.scale
+        num_threads = len(self.draft.warp)
+        num_shafts = len(self.draft.shafts)
+        # Ends run right to left and shafts bottom to top.
+        marked = np.zeros((num_shafts, num_threads), dtype=bool)
+        ends = np.arange(num_threads)
+        threaded = self.arrays.threading >= 0
+        marked[num_shafts - 1 - self.arrays.threading[threaded],
+               num_threads - 1 - ends[threaded]] = True
+        grid = self.paint_grid(0, 5 * s, marked)
+
+        first = self.first_end
+        lines = []
+        labels = []
+        for thread_no in range(first_multiple(first), first + num_threads, 4):
+            x = (num_threads - (thread_no - first)) * s
+            lines.append((x, 3 * s, x, (5 * s) - 1))
+            labels.append((x + 3, (3 * s) + self.font_size, thread_no, False))
+        return chain(['<g>'], grid, self.paint_numbers(lines, labels),
+                     ['</g>'])
+
+    def paint_liftplan(self):
+        s = self.scale
+        offsetx = (1 + len(self.draft.warp)) * s
+        offsety = (6 + len(self.draft.shafts)) * s
+        return chain(['<g>'],
+                     self.paint_grid(offsetx, offsety, self.arrays.lift),
+                     self.paint_numbers(*self.pick_numbers(
+                         offsetx + (len(self.draft.shafts) * s))),
+                     ['</g>'])
+
+    def paint_tieup(self):
+        s = self.scale
+        offsetx = (1 + len(self.draft.warp)) * s
+        num_treadles = len(self.draft.treadles)
+        num_shafts = len(self.draft.shafts)
+        # Shafts run bottom to top.
+        grid = self.paint_grid(offsetx, 5 * s, self.arrays.tieup.T[::-1])
+
+        lines = []
+        labels = []
+        endx = offsetx + (num_treadles * s)
+        if num_treadles:
+            for shaft_no in range(4, num_shafts + 1, 4):
+                y = ((num_shafts - shaft_no) * s) + (5 * s)
+                lines.append((endx, y, endx + (2 * s), y))
+                labels.append((endx + 3, y + 2 + self.font_size, shaft_no,
+                               False))
+        for treadle_no in range(4, num_treadles + 1, 4):
+            x = (treadle_no * s) + offsetx
+            lines.append((x, 3 * s, x, (5 * s) - 1))
+            labels.append((x - 3, (3 * s) + self.font_size, treadle_no, True))
+        return chain(['<g>'], grid, self.paint_numbers(lines, labels),
+                     ['</g>'])
+
+    def paint_treadling(self):
+        s = self.scale
+        offsetx = (1 + len(self.draft.warp)) * s
+        offsety = (6 + len(self.draft.shafts)) * s
+        return chain(['<g>'],
+                     self.paint_grid(offsetx, offsety, self.arrays.treadling),
+                     self.paint_numbers(*self.pick_numbers(
+                         offsetx + (len(self.draft.treadles) * s))),
+                     ['</g>'])
+
+    def paint_floats(self, ends, picks, x, y):
+        """
+        Paint the floats of the drawdown over arrays of ``ends`` and
+        ``picks``, with the first square at ``x``, ``y``.
+        """
+        s = self.scale
+        arrays = self.arrays
+        warp_up = arrays.drawdown(ends, picks)
+        warp_ends, warp_starts, warp_stops = runs(warp_up.T)
+        weft_picks, weft_starts, weft_stops = runs(~warp_up)
+        boxes = (np.concatenate([warp_ends, weft_starts]) * s + x,
+                 np.concatenate([warp_starts, weft_picks]) * s + y,
+                 np.concatenate([np.ones_like(warp_ends),
+                                 weft_stops - weft_starts]) * s,
+                 np.concatenate([warp_stops - warp_starts,
+                                 np.ones_like(weft_picks)]) * s)
+        colors = np.concatenate([arrays.warp_colors[ends][warp_ends],
+                                 arrays.weft_colors[picks][weft_picks]])
+        return self.paint_boxes(boxes, colors)
+
+    def paint_drawdown(self):
+        s = self.scale
+        offsety = (6 + len(self.draft.shafts)) * s
+        arrays = self.arrays
+        num_ends = arrays.num_ends
+        num_picks = arrays.num_picks
+        if not (num_ends and num_picks):
+            return
+        repeat_ends, repeat_picks = arrays.repeat()
+        if (repeat_ends * 2 > num_ends) and (repeat_picks * 2 > num_picks):
+            for piece in self.paint_floats(np.arange(num_ends),
+                                           np.arange(num_picks), 0, offsety):
+                yield piece
+            return
+
+        # Define one repeat as a pattern tile. The tile is painted with an
+        # extra square on each side, so floats crossing its edges aren't
+        # outlined there, and clipped to the tile. The drawdown's own edges
+        # are outlined.
+        ends = np.arange(-1, repeat_ends + 1) % repeat_ends
+        picks = np.arange(-1, repeat_picks + 1) % repeat_picks
+        pattern_id = self.id_prefix + 'drawdown'
+        yield ('<defs><pattern id="%s" x="0" y="%d" width="%d" '
+               'height="%d" patternUnits="userSpaceOnUse">' %
+               (pattern_id, offsety, repeat_ends * s, repeat_picks * s))
+        for piece in self.paint_floats(ends, picks, -s, -s):
+            yield piece
+        yield '</pattern></defs>\n'
+        yield ('<rect class="drawdown" fill="url(#%s)" x="0" y="%d" '
+               'width="%d" height="%d"/>' %
+               (pattern_id, offsety, num_ends * s, num_picks * s))
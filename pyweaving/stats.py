@@ -0,0 +1,254 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+from .arrays import DraftArrays
+
+
+class DraftStats(object):
+    """
+    Statistics of a draft, all computed together from its ``DraftArrays``
+    (which are shared with a renderer when given), so the drawdown is only
+    computed once however many of them are used:
+
+    ``warp_threads``, ``weft_threads``, ``shafts``, ``treadles``
+        Counts of each.
+    ``warp_unit``, ``weft_unit``
+        The smallest repeat of the draft in ends and picks: see
+        ``DraftArrays.repeat()``. ``warp_reps`` and ``weft_reps`` are the
+        number of times each unit is woven, which needn't be whole.
+    ``longest_floats``
+        The longest ``(warp, weft)`` floats on the ``'face'`` and the
+        ``'back'``, in squares.
+    ``low_selvedge``, ``high_selvedge``
+        Whether the selvedge ends are continuous, as by
+        ``Draft.selvedge_continuous()``.
+    ``heddles``
+        The number of ends threaded on each shaft, in shaft order.
+    """
+    def __init__(self, draft, arrays=None):
+        arrays = arrays or DraftArrays(draft)
+        self.warp_threads = arrays.num_ends
+        self.weft_threads = arrays.num_picks
+        self.shafts = len(draft.shafts)
+        self.treadles = len(draft.treadles)
+
+        self.warp_unit, self.weft_unit = arrays.repeat()
+        self.warp_reps = self.warp_threads / max(1, self.warp_unit)
+        self.weft_reps = self.weft_threads / max(1, self.weft_unit)
+
+        self.longest_floats = arrays.longest_floats()
+
+        start_at_lowest = draft.start_at_lowest_thread
+        if arrays.num_ends:
+            self.low_selvedge = selvedge_continuous(
+                arrays, 0, start_at_lowest)
+            self.high_selvedge = selvedge_continuous(
+                arrays, -1, not start_at_lowest)
+        else:
+            self.low_selvedge = self.high_selvedge = True
+
+        threaded = arrays.threading[arrays.threading >= 0]
+        self.heddles = np.bincount(threaded,
+                                   minlength=self.shafts).tolist()
+
+    @property
+    def selvedges_continuous(self):
+        return self.low_selvedge and self.high_selvedge
+
+    def as_dict(self):
+        """
+        Return the statistics as a flat dict of plain values, for JSON or
+        CSV output.
+        """
+        face_warp, face_weft = self.longest_floats['face']
+        back_warp, back_weft = self.longest_floats['back']
+        return {
+            'warp_threads': self.warp_threads,
+            'weft_threads': self.weft_threads,
+            'shafts': self.shafts,
+            'treadles': self.treadles,
+            'warp_unit': self.warp_unit,
+            'weft_unit': self.weft_unit,
+            'warp_reps': round(self.warp_reps, 2),
+            'weft_reps': round(self.weft_reps, 2),
+            'longest_warp_float': face_warp,
+            'longest_weft_float': face_weft,
+            'longest_back_warp_float': back_warp,
+            'longest_back_weft_float': back_weft,
+            'low_selvedge_continuous': self.low_selvedge,
+            'high_selvedge_continuous': self.high_selvedge,
+            'heddles': self.heddles,
+        }
+
+    def rows(self):
+        """
+        Return the statistics as ``(label, text)`` rows, for printing or for
+        the stats panel of a render.
+        """
+        def yes_no(value):
+            return 'Yes' if value else 'No'
+
+        face_warp, face_weft = self.longest_floats['face']
+        back_warp, back_weft = self.longest_floats['back']
+        return [
+            ('Warp Threads', '%d' % self.warp_threads),
+            ('Weft Threads', '%d' % self.weft_threads),
+            ('Shafts', '%d' % self.shafts),
+            ('Treadles', '%d' % self.treadles),
+            ('Warp Unit', '%d ends x %g' % (self.warp_unit,
+                                            round(self.warp_reps, 2))),
+            ('Weft Unit', '%d picks x %g' % (self.weft_unit,
+                                             round(self.weft_reps, 2))),
+            ('Longest Float (Warp)', '%d' % face_warp),
+            ('Longest Float (Weft)', '%d' % face_weft),
+            ('Longest Back Float (Warp)', '%d' % back_warp),
+            ('Longest Back Float (Weft)', '%d' % back_weft),
+            ('Selvedges Continuous',
+             '%s (low), %s (high)' % (yes_no(self.low_selvedge),
+                                      yes_no(self.high_selvedge))),
+            ('Heddles', ' / '.join('%d' % n for n in self.heddles)),
+        ]
+
+
+def selvedge_continuous(arrays, end, offset):
+    """
+    Return whether a selvedge ``end`` is continuous: lifted on alternate
+    picks, for every pair of picks from ``offset`` (0 or 1). Equivalent to
+    ``Draft.selvedge_continuous()``, for a whole column of the lift plan at
+    once.
+    """
+    shaft = arrays.threading[end]
+    if shaft < 0:
+        lifted = np.zeros(arrays.num_picks, dtype=bool)
+    else:
+        lifted = arrays.lift[:, shaft]
+    lifted = lifted[int(offset):]
+    pairs = len(lifted) // 2
+    return bool((lifted[0:2 * pairs:2] != lifted[1:2 * pairs:2]).all())
+
+
+class YarnUsage(object):
+    """
+    Color and yarn accounting of a draft, for each color of its palette
+    (see ``DraftArrays``): how much of the face it covers, how many ends and
+    picks are that color, and how much yarn they need.
+
+    Threads are as wide as their spacing in the draft, with unknown spacings
+    taken to be the most common known one, or ``1 / epi`` and ``1 / ppi``
+    inches when a sett is given in ends and picks per inch. Without either,
+    areas are counted in squares and yarn lengths are unknown (None).
+
+    ``take_up`` is the fraction of extra length threads need to pass over
+    and under each other, as a number or a ``(warp, weft)`` pair.
+    ``repeats`` is the number of times the picks of the draft are woven, and
+    ``loom_waste`` the inches of warp per end that are never woven.
+    """
+    def __init__(self, draft, arrays=None, epi=None, ppi=None, take_up=0.1,
+                 repeats=1, loom_waste=0.0):
+        arrays = arrays or DraftArrays(draft)
+        if isinstance(take_up, (tuple, list)):
+            warp_take_up, weft_take_up = take_up
+        else:
+            warp_take_up = weft_take_up = take_up
+        num_colors = len(arrays.palette)
+        self.palette = arrays.palette
+        self.ends = np.bincount(arrays.warp_colors, minlength=num_colors)
+        self.picks = repeats * np.bincount(arrays.weft_colors,
+                                           minlength=num_colors)
+
+        warp_spacing = thread_spacing(arrays.warp_spacing, epi)
+        weft_spacing = thread_spacing(arrays.weft_spacing, ppi)
+        self.known = warp_spacing is not None and weft_spacing is not None
+        if not self.known:
+            warp_spacing = np.ones(arrays.num_ends)
+            weft_spacing = np.ones(arrays.num_picks)
+
+        # The face of each color is where its ends are up, weighted by the
+        # width of the end and the height of the picks, plus where its picks
+        # are up.
+        warp_up = arrays.drawdown()
+        width = warp_spacing.sum()
+        up_heights = np.zeros(arrays.num_ends)
+        down_widths = np.empty(arrays.num_picks)
+        band = max(1, (1 << 22) // max(1, arrays.num_ends))
+        for start in range(0, arrays.num_picks, band):
+            rows = warp_up[start:start + band].astype(np.float32)
+            up_heights += np.dot(weft_spacing[start:start + band], rows)
+            down_widths[start:start + band] = width - np.dot(rows,
+                                                             warp_spacing)
+        area = (np.bincount(arrays.warp_colors,
+                            weights=warp_spacing * up_heights,
+                            minlength=num_colors) +
+                np.bincount(arrays.weft_colors,
+                            weights=weft_spacing * down_widths,
+                            minlength=num_colors))
+        total = area.sum()
+        self.face_fraction = area / total if total else area
+        self.face_area = repeats * area if self.known else None
+
+        if self.known:
+            self.cloth_width = float(width)
+            self.cloth_length = float(repeats * weft_spacing.sum())
+            warp_length = ((self.cloth_length * (1 + warp_take_up)) +
+                           loom_waste)
+            self.warp_yards = self.ends * warp_length / 36.0
+            self.weft_yards = (self.picks * self.cloth_width *
+                               (1 + weft_take_up) / 36.0)
+        else:
+            self.cloth_width = self.cloth_length = None
+            self.warp_yards = self.weft_yards = None
+
+    def colors(self):
+        """
+        Return a list of dicts of plain values, one per color, for JSON
+        output. Areas are in square inches and lengths in yards, or None if
+        the spacing of the threads isn't known.
+        """
+        ret = []
+        for no, rgb in enumerate(self.palette.tolist()):
+            color = {
+                'color': '#%02x%02x%02x' % tuple(rgb),
+                'ends': int(self.ends[no]),
+                'picks': int(round(self.picks[no])),
+                'face_fraction': round(float(self.face_fraction[no]), 4),
+                'face_area': None,
+                'warp_yards': None,
+                'weft_yards': None,
+            }
+            if self.known:
+                color['face_area'] = round(float(self.face_area[no]), 2)
+                color['warp_yards'] = round(float(self.warp_yards[no]), 2)
+                color['weft_yards'] = round(float(self.weft_yards[no]), 2)
+            ret.append(color)
+        return ret
+
+    def rows(self):
+        """
+        Return ``(label, text)`` rows describing each color, for printing.
+        """
+        rows = []
+        for color in self.colors():
+            text = '%.1f%% of face, %d ends, %d picks' % (
+                100 * color['face_fraction'], color['ends'], color['picks'])
+            if self.known:
+                text += ', %.1f yd warp, %.1f yd weft' % (
+                    color['warp_yards'], color['weft_yards'])
+            rows.append((color['color'], text))
+        return rows
+
+
+def thread_spacing(spacing, per_inch=None):
+    """
+    Return the spacing of each thread in inches: ``1 / per_inch`` if a sett
+    is given, otherwise the known spacings with unknown (NaN) ones filled
+    in with the most common known one. Returns None if no spacing is known.
+    """
+    if per_inch:
+        return np.full(len(spacing), 1.0 / per_inch)
+    known = spacing[spacing > 0]
+    if not len(known):
+        return None if len(spacing) else spacing
+    values, counts = np.unique(known, return_counts=True)
+    return np.where(spacing > 0, spacing, values[np.argmax(counts)])
@@ -0,0 +1,72 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from .. import Color
+from ..animate import WeavingAnimation
+from ..generators.twill import twill
+from ..render import ArrayImageRenderer
+
+
+def make_draft():
+    draft = twill()
+    draft.repeat(3)
+    draft.weft[5].color = Color((0, 0, 200))
+    return draft
+
+
+class TestAnimate(TestCase):
+
+    def test_frames(self):
+        draft = make_draft()
+        animation = WeavingAnimation(draft, scale=3, picks_per_frame=5)
+        frames = list(animation.iter_frames())
+        self.assertEqual(len(frames), animation.num_frames)
+        self.assertEqual(len(frames), -(-len(draft.weft) // 5))
+        self.assertEqual(frames[0].mode, 'P')
+        # Each frame adds five picks, and the last is the whole drawdown.
+        first = np.asarray(frames[0].convert('RGB'))
+        self.assertTrue((first[15:] == 255).all())
+        self.assertFalse((first[:15] == 255).all())
+        whole = ArrayImageRenderer(draft, scale=3, drawdown_only=True,
+                                   margin_pixels=0).make_pil_image()
+        np.testing.assert_array_equal(np.asarray(frames[-1].convert('RGB')),
+                                      np.asarray(whole))
+
+    def test_save(self):
+        draft = make_draft()
+        for fabric in (False, True):
+            animation = WeavingAnimation(draft, scale=2, picks_per_frame=4,
+                                         fabric=fabric)
+            expected = [np.asarray(frame.convert('RGB'))
+                        for frame in animation.iter_frames()]
+            for format in ('GIF', 'PNG'):
+                f = io.BytesIO()
+                animation.save(f, format=format, duration=50, hold=500)
+                f.seek(0)
+                im = Image.open(f)
+                frames = [np.asarray(frame.convert('RGB'))
+                          for frame in ImageSequence.Iterator(im)]
+                self.assertEqual(len(frames), len(expected))
+                for actual, frame in zip(frames, expected):
+                    np.testing.assert_array_equal(actual, frame)
+
+    def test_save_frames(self):
+        animation = WeavingAnimation(make_draft(), picks_per_frame=8)
+        tmp = tempfile.mkdtemp()
+        try:
+            filenames = animation.save_frames(
+                os.path.join(tmp, 'frames', '%03d.png'))
+            self.assertEqual(len(filenames), animation.num_frames)
+            self.assertEqual(os.path.basename(filenames[0]), '001.png')
+            self.assertTrue(all(os.path.exists(fn) for fn in filenames))
+        finally:
+            shutil.rmtree(tmp)
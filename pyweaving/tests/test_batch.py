@@ -0,0 +1,72 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+
+from .. import batch, formats
+from ..generators import twill
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, 'sub'))
+        for name, size in (('a.wif', 2), ('sub/b.wif.gz', 3)):
+            formats.save_draft(twill.twill(size),
+                               os.path.join(self.dir, name))
+        with open(os.path.join(self.dir, 'bad.wif'), 'w') as f:
+            f.write('[WIF]\nVersion=1.1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_expand_inputs(self):
+        found = batch.expand_inputs([self.dir])
+        self.assertEqual([relpath for path, relpath in found],
+                         ['a.wif', 'bad.wif', os.path.join('sub', 'b.wif.gz')])
+        pattern = os.path.join(self.dir, '**', '*.gz')
+        found = batch.expand_inputs([pattern])
+        self.assertEqual([relpath for path, relpath in found],
+                         [os.path.join('sub', 'b.wif.gz')])
+
+    def test_output_path(self):
+        self.assertEqual(batch.output_path('x/b.wif.gz', 'out', 'json'),
+                         os.path.join('out', 'x', 'b.json'))
+
+    def test_convert_skips_up_to_date(self):
+        outdir = os.path.join(self.dir, 'out')
+        jobs = [(path, batch.output_path(relpath, outdir, 'json'), {})
+                for path, relpath in batch.expand_inputs([self.dir])]
+        results = batch.run_batch(batch.convert_one, jobs, workers=2)
+        self.assertEqual([r['status'] for r in results],
+                         ['ok', 'error', 'ok'])
+        results = batch.run_batch(batch.convert_one, jobs, workers=1)
+        self.assertEqual([r['status'] for r in results],
+                         ['skipped', 'error', 'skipped'])
+
+    def test_duplicate_outputs(self):
+        formats.save_draft(twill.twill(2), os.path.join(self.dir, 'a.json'))
+        outdir = os.path.join(self.dir, 'out')
+        jobs = [(path, batch.output_path(relpath, outdir, 'json'), {})
+                for path, relpath in batch.expand_inputs([self.dir])]
+        jobs, failed = batch.split_duplicates(jobs)
+        self.assertEqual([os.path.basename(job[0]) for job in jobs],
+                         ['bad.wif', 'b.wif.gz'])
+        self.assertEqual([os.path.basename(r['infile']) for r in failed],
+                         ['a.json', 'a.wif'])
+        self.assertEqual({r['status'] for r in failed}, {'error'})
+        self.assertIn('a.wif', failed[0]['message'])
+
+    def test_stats_results(self):
+        paths = [path for path, relpath in batch.expand_inputs([self.dir])]
+        results = batch.run_batch(batch.stats_one, paths, workers=1)
+        self.assertEqual(results[2]['shafts'], 6)
+        f = io.StringIO()
+        batch.write_results(results, f)
+        lines = f.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('infile,status,'))
+        self.assertEqual(len(lines), 4)
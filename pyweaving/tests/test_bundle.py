@@ -0,0 +1,42 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+from unittest import TestCase
+
+from .. import formats
+from ..bundle import DraftBundle
+from ..wif import WIFWriter
+from ..generators import twill
+
+
+class TestBundle(TestCase):
+    def make_bundle(self):
+        buf = io.BytesIO()
+        with DraftBundle(buf, 'w') as bundle:
+            bundle.add(twill.twill(2), name='small.wif')
+            bundle.add(WIFWriter(twill.twill(3)).dumps().encode('utf-8'),
+                       name='large.wif')
+        return buf.getvalue()
+
+    def test_round_trip(self):
+        with DraftBundle(io.BytesIO(self.make_bundle())) as bundle:
+            self.assertEqual(bundle.names(), ['small.wif', 'large.wif'])
+            self.assertEqual(bundle.entries[1]['shafts'], 6)
+            sizes = [len(draft.warp) for name, draft in bundle]
+        self.assertEqual(sizes, [16, 24])
+
+    def test_load_member(self):
+        data = self.make_bundle()
+        draft = formats.load_draft(data, member='large.wif')
+        self.assertEqual(len(draft.shafts), 6)
+        with self.assertRaises(ValueError):
+            formats.load_draft(data)
+
+    def test_default_names(self):
+        buf = io.BytesIO()
+        with DraftBundle(buf, 'w') as bundle:
+            bundle.add(twill.twill(2))
+            entry = bundle.add(WIFWriter(twill.twill(3)).dumps().encode(
+                'utf-8'))
+        self.assertEqual(entry['name'], 'draft-2.wif')
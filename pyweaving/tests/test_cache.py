@@ -0,0 +1,64 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from .. import Color
+from ..cache import RenderCache, draft_fingerprint
+from ..generators.twill import twill
+from ..render import ArrayImageRenderer, SVGRenderer
+
+
+class TestRenderCache(TestCase):
+
+    def test_fingerprint_follows_content(self):
+        draft = twill()
+        self.assertEqual(draft_fingerprint(draft), draft_fingerprint(twill()))
+        draft.warp[0].color = Color((200, 0, 0))
+        self.assertNotEqual(draft_fingerprint(draft),
+                            draft_fingerprint(twill()))
+
+    def test_render_hits(self):
+        cache = RenderCache()
+        draft = twill()
+        png = cache.render(draft, ArrayImageRenderer, scale=5)
+        self.assertEqual(png[:4], b'\x89PNG')
+        self.assertEqual(cache.render(twill(), ArrayImageRenderer, scale=5),
+                         png)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.render(draft, ArrayImageRenderer, scale=6)
+        cache.render(draft, ArrayImageRenderer, scale=5,
+                     region={'picks': slice(0, 2)})
+        svg = cache.render(draft, SVGRenderer, format='svg')
+        self.assertTrue(svg.startswith(b'<svg'))
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+    def test_lru_eviction(self):
+        cache = RenderCache(max_bytes=10)
+        cache.put('a', b'1234')
+        cache.put('b', b'1234')
+        self.assertEqual(cache.get('a'), b'1234')
+        cache.put('c', b'1234')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1234')
+        self.assertEqual(cache.stats()['bytes'], 8)
+
+    def test_disk_tier(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            cache = RenderCache(directory=dirname, max_disk_bytes=10)
+            cache.put('a', b'1234')
+            cache.put('b', b'5678')
+            os.utime(os.path.join(dirname, 'a'), (0, 0))
+
+            cache = RenderCache(directory=dirname, max_disk_bytes=10)
+            self.assertEqual(cache.get('b'), b'5678')
+            self.assertEqual(cache.disk_hits, 1)
+            cache.put('c', b'9012')
+            self.assertEqual(sorted(os.listdir(dirname)), ['b', 'c'])
+        finally:
+            shutil.rmtree(dirname)
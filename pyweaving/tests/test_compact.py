@@ -0,0 +1,58 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+from .. import Draft
+from ..compact import rle_encode, rle_decode, loads
+from ..generators import twill
+
+
+class TestCompact(TestCase):
+    def assertSameDraft(self, a, b):
+        self.assertEqual([t.color.rgb for t in a.warp],
+                         [t.color.rgb for t in b.warp])
+        self.assertEqual([a.shafts.index(t.shaft) for t in a.warp],
+                         [b.shafts.index(t.shaft) for t in b.warp])
+        self.assertEqual(
+            [sorted(a.shafts.index(sh) for sh in t.connected_shafts)
+             for t in a.weft],
+            [sorted(b.shafts.index(sh) for sh in t.connected_shafts)
+             for t in b.weft])
+        self.assertEqual(len(a.treadles), len(b.treadles))
+
+    def test_rle_round_trip(self):
+        seq = [0, 1, 2, 3] * 10 + [5, 6, 7] + [1] * 20
+        runs = rle_encode(seq)
+        self.assertEqual(runs[0], [10, [0, 1, 2, 3]])
+        self.assertEqual(rle_decode(runs), seq)
+
+    def test_rle_no_repeats(self):
+        seq = [3, 1, 4, 1, 5, 9, 2, 6]
+        self.assertEqual(rle_decode(rle_encode(seq)), seq)
+
+    def test_compact_round_trip_treadled(self):
+        draft = twill.twill(3)
+        s = draft.to_json(compact=True)
+        self.assertEqual(loads(s)['version'], 1)
+        self.assertSameDraft(draft, Draft.from_json(s))
+
+    def test_compact_round_trip_liftplan(self):
+        draft = twill.twill(2)
+        draft.liftplan = True
+        for thread in draft.weft:
+            thread.shafts = thread.connected_shafts
+            thread.treadles = set()
+        s = draft.to_json(compact=True, rle=False)
+        self.assertIsInstance(loads(s)['weft']['shafts'][0], int)
+        self.assertSameDraft(draft, Draft.from_json(s.encode('utf-8')))
+
+    def test_compact_is_smaller(self):
+        draft = twill.twill(4)
+        draft.repeat(4)
+        self.assertLess(len(draft.to_json(compact=True)) * 10,
+                        len(draft.to_json()))
+
+    def test_plain_round_trip_treadled(self):
+        draft = twill.twill(2)
+        self.assertSameDraft(draft, Draft.from_json(draft.to_json()))
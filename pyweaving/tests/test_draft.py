@@ -4,6 +4,7 @@ from __future__ import (absolute_import, division, print_function,
 from unittest import TestCase
 
 from .. import Draft, Color
+from ..generators.twill import twill
 
 
 class TestDraft(TestCase):
@@ -26,3 +27,30 @@ class TestDraft(TestCase):
             color=black,
             shafts=[1],
         )
+
+    def test_back(self):
+        draft = twill()
+        back = draft.back()
+        self.assertEqual(back.warp, draft.warp[::-1])
+        self.assertIs(back.weft, draft.weft)
+        self.assertNotEqual(back.rising_shed, draft.rising_shed)
+        # Every thread on the face is under the other on the back.
+        for x, column in enumerate(draft.compute_drawdown()):
+            for y, thread in enumerate(column):
+                shown = back.compute_drawdown_at((len(draft.warp) - 1 - x, y))
+                self.assertIsNot(shown, thread)
+
+    def test_longest_floats(self):
+        draft = twill()
+        self.assertEqual(draft.compute_longest_floats(), (2, 2))
+        self.assertEqual(draft.compute_longest_floats('back'), (2, 2))
+        # Lift just the first of four shafts on every pick: its ends float
+        # the length of the face, and the weft floats over the other three,
+        # which float the length of the back.
+        for thread in draft.weft:
+            thread.treadles = set()
+            thread.shafts = {draft.shafts[0]}
+        self.assertEqual(draft.compute_longest_floats(),
+                         (len(draft.weft), 3))
+        self.assertEqual(draft.compute_longest_floats('back'),
+                         (len(draft.weft), 1))
@@ -0,0 +1,100 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+import numpy as np
+
+from .. import Draft
+from ..fabric import FabricRenderer, fabric_tones, WARP_UP, FIRST, LAST
+
+
+def make_draft():
+    # 2/2 twill, with a red warp and a blue weft.
+    draft = Draft(num_shafts=4, num_treadles=4)
+    for ii in range(12):
+        draft.add_warp_thread(color=(200, 0, 0), shaft=ii % 4)
+    for ii in range(8):
+        draft.add_weft_thread(color=(0, 0, 200),
+                              shafts=[ii % 4, (ii + 1) % 4])
+    return draft
+
+
+class TestFabric(TestCase):
+
+    def test_cell_types(self):
+        renderer = FabricRenderer(make_draft())
+        warp_up = renderer.arrays.drawdown()
+        types = renderer.cell_types()
+        np.testing.assert_array_equal((types & WARP_UP) > 0, warp_up)
+        # Floats are two squares long, so every square inside the draft is
+        # either the first or the last of its float.
+        inner = types[1:-1, 1:-1]
+        np.testing.assert_array_equal(
+            ((inner & FIRST) > 0) ^ ((inner & LAST) > 0), True)
+
+    def test_tones(self):
+        shows_warp, shade, spec = fabric_tones(10)
+        self.assertEqual(shows_warp.shape, (8, 10, 11))
+        # The thread on top is seen across its width, and the crossing
+        # thread in the gap beside it.
+        self.assertTrue(shows_warp[WARP_UP, :, :10].all())
+        self.assertFalse(shows_warp[WARP_UP, :, 10].any())
+        self.assertFalse(shows_warp[0, :, :10].any())
+        self.assertTrue(shows_warp[0, :, 10].all())
+        self.assertTrue((shade <= 256).all())
+        # Float ends are shaded darker than the middle of a float.
+        self.assertTrue(shade[WARP_UP | FIRST, 0].sum() <
+                        shade[WARP_UP, 0].sum())
+
+    def test_render(self):
+        renderer = FabricRenderer(make_draft(), scale=8, margin_pixels=3)
+        pixels = np.asarray(renderer.make_pil_image())
+        self.assertEqual(pixels.shape, (8 * 8 + 6, 12 * 8 + 6, 3))
+        np.testing.assert_array_equal(pixels[0, 0], (255, 255, 255))
+
+        # Warp squares are red, weft squares are blue.
+        warp_up = renderer.arrays.drawdown()
+        centers = pixels[3 + 4::8, 3 + 4::8]
+        np.testing.assert_array_equal(centers[:, :, 0] > centers[:, :, 2],
+                                      warp_up)
+
+    def test_proportional(self):
+        draft = make_draft()
+        for ii, thread in enumerate(draft.warp):
+            thread.spacing = 0.1 if ii % 3 else 0.2
+            thread.thickness = 0.05
+        renderer = FabricRenderer(draft, scale=6, proportional=True)
+        pixels = np.asarray(renderer.make_pil_image())
+        self.assertEqual(pixels.shape, (8 * 6, (8 * 6) + (4 * 12), 3))
+        # The second end, on top in the first pick, covers half of its six
+        # pixels, with the weft showing either side of it.
+        self.assertTrue(renderer.arrays.drawdown()[0, 1])
+        row = pixels[3, 12:18, :]
+        self.assertEqual(list(row[:, 0] > row[:, 2]),
+                         [False, True, True, True, False, False])
+
+    def test_noise_and_workers(self):
+        draft = make_draft()
+        plain = np.asarray(FabricRenderer(draft).make_pil_image())
+        noisy = FabricRenderer(draft, noise=0.2, seed=3).make_pil_image()
+        self.assertFalse((np.asarray(noisy) == plain).all())
+        proportional = FabricRenderer(draft, proportional=True)
+        self.assertTrue((np.asarray(proportional.make_pil_image()) ==
+                         plain).all())
+        parallel = FabricRenderer(draft, noise=0.2, seed=3,
+                                  workers=3).make_pil_image()
+        np.testing.assert_array_equal(np.asarray(parallel),
+                                      np.asarray(noisy))
+
+    def test_sides(self):
+        draft = make_draft()
+        face = np.asarray(FabricRenderer(draft).make_pil_image())
+        back = np.asarray(FabricRenderer(draft, side='back').make_pil_image())
+        self.assertEqual(back.shape, face.shape)
+        self.assertTrue((np.asarray(FabricRenderer(
+            draft.back()).make_pil_image()) == back).all())
+        both = np.asarray(FabricRenderer(draft, side='both').make_pil_image())
+        self.assertEqual(both.shape[1], (2 * face.shape[1]) + 20)
+        self.assertTrue((both[:, :face.shape[1]] == face).all())
+        self.assertTrue((both[:, -face.shape[1]:] == back).all())
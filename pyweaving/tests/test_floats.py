@@ -0,0 +1,88 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+import numpy as np
+
+from .. import Color, Draft
+from ..arrays import DraftArrays, run_lengths
+from ..floats import FloatRenderer, heat_colors
+from ..generators.twill import twill
+
+
+class TestFloats(TestCase):
+
+    def test_run_lengths(self):
+        mask = np.array([[1, 1, 0, 1, 1, 1],
+                         [0, 0, 0, 0, 0, 1]], dtype=bool)
+        np.testing.assert_array_equal(run_lengths(mask),
+                                      [[2, 2, 0, 3, 3, 3],
+                                       [0, 0, 0, 0, 0, 1]])
+
+    def test_float_lengths(self):
+        draft = twill()
+        arrays = DraftArrays(draft)
+        warp, weft = arrays.float_lengths()
+        warp_up = arrays.drawdown()
+        np.testing.assert_array_equal(warp > 0, warp_up)
+        np.testing.assert_array_equal(weft > 0, ~warp_up)
+        self.assertEqual((warp.max(), weft.max()),
+                         arrays.longest_floats()['face'])
+
+    def test_heatmap(self):
+        draft = twill()
+        renderer = FloatRenderer(draft, scale=2)
+        im = renderer.make_pil_image()
+        self.assertEqual(im.mode, 'P')
+        self.assertEqual(im.size, (2 * len(draft.warp), 2 * len(draft.weft)))
+        # Floats of a 2/2 twill are 2 long, except where the edges of the
+        # draft cut them off.
+        colors = heat_colors(2)
+        rgb = im.convert('RGB')
+        self.assertEqual(rgb.getpixel((2, 2)), tuple(colors[2]))
+        self.assertEqual(rgb.getpixel((0, 0)), tuple(colors[1]))
+
+    def test_threshold(self):
+        draft = twill()
+        draft.weft[0].color = Color((0, 0, 200))
+        highlight = (255, 0, 255)
+        for overlay in (False, True):
+            renderer = FloatRenderer(draft, scale=1, overlay=overlay,
+                                     alpha=0, threshold=0,
+                                     highlight=highlight)
+            pixels = np.asarray(renderer.make_pil_image().convert('RGB'))
+            self.assertTrue((pixels == highlight).all())
+            renderer.threshold = 2
+            pixels = np.asarray(renderer.make_pil_image().convert('RGB'))
+            self.assertFalse((pixels == highlight).all(axis=2).any())
+
+    def test_sides(self):
+        draft = twill()
+        face = FloatRenderer(draft, scale=1).make_pil_image()
+        both = FloatRenderer(draft, scale=1, side='both').make_pil_image()
+        self.assertEqual(both.size, ((2 * face.width) + 2, face.height))
+
+    def test_sides_share_colors(self):
+        # Every other pick lifts alternate ends, except the first, which is
+        # never lifted: the face's floats are at most 4 long, and the back's
+        # up to 8.
+        draft = Draft(num_shafts=4, liftplan=True)
+        for shaft in range(4):
+            draft.add_warp_thread(color=(255, 255, 255), shaft=shaft)
+        for pick in range(8):
+            draft.add_weft_thread(color=(0, 0, 255),
+                                  shafts={1, 3} if pick % 2 else set())
+        arrays = DraftArrays(draft)
+        self.assertEqual(arrays.longest_floats(),
+                         {'face': (1, 4), 'back': (8, 1)})
+        renderer = FloatRenderer(draft, scale=1, side='both',
+                                 background=(0, 0, 0))
+        im = renderer.make_pil_image()
+        self.assertEqual(im.mode, 'P')
+        im = im.convert('RGB')
+        # The first end, on the right of the back, is one float as long as
+        # the warp.
+        self.assertEqual(im.getpixel((4 + 2 + 3, 0)),
+                         tuple(heat_colors(8)[8]))
+        self.assertEqual(im.getpixel((0, 0)), tuple(heat_colors(8)[4]))
@@ -0,0 +1,42 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ..fonts import get_font, get_atlas, blend
+from ..render import font_path
+
+
+class TestFonts(TestCase):
+
+    def test_fonts_are_shared(self):
+        self.assertIs(get_font(font_path, 12), get_font(font_path, 12))
+        self.assertIs(get_atlas(font_path, 12).font, get_font(font_path, 12))
+        self.assertIsNot(get_font(font_path, 12), get_font(font_path, 13))
+
+    def test_fallback(self):
+        with self.assertRaises(IOError):
+            get_font('missing.ttf', 12)
+        self.assertIsNotNone(get_font('missing.ttf', 12, fallback=True))
+
+    def test_labels_match_text(self):
+        atlas = get_atlas(font_path, 19)
+        for text in ('4', '17', '480'):
+            expected = Image.new('RGB', (80, 40), (200, 220, 240))
+            ImageDraw.Draw(expected).text((5, 7), text, font=atlas.font,
+                                          fill=(50, 10, 90))
+            expected = np.asarray(expected)
+
+            im = Image.new('RGB', (80, 40), (200, 220, 240))
+            atlas.draw(ImageDraw.Draw(im), (5, 7), text, (50, 10, 90))
+            self.assertTrue((np.asarray(im) == expected).all())
+
+            pixels = np.empty((40, 80, 3), dtype=np.uint8)
+            pixels[...] = (200, 220, 240)
+            left, top, right, bottom = atlas.bbox(text)
+            blend(pixels[7 + top:7 + bottom, 5 + left:5 + right],
+                  atlas.alpha(text), (50, 10, 90))
+            self.assertTrue((pixels == expected).all())
@@ -0,0 +1,80 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os.path
+from unittest import TestCase
+
+from .. import Draft, formats
+from ..wif import WIFReader, WIFWriter
+from ..generators import twill
+
+
+here = os.path.dirname(__file__)
+
+class TestFormats(TestCase):
+    def test_sniff(self):
+        self.assertEqual(formats.sniff_format(b'  {"a": 1}'), 'json')
+        self.assertEqual(formats.sniff_format(b'\xef\xbb\xbf[WIF]\n'), 'wif')
+        self.assertIsNone(formats.sniff_format(b'GIF89a'))
+
+    def test_wif_from_bytes(self):
+        draft = twill.twill(2)
+        data = WIFWriter(draft).dumps().encode('utf-8')
+        for source in (data, memoryview(data), io.BytesIO(data),
+                       io.StringIO(data.decode('utf-8'))):
+            loaded = WIFReader(source).read()
+            self.assertEqual(len(loaded.warp), len(draft.warp))
+            self.assertEqual(len(loaded.weft), len(draft.weft))
+
+    def test_load_draft_sniffs_content(self):
+        draft = twill.twill(2)
+        for format in ('wif', 'json'):
+            buf = io.BytesIO()
+            formats.save_draft(draft, buf, format=format)
+            loaded = formats.load_draft(buf.getvalue())
+            self.assertEqual(len(loaded.warp), len(draft.warp))
+
+    def test_load_draft_rejects_unknown(self):
+        with self.assertRaises(ValueError):
+            formats.load_draft(b'not a draft')
+
+    def test_compressed_round_trip(self):
+        draft = twill.twill(2)
+        for compression in ('gzip', 'bz2', 'xz'):
+            buf = io.BytesIO()
+            formats.save_draft(draft, buf, format='wif',
+                               compression=compression)
+            data = buf.getvalue()
+            self.assertEqual(formats.sniff_compression(data), compression)
+            loaded = formats.load_draft(io.BytesIO(data))
+            self.assertEqual(len(loaded.weft), len(draft.weft))
+
+    def test_wif_thread_sizes(self):
+        draft = formats.load_draft(os.path.join(here, '..', 'test.wif'))
+        # Defaults and per-thread values, in centimeters, are read as inches.
+        self.assertAlmostEqual(draft.warp[0].spacing, 0.212 / 2.54)
+        self.assertAlmostEqual(draft.warp[1].spacing, 0.424 / 2.54)
+        self.assertAlmostEqual(draft.weft[1].thickness, 0.212 / 2.54)
+
+        data = WIFWriter(draft).dumps()
+        loaded = WIFReader(data.encode('utf-8')).read()
+        for a, b in zip(draft.warp + draft.weft, loaded.warp + loaded.weft):
+            self.assertAlmostEqual(a.spacing, b.spacing, places=6)
+            self.assertAlmostEqual(a.thickness, b.thickness, places=6)
+
+        for compact in (False, True):
+            loaded = Draft.from_json(draft.to_json(compact=compact))
+            self.assertEqual([t.spacing for t in loaded.warp],
+                             [t.spacing for t in draft.warp])
+            self.assertEqual([t.thickness for t in loaded.weft],
+                             [t.thickness for t in draft.weft])
+
+        # Drafts without sizes don't mention them.
+        self.assertNotIn('SPACING', WIFWriter(twill.twill(2)).dumps())
+        self.assertNotIn('spacing', twill.twill(2).to_json(compact=True))
+
+    def test_format_for_filename(self):
+        self.assertEqual(formats.format_for_filename('a.WIF.gz'), 'wif')
+        self.assertEqual(formats.format_for_filename('a.json.zst'), 'json')
+        self.assertIsNone(formats.format_for_filename('a.png'))
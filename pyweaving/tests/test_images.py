@@ -0,0 +1,99 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import timeit
+from unittest import TestCase
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .. import Draft
+from ..images import to_palette, encode_image, save_image
+from ..render import ArrayImageRenderer
+
+
+def make_draft():
+    draft = Draft(num_shafts=4, num_treadles=4)
+    for ii in range(24):
+        draft.add_warp_thread(color=(200, 20 * (ii % 4), 40), shaft=ii % 4)
+    for ii in range(16):
+        draft.add_weft_thread(color=(10, 90, 15 * (ii % 3)),
+                              shafts=[ii % 4, (ii + 1) % 4])
+    return draft
+
+
+def make_lift_card(num_shafts=8):
+    # Laid out like the tracker's lift cards: a row of squares, some lifted,
+    # over a strip of the weft color.
+    square = (800 - (5 * (num_shafts - 1))) // num_shafts
+    im = Image.new('RGB', ((square + 5) * num_shafts - 1, square + 29),
+                   (255, 255, 255))
+    draw = ImageDraw.Draw(im)
+    for ii in range(num_shafts):
+        x = 2 + (ii * (square + 5))
+        draw.rectangle([x, 2, x + square, 2 + square], outline=(0, 0, 0),
+                       fill=(0, 0, 0) if ii % 3 else (255, 255, 255))
+        draw.text((x + (square // 3), square // 3), str(ii + 1),
+                  fill=(255, 255, 255) if ii % 3 else (0, 0, 0))
+    draw.rectangle([2, square + 7, im.width - 2, im.height - 2],
+                   fill=(31, 0, 155))
+    return im
+
+
+class TestImages(TestCase):
+
+    def test_to_palette_is_exact(self):
+        im = ArrayImageRenderer(make_draft()).make_pil_image()
+        p = to_palette(im)
+        self.assertEqual(p.mode, 'P')
+        np.testing.assert_array_equal(np.asarray(p.convert('RGB')),
+                                      np.asarray(im))
+
+        noise = np.random.RandomState(0).randint(0, 256, (40, 40, 3))
+        im = Image.fromarray(noise.astype(np.uint8))
+        self.assertIs(to_palette(im), im)
+
+        # As many colors as fit, which need a larger hash table.
+        im = Image.fromarray(noise.astype(np.uint8).reshape(-1, 3)[:256]
+                             .reshape(16, 16, 3))
+        np.testing.assert_array_equal(np.asarray(to_palette(im).convert(
+            'RGB')), np.asarray(im))
+
+    def test_drawdown_palette(self):
+        renderer = ArrayImageRenderer(make_draft(), drawdown_only=True,
+                                      grid=True, scale=3, margin_pixels=2)
+        p = renderer.make_drawdown_image(palette=True)
+        self.assertEqual(p.mode, 'P')
+        np.testing.assert_array_equal(np.asarray(p.convert('RGB')),
+                                      np.asarray(renderer.make_pil_image()))
+
+    def test_encode(self):
+        im = ArrayImageRenderer(make_draft()).make_pil_image()
+        for format, options in (('png', {}),
+                                ('png', {'compress_level': 1,
+                                         'strategy': 'rle'}),
+                                ('png', {'palette': False}),
+                                ('webp', {'method': 0})):
+            data = encode_image(im, format, **options)
+            decoded = Image.open(io.BytesIO(data))
+            self.assertEqual(decoded.format, format.upper())
+            np.testing.assert_array_equal(
+                np.asarray(decoded.convert('RGB')), np.asarray(im))
+
+        f = io.BytesIO()
+        save_image(to_palette(im), f, format='jpg')
+        self.assertEqual(Image.open(f).mode, 'RGB')
+
+    def test_palette_encode_is_faster(self):
+        im = make_lift_card()
+        self.assertEqual(to_palette(im).mode, 'P')
+        timers = [timeit.Timer(lambda palette=palette: encode_image(
+                      im, 'png', compress_level=1, palette=palette))
+                  for palette in (True, False)]
+        # The best of interleaved runs, so both see the same load.
+        best = [float('inf')] * 2
+        for __ in range(15):
+            for ii, timer in enumerate(timers):
+                best[ii] = min(best[ii], timer.timeit(5))
+        self.assertLess(best[0], best[1])
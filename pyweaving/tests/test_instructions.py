@@ -0,0 +1,70 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+import numpy as np
+
+from .. import Color, Draft
+from ..instructions import ThreadingPlan, ThreadingRun, threading_runs
+
+
+def threaded_draft(shafts, num_shafts=4):
+    draft = Draft(num_shafts=num_shafts)
+    for shaft in shafts:
+        draft.add_warp_thread(color=Color((255, 255, 255)), shaft=shaft)
+    return draft
+
+
+class TestThreadingPlan(TestCase):
+
+    def test_heddles(self):
+        draft = threaded_draft([0, 1, 2, 3, 0, 1])
+        draft.warp[1].shaft = None
+        plan = ThreadingPlan(draft, repeats=3)
+        self.assertEqual(plan.ends, 18)
+        self.assertEqual(plan.heddles, [6, 3, 3, 3])
+        self.assertEqual(plan.total_heddles, 15)
+        self.assertEqual(plan.unthreaded, 3)
+        self.assertEqual([plan.shaft(end) for end in (0, 1, 6, 10)],
+                         [0, -1, 0, 0])
+
+    def test_empty(self):
+        plan = ThreadingPlan(threaded_draft([]), repeats=2)
+        self.assertEqual((plan.ends, plan.runs), (0, []))
+        self.assertEqual(plan.lines()[-1], 'Total heddles required: 0')
+
+    def test_runs(self):
+        draft = threaded_draft([0, 1, 2, 3] * 2 + [3, 2, 1] + [0, 0])
+        plan = ThreadingPlan(draft)
+        self.assertEqual(plan.runs, [
+            ThreadingRun(0, (0, 1, 2, 3), 2),
+            ThreadingRun(8, (3, 2, 1, 0, 0)),
+        ])
+        self.assertEqual(plan.lines()[-2:],
+                         ['Ends 1-8: 1,2,3,4 x2', 'Ends 9-13: 4,3,2,1,1'])
+        self.assertEqual(plan.as_dict()['runs'][0],
+                         {'start': 1, 'stop': 8, 'shafts': [1, 2, 3, 4],
+                          'count': 2})
+
+    def test_unit(self):
+        # A point twill block longer than the units of runs.
+        block = [0, 1, 2, 3, 2, 1] * 2 + [0, 2, 1, 3] * 4 + [3, 2, 1]
+        draft = threaded_draft(block * 3 + block[:5])
+        plan = ThreadingPlan(draft, repeats=2, max_unit=8)
+        self.assertEqual(plan.unit, len(block))
+        self.assertEqual(plan.runs[0], ThreadingRun(0, (0, 1, 2, 3, 2, 1), 2))
+        self.assertEqual(plan.lines()[-2:], [
+            'Repeat ends 1-%d x3, then ends 1-5.' % len(block),
+            'Repeat ends 1-%d x2, for %d ends in all.' % (
+                len(draft.warp), 2 * len(draft.warp)),
+        ])
+
+    def test_runs_cover_threading(self):
+        threading = np.random.RandomState(0).randint(-1, 4, 500)
+        threading[100:200] = np.tile([0, 1, 2, 3, 2, 1], 17)[:100]
+        unrolled = []
+        for run in threading_runs(threading):
+            self.assertEqual(run.start, len(unrolled))
+            unrolled.extend(run.unit * run.count)
+        self.assertEqual(unrolled, threading.tolist())
@@ -0,0 +1,93 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+from .. import Treadle
+from ..lint import WIFLinter, ERROR, WARNING
+from ..wif import WIFReader, WIFWriter, WIFError
+from ..generators import twill
+
+
+class TestLint(TestCase):
+    def make_wif(self):
+        return WIFWriter(twill.twill(2)).dumps()
+
+    def lint(self, text):
+        linter = WIFLinter(text.encode('utf-8'))
+        return linter, linter.lint()
+
+    def test_clean(self):
+        linter, diagnostics = self.lint(self.make_wif())
+        self.assertEqual(linter.errors, [])
+
+    def test_collects_all_problems(self):
+        text = self.make_wif()
+        text = text.replace('[THREADING]\n', '[THREADING]\n1 = 9\n')
+        text = text.replace('[TREADLING]\n', '[TREADLING]\n3 = x\nbogus\n')
+        text = text.replace('Units = Inches', 'Units = cm', 1)
+        linter, diagnostics = self.lint(text)
+        messages = [d.message for d in linter.errors]
+        self.assertEqual(len(messages), 4, messages)
+        self.assertTrue(all(d.line for d in diagnostics))
+        self.assertIn("Units of 'cm' is not understood", messages[0])
+        self.assertIn("can't parse 'bogus'", messages)
+
+    def test_repair(self):
+        text = self.make_wif()
+        text = text.replace('Threads = 16', 'Threads = 12', 1)
+        text = text.replace('[THREADING]\n', '[THREADING]\n17 = 2,7\n')
+        linter, diagnostics = self.lint(text)
+        self.assertTrue(linter.errors)
+        fixed = linter.repair().encode('utf-8')
+        fixed_linter = WIFLinter(fixed)
+        fixed_linter.lint()
+        self.assertEqual(fixed_linter.errors, [])
+        draft = WIFReader(fixed).read()
+        self.assertEqual(len(draft.warp), 17)
+
+    def test_repair_empty_palette(self):
+        text = self.make_wif()
+        text = text.replace('1 = 0,0,100\n2 = 255,255,255\n', '', 1)
+        text = text.replace('Units = Inches', 'Units = Inches\nColor = 1', 1)
+        linter, diagnostics = self.lint(text)
+        self.assertIn('default color 1 is not in the color table',
+                      [d.message for d in linter.errors])
+        # Unfixable problems are left alone.
+        WIFLinter(linter.repair().encode('utf-8')).lint()
+
+    def test_unused_threads(self):
+        text = self.make_wif().replace('Threads = 16', 'Threads = 20', 1)
+        linter, diagnostics = self.lint(text)
+        self.assertEqual([d.severity for d in diagnostics], [WARNING])
+        self.assertIn('4 of 20 warp threads', diagnostics[0].message)
+
+    def test_reader_raises_wif_error(self):
+        text = self.make_wif().replace('Units = Inches', 'Units = cm', 1)
+        with self.assertRaises(WIFError):
+            WIFReader(text.encode('utf-8')).read()
+        linter, diagnostics = self.lint(text)
+        self.assertEqual(diagnostics[0].severity, ERROR)
+
+    def test_empty_rows_round_trip(self):
+        # An unused treadle and a pick with no treadles are written as
+        # empty entries, which both the linter and the reader accept.
+        draft = twill.twill(2)
+        draft.treadles.append(Treadle())
+        draft.weft[0].treadles = set()
+        text = WIFWriter(draft).dumps()
+        self.assertIn('\n%d = \n' % len(draft.treadles), text)
+        linter, diagnostics = self.lint(text)
+        self.assertEqual(linter.errors, [])
+        read = WIFReader(text.encode('utf-8')).read()
+        self.assertEqual(len(read.treadles), len(draft.treadles))
+        self.assertEqual(read.treadles[-1].shafts, set())
+        self.assertEqual(read.weft[0].treadles, set())
+
+    def test_reader_reports_malformed_rows(self):
+        text = self.make_wif().replace('[TREADLING]\n1 = ',
+                                       '[TREADLING]\n1 = x', 1)
+        line_no = text.splitlines().index('1 = x1') + 1
+        with self.assertRaises(WIFError) as cm:
+            WIFReader(text.encode('utf-8')).read()
+        self.assertIn('[TREADLING] on line %d' % line_no, str(cm.exception))
@@ -0,0 +1,74 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+from PIL import PdfParser
+
+from ..generators.twill import twill
+from ..pages import PageRenderer
+
+
+def make_draft(picks=200):
+    draft = twill()
+    draft.repeat(-(-picks // len(draft.weft)))
+    return draft
+
+
+class TestPages(TestCase):
+
+    def test_layout(self):
+        draft = make_draft()
+        renderer = PageRenderer(draft, liftplan=True, dpi=72)
+        self.assertTrue(renderer.liftplan)
+        per_page = renderer.picks_per_page
+        self.assertEqual(renderer.num_pages,
+                         -(-len(draft.weft) // per_page))
+        self.assertEqual(renderer.page_picks(1), (per_page, 2 * per_page))
+        start, stop = renderer.page_picks(renderer.num_pages - 1)
+        self.assertEqual(stop, len(draft.weft))
+        # The tie-up takes room from the picks.
+        treadling = PageRenderer(draft, liftplan=False, dpi=72)
+        self.assertLess(treadling.picks_per_page, per_page)
+        landscape = PageRenderer(draft, liftplan=True, dpi=72,
+                                 landscape=True)
+        self.assertLess(landscape.picks_per_page, per_page)
+
+    def test_page(self):
+        draft = make_draft()
+        renderer = PageRenderer(draft, liftplan=True, dpi=72, margin=0)
+        page = renderer.make_page(1)
+        self.assertEqual(page.size, (612, 792))
+        # The grid shows the second page's picks.
+        pixels = np.asarray(page)
+        p = renderer.pixels_per_square
+        start, stop = renderer.page_picks(1)
+        for ii, pick in enumerate(range(start, stop)):
+            y = renderer.grid_y + (ii * p) + (p // 2)
+            for shaft in range(len(draft.shafts)):
+                x = (shaft * p) + (p // 2)
+                marked = (pixels[y, x] == 0).all()
+                self.assertEqual(marked, renderer.arrays.lift[pick, shaft])
+
+    def test_pdf(self):
+        renderer = PageRenderer(make_draft(), liftplan=False, dpi=72)
+        f = io.BytesIO()
+        renderer.save_pdf(f)
+        parser = PdfParser.PdfParser(buf=f.getvalue())
+        self.assertEqual(len(parser.pages), renderer.num_pages)
+
+    def test_save_pages(self):
+        renderer = PageRenderer(make_draft(60), dpi=72)
+        tmp = tempfile.mkdtemp()
+        try:
+            filenames = renderer.save_pages(
+                os.path.join(tmp, 'pages', '%03d.png'))
+            self.assertEqual(len(filenames), renderer.num_pages)
+            self.assertTrue(all(os.path.exists(fn) for fn in filenames))
+        finally:
+            shutil.rmtree(tmp)
@@ -1,11 +1,19 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import io
 from unittest import TestCase
 from tempfile import NamedTemporaryFile
+from xml.etree import ElementTree
 
-from .. import Draft, Color
-from ..render import ImageRenderer, SVGRenderer
+import numpy as np
+from PIL import Image
+
+from .. import Draft, Color, cmd
+from ..formats import save_draft
+from ..generators.twill import twill
+from ..render import (ImageRenderer, ArrayImageRenderer, SVGRenderer,
+                      CompactSVGRenderer, svg_preamble)
 
 
 class TestRender(TestCase):
@@ -52,3 +60,226 @@ class TestRender(TestCase):
         draft = self.make_draft()
         with NamedTemporaryFile() as f:
             SVGRenderer(draft, liftplan=True).save(f.name)
+
+    def assert_same_pixels(self, draft, **kwargs):
+        expected = np.asarray(ImageRenderer(draft, **kwargs).make_pil_image())
+        actual = np.asarray(
+            ArrayImageRenderer(draft, **kwargs).make_pil_image())
+        self.assertEqual(actual.shape, expected.shape)
+        self.assertTrue((actual == expected).all())
+
+    def test_array_matches_image(self):
+        draft = self.make_draft()
+        self.assert_same_pixels(draft)
+        self.assert_same_pixels(draft, liftplan=True)
+
+    def test_array_matches_image_twill(self):
+        draft = twill()
+        draft.repeat(3)
+        draft.weft[5].color = Color((0, 0, 200))
+        for scale in (7, 10, 16):
+            self.assert_same_pixels(draft, scale=scale)
+            self.assert_same_pixels(draft, scale=scale, liftplan=True)
+
+    def test_drawdown_only(self):
+        draft = twill()
+        drawdown = draft.compute_drawdown()
+        im = ImageRenderer(draft, scale=1, margin_pixels=0,
+                           drawdown_only=True).make_pil_image()
+        self.assertEqual(im.size, (len(draft.warp), len(draft.weft)))
+        for x, column in enumerate(drawdown):
+            for y, thread in enumerate(column):
+                self.assertEqual(im.getpixel((x, y)), thread.color.rgb)
+
+    def test_drawdown_only_grid(self):
+        draft = twill()
+        im = ArrayImageRenderer(draft, scale=5, margin_pixels=2,
+                                drawdown_only=True,
+                                grid=True).make_pil_image()
+        self.assertEqual(im.size, ((len(draft.warp) * 5) + 5,
+                                   (len(draft.weft) * 5) + 5))
+        self.assertEqual(im.getpixel((0, 0)), (255, 255, 255))
+        self.assertEqual(im.getpixel((7, 9)), (127, 127, 127))
+        self.assertNotEqual(im.getpixel((8, 8)), (127, 127, 127))
+
+    def test_cmd_drawdown_only_grid(self):
+        draft = twill()
+        with NamedTemporaryFile(suffix='.wif') as infile, \
+                NamedTemporaryFile(suffix='.png') as outfile:
+            save_draft(draft, infile.name)
+            cmd.main(['pyweaving', 'render', infile.name, outfile.name,
+                      '--drawdown-only', '--grid'])
+            im = Image.open(outfile.name)
+            self.assertEqual(im.width, (len(draft.warp) * 4) + 1)
+            self.assertEqual(len(im.convert('RGB').getcolors()), 3)
+            with self.assertRaises(SystemExit):
+                cmd.main(['pyweaving', 'render', infile.name, outfile.name,
+                          '--drawdown-only', '--grid', '--scale', '1'])
+
+    def test_draft_region(self):
+        draft = twill()
+        num_ends = len(draft.warp)
+        region = draft.region(slice(2, 6), slice(4, 9))
+        self.assertEqual(region.warp, draft.warp[2:6])
+        self.assertEqual(region.weft, draft.weft[4:9])
+        self.assertIs(region.shafts, draft.shafts)
+        self.assertEqual(len(draft.warp), num_ends)
+
+    def test_render_region_full(self):
+        draft = twill()
+        draft.repeat(3)
+        full = np.asarray(ImageRenderer(draft).make_pil_image())
+        for renderer_class in (ImageRenderer, ArrayImageRenderer):
+            region = np.asarray(renderer_class(draft).render_region())
+            self.assertTrue((region == full).all())
+
+    def test_render_region_matches(self):
+        draft = twill()
+        draft.repeat(6)
+        for liftplan in (None, True):
+            for panels in (None, ['drawdown'], ['liftplan', 'treadling'],
+                           ['threading', 'weft']):
+                kwargs = dict(ends=slice(3, 13), picks=slice(9, 22),
+                              panels=panels)
+                expected = np.asarray(ImageRenderer(
+                    draft, liftplan=liftplan).render_region(**kwargs))
+                actual = np.asarray(ArrayImageRenderer(
+                    draft, liftplan=liftplan).render_region(**kwargs))
+                self.assertEqual(actual.shape, expected.shape)
+                self.assertTrue((actual == expected).all())
+
+    def test_render_region_numbering(self):
+        draft = twill()
+        draft.repeat(30)
+        svg = SVGRenderer(draft, liftplan=True).render_region(
+            ends=slice(0, 0), picks=slice(100, 110), panels=['liftplan'])
+        self.assertIn('>104<', svg)
+        self.assertIn('>108<', svg)
+        self.assertNotIn('>4<', svg)
+        self.assertNotIn('>112<', svg)
+        self.assertEqual(svg.count('<rect'), 10 * 4 + 10 * 2)
+
+    def test_render_region_unknown_panels(self):
+        renderer = ImageRenderer(twill())
+        with self.assertRaises(ValueError):
+            renderer.render_region(panels=['drawdown', 'selvedge'])
+        with NamedTemporaryFile(suffix='.wif') as infile:
+            save_draft(twill(), infile.name)
+            with self.assertRaises(SystemExit):
+                cmd.main(['pyweaving', 'render', infile.name, 'out.png',
+                          '--panels', 'drawdown,selvedge'])
+
+    def test_compact_svg(self):
+        draft = twill()
+        draft.repeat(10)
+        for liftplan in (None, True):
+            full = SVGRenderer(draft, liftplan=liftplan).make_svg_doc()
+            compact = CompactSVGRenderer(
+                draft, liftplan=liftplan).make_svg_doc()
+            ElementTree.fromstring(compact)
+            self.assertLess(len(compact) * 10, len(full))
+            # One marker per thread in the threading and liftplan/treadling,
+            # plus the tie-up's.
+            self.assertEqual(compact.count('<use '),
+                             full.count('style="fill:'))
+            self.assertIn('id="drawdown"', compact)
+            self.assertIn('>24<', compact)
+
+    def test_compact_svg_region(self):
+        draft = twill()
+        draft.repeat(30)
+        svg = CompactSVGRenderer(draft, liftplan=True).render_region(
+            ends=slice(0, 0), picks=slice(100, 110), panels=['liftplan'])
+        self.assertIn('>104<', svg)
+        self.assertIn('>108<', svg)
+        self.assertNotIn('>112<', svg)
+        self.assertEqual(svg.count('<use '), 10 * 2)
+
+    def test_svg_streaming(self):
+        draft = twill()
+        draft.repeat(10)
+        for cls in (SVGRenderer, CompactSVGRenderer):
+            renderer = cls(draft)
+            doc = renderer.make_svg_doc()
+            f = io.StringIO()
+            renderer.write_svg(f, buffer_size=100)
+            self.assertEqual(f.getvalue(), doc)
+            chunks = list(renderer.iter_chunks(size=1000))
+            self.assertGreater(len(chunks), 2)
+            self.assertEqual(''.join(chunks), svg_preamble + '\n' + doc)
+
+    def test_parallel_drawdown(self):
+        draft = twill()
+        draft.repeat(6)
+        for kwargs in ({}, {'liftplan': True, 'scale': 7},
+                       {'drawdown_only': True, 'grid': True, 'scale': 3}):
+            expected = np.asarray(
+                ArrayImageRenderer(draft, **kwargs).make_pil_image())
+            actual = np.asarray(ArrayImageRenderer(
+                draft, workers=3, **kwargs).make_pil_image())
+            self.assertTrue((actual == expected).all())
+
+    def test_proportional_drawdown(self):
+        draft = twill()
+        kwargs = {'drawdown_only': True, 'grid': True, 'scale': 4,
+                  'margin_pixels': 0}
+        uniform = np.asarray(
+            ArrayImageRenderer(draft, **kwargs).make_pil_image())
+        # Without known spacing, threads are laid out as usual.
+        self.assertTrue((np.asarray(ArrayImageRenderer(
+            draft, proportional=True, **kwargs).make_pil_image()) ==
+            uniform).all())
+
+        for ii, thread in enumerate(draft.warp):
+            thread.spacing = 0.1 if ii % 2 else 0.05
+        pixels = np.asarray(ArrayImageRenderer(
+            draft, proportional=True, **kwargs).make_pil_image())
+        ends = len(draft.warp)
+        self.assertEqual(pixels.shape[1],
+                         (4 * ((ends + 1) // 2)) + (8 * (ends // 2)) + 1)
+        self.assertEqual(pixels.shape[0], uniform.shape[0])
+        # The second end is twice as wide as the first.
+        grid = (pixels[2, :, :] == (127, 127, 127)).all(axis=1)
+        self.assertEqual(list(np.nonzero(grid)[0][:3]), [0, 4, 12])
+
+    def test_back(self):
+        draft = twill()
+        draft.repeat(2)
+        draft.warp[1].color = Color((0, 0, 200))
+        kwargs = {'drawdown_only': True, 'scale': 1, 'margin_pixels': 0}
+        face = np.asarray(
+            ArrayImageRenderer(draft, **kwargs).make_pil_image())
+        back = np.asarray(ArrayImageRenderer(
+            draft, side='back', **kwargs).make_pil_image())
+        # The back is mirrored, and shows the other thread everywhere.
+        drawdown = draft.compute_drawdown()
+        for x, column in enumerate(drawdown):
+            for y, thread in enumerate(column):
+                other = draft.weft[y] if thread is draft.warp[x] \
+                    else draft.warp[x]
+                self.assertEqual(tuple(face[y, x]), thread.color.rgb)
+                self.assertEqual(tuple(back[y, -1 - x]), other.color.rgb)
+
+        both = ArrayImageRenderer(draft, side='both', **kwargs)
+        pixels = np.asarray(both.make_pil_image())
+        ends = len(draft.warp)
+        self.assertEqual(pixels.shape[1], (2 * ends) + 2)
+        self.assertTrue((pixels[:, :ends] == face).all())
+        self.assertTrue((pixels[:, ends:ends + 2] == 255).all())
+        self.assertTrue((pixels[:, ends + 2:] == back).all())
+        self.assertEqual(both.make_drawdown_image(palette=True).mode, 'P')
+
+        self.assert_same_pixels(draft, side='back')
+        self.assert_same_pixels(draft, side='both', liftplan=True)
+
+    def test_svg_both_sides(self):
+        draft = twill()
+        draft.repeat(3)
+        for cls in (SVGRenderer, CompactSVGRenderer):
+            face = cls(draft)
+            both = cls(draft, side='both')
+            self.assertEqual(both.view_box()[2],
+                             (2 * face.view_box()[2]) + 20)
+            root = ElementTree.fromstring(both.make_svg_doc())
+            ids = [el.get('id') for el in root.iter() if el.get('id')]
+            self.assertEqual(len(ids), len(set(ids)))
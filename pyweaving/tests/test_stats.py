@@ -0,0 +1,86 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+import numpy as np
+
+from .. import Color, Draft
+from ..arrays import DraftArrays
+from ..generators.twill import twill
+from ..render import ArrayImageRenderer, ImageRenderer
+from ..stats import DraftStats, YarnUsage
+
+
+class TestStats(TestCase):
+
+    def test_twill(self):
+        draft = twill()
+        draft.repeat(3)
+        stats = DraftStats(draft)
+        self.assertEqual(stats.warp_threads, len(draft.warp))
+        self.assertEqual(stats.shafts, 4)
+        self.assertEqual((stats.warp_unit, stats.weft_unit), (4, 4))
+        self.assertEqual(stats.warp_reps, len(draft.warp) / 4)
+        self.assertEqual(stats.heddles, [len(draft.warp) // 4] * 4)
+        self.assertEqual(stats.longest_floats,
+                         DraftArrays(draft).longest_floats())
+        self.assertEqual(stats.selvedges_continuous,
+                         draft.selvedges_continuous())
+        self.assertEqual(stats.as_dict()['heddles'], stats.heddles)
+        self.assertEqual(len(stats.rows()), 12)
+
+    def test_selvedges(self):
+        draft = Draft(num_shafts=2, num_treadles=2)
+        draft.treadles[0].shafts.add(draft.shafts[0])
+        draft.treadles[1].shafts.add(draft.shafts[1])
+        for shaft in (0, 1, 1, 0, 1):
+            draft.add_warp_thread(color=Color((255, 255, 255)), shaft=shaft)
+        for treadle in (0, 1, 1, 0):
+            draft.add_weft_thread(color=Color((0, 0, 200)),
+                                  treadles=[treadle])
+        draft.warp[0].shaft = None
+        for start_at_lowest_thread in (False, True):
+            draft.start_at_lowest_thread = start_at_lowest_thread
+            stats = DraftStats(draft)
+            self.assertEqual(stats.low_selvedge,
+                             draft.selvedge_continuous(True))
+            self.assertEqual(stats.high_selvedge,
+                             draft.selvedge_continuous(False))
+        self.assertEqual(stats.heddles, [1, 3])
+
+    def test_stats_panel(self):
+        draft = twill()
+        for renderer_class in (ImageRenderer, ArrayImageRenderer):
+            plain = renderer_class(draft).make_pil_image()
+            im = renderer_class(draft, stats=True).make_pil_image()
+            self.assertGreater(im.width, plain.width)
+            self.assertEqual(im.crop((0, 0) + plain.size).tobytes(),
+                             plain.tobytes())
+
+    def test_yarn_usage(self):
+        draft = Draft(num_shafts=2, num_treadles=2)
+        draft.treadles[0].shafts.add(draft.shafts[0])
+        draft.treadles[1].shafts.add(draft.shafts[1])
+        white, blue = Color((255, 255, 255)), Color((0, 0, 200))
+        for shaft in (0, 0, 0, 1):
+            draft.add_warp_thread(color=white, shaft=shaft)
+        for treadle in (0, 0, 1):
+            draft.add_weft_thread(color=blue, treadles=[treadle])
+        usage = YarnUsage(draft, take_up=0)
+        self.assertFalse(usage.known)
+        self.assertIsNone(usage.warp_yards)
+        self.assertEqual(usage.ends.tolist(), [4, 0])
+        self.assertEqual(usage.picks.tolist(), [0, 3])
+        # Three ends are up in two picks, and one in the other.
+        self.assertEqual(usage.face_fraction.tolist(), [7 / 12, 5 / 12])
+
+        usage = YarnUsage(draft, epi=4, ppi=6, take_up=(0.5, 0),
+                          repeats=2, loom_waste=6)
+        self.assertEqual((usage.cloth_width, usage.cloth_length), (1, 1))
+        np.testing.assert_allclose(usage.face_area, [7 / 24 * 2, 5 / 24 * 2])
+        np.testing.assert_allclose(usage.warp_yards, [4 * (1.5 + 6) / 36, 0])
+        np.testing.assert_allclose(usage.weft_yards, [0, 6 / 36])
+        colors = usage.colors()
+        self.assertEqual(colors[1]['color'], '#0000c8')
+        self.assertEqual(colors[1]['picks'], 6)
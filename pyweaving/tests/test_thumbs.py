@@ -0,0 +1,81 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+
+from .. import formats
+from ..generators import twill
+from ..thumbs import make_thumbnail, make_thumbnails, read_index
+
+
+class TestThumbs(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.drafts = os.path.join(self.dir, 'drafts')
+        self.thumbs = os.path.join(self.dir, 'thumbs')
+        os.makedirs(os.path.join(self.drafts, 'sub'))
+        for name, size in (('a.wif', 2), ('sub/b.wif.gz', 3)):
+            formats.save_draft(twill.twill(size),
+                               os.path.join(self.drafts, name))
+        with open(os.path.join(self.drafts, 'bad.wif'), 'w') as f:
+            f.write('[WIF]\nVersion=1.1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_make_thumbnail(self):
+        draft = twill.twill()
+        draft.repeat(100)
+        for size in (32, 100):
+            im = make_thumbnail(draft, size)
+            self.assertEqual(im.size, (size, size))
+
+    def test_make_thumbnails(self):
+        results = make_thumbnails([self.drafts], self.thumbs, size=48,
+                                  workers=1)
+        self.assertEqual([r['status'] for r in results],
+                         ['ok', 'error', 'ok'])
+        mode = os.stat(os.path.join(self.thumbs, 'index.json')).st_mode
+        self.assertEqual(mode & 0o777, 0o644)
+        index = read_index(self.thumbs)
+        self.assertEqual(index['size'], 48)
+        entries = index['thumbnails']
+        self.assertEqual(sorted(entries),
+                         ['a.wif', os.path.join('sub', 'b.wif.gz')])
+        entry = entries['a.wif']
+        self.assertEqual(entry['ends'], len(twill.twill(2).warp))
+        self.assertTrue(entry['image'].startswith('data:image/png;base64,'))
+        self.assertTrue(os.path.exists(os.path.join(self.thumbs,
+                                                    entry['thumbnail'])))
+
+        # Unchanged drafts are skipped, changed ones remade, and removed
+        # ones dropped from the index.
+        formats.save_draft(twill.twill(4), os.path.join(self.drafts, 'a.wif'))
+        os.remove(os.path.join(self.drafts, 'sub', 'b.wif.gz'))
+        results = make_thumbnails([self.drafts], self.thumbs, size=48,
+                                  workers=1)
+        self.assertEqual([r['status'] for r in results], ['ok', 'error'])
+        results = make_thumbnails([self.drafts], self.thumbs, size=48,
+                                  workers=1)
+        self.assertEqual(results[0]['status'], 'skipped')
+        entries = read_index(self.thumbs)['thumbnails']
+        self.assertEqual(list(entries), ['a.wif'])
+        self.assertEqual(entries['a.wif']['ends'], len(twill.twill(4).warp))
+
+        # A new size remakes them all.
+        results = make_thumbnails([self.drafts], self.thumbs, size=32,
+                                  workers=1)
+        self.assertEqual(results[0]['status'], 'ok')
+
+    def test_thumbnails_among_drafts(self):
+        # The index is JSON, but it isn't one of the drafts.
+        thumbs = os.path.join(self.drafts, 'thumbs')
+        for ii in range(2):
+            results = make_thumbnails([self.drafts], thumbs, size=48,
+                                      workers=1)
+            self.assertEqual(len(results), 3)
+        self.assertEqual(sorted(read_index(thumbs)['thumbnails']),
+                         ['a.wif', os.path.join('sub', 'b.wif.gz')])
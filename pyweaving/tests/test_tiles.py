@@ -0,0 +1,94 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from ..generators.twill import twill
+from ..tiles import TileRenderer
+
+
+class TestTiles(TestCase):
+
+    def make_renderer(self, **kwargs):
+        draft = twill()
+        draft.repeat(6)
+        return TileRenderer(draft, tile_size=32, **kwargs)
+
+    def test_tiles_match_drawdown(self):
+        renderer = self.make_renderer()
+        full = renderer.arrays.render_drawdown(renderer.scale,
+                                               renderer.foreground)
+        level = renderer.max_level
+        cols, rows = renderer.level_tiles(level)
+        stitched = np.zeros_like(full)
+        for row in range(rows):
+            for col in range(cols):
+                tile = np.asarray(renderer.tile(level, col, row))
+                y = row * renderer.tile_size
+                x = col * renderer.tile_size
+                stitched[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+        self.assertTrue((stitched == full).all())
+
+    def test_level_sizes(self):
+        renderer = self.make_renderer()
+        self.assertEqual(renderer.level_size(renderer.max_level),
+                         (renderer.width, renderer.height))
+        self.assertEqual(renderer.level_size(0), (1, 1))
+        for level in range(renderer.max_level + 1):
+            width, height = renderer.level_size(level)
+            cols, rows = renderer.level_tiles(level)
+            last = renderer.tile(level, cols - 1, rows - 1)
+            self.assertEqual(
+                ((cols - 1) * renderer.tile_size + last.size[0],
+                 (rows - 1) * renderer.tile_size + last.size[1]),
+                (width, height))
+
+    def test_missing_tile(self):
+        renderer = self.make_renderer()
+        with self.assertRaises(IndexError):
+            renderer.tile(renderer.max_level, 100, 0)
+
+    def test_save_layouts(self):
+        renderer = self.make_renderer(overlap=1)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            renderer.save_deepzoom(os.path.join(tmpdir, 'twill.dzi'))
+            with open(os.path.join(tmpdir, 'twill.dzi')) as f:
+                self.assertIn('TileSize="32"', f.read())
+            self.assertTrue(os.path.exists(
+                os.path.join(tmpdir, 'twill_files', '0', '0_0.png')))
+
+            renderer.save_xyz(os.path.join(tmpdir, 'xyz'))
+            top = os.path.join(tmpdir, 'xyz', str(renderer.max_zoom))
+            self.assertEqual(len(os.listdir(top)),
+                             renderer.level_tiles(renderer.max_level)[0])
+            self.assertEqual(
+                renderer.xyz_tile(0, 0, 0).size, (32, 32))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_save_parallel(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            self.make_renderer().save_deepzoom(
+                os.path.join(tmpdir, 'serial.dzi'))
+            self.make_renderer(workers=4).save_deepzoom(
+                os.path.join(tmpdir, 'parallel.dzi'))
+            serial = os.path.join(tmpdir, 'serial_files')
+            parallel = os.path.join(tmpdir, 'parallel_files')
+            for level in os.listdir(serial):
+                names = sorted(os.listdir(os.path.join(serial, level)))
+                self.assertEqual(
+                    names, sorted(os.listdir(os.path.join(parallel, level))))
+                for name in names:
+                    with open(os.path.join(serial, level, name), 'rb') as f:
+                        expected = f.read()
+                    with open(os.path.join(parallel, level, name), 'rb') as f:
+                        self.assertEqual(f.read(), expected)
+        finally:
+            shutil.rmtree(tmpdir)
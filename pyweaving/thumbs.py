@@ -0,0 +1,182 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import base64
+import hashlib
+import io
+import os
+import os.path
+import tempfile
+
+from PIL import Image
+
+from . import batch
+from .arrays import DraftArrays, as_rgb
+from .compact import dumps, loads
+from .formats import load_draft
+from .images import encode_image
+
+
+# Name of the thumbnail index, in the thumbnail directory.
+index_name = 'index.json'
+
+
+def file_hash(path):
+    """
+    Return the SHA-256 hex digest of a file's bytes, to tell whether it has
+    changed without parsing it.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_thumbnail(draft, size=128, background=(255, 255, 255)):
+    """
+    Return a ``size`` pixel square thumbnail of a draft's drawdown, as a PIL
+    image. The drawdown is painted at one pixel per square, straight from
+    its ``DraftArrays``, then scaled to fit: up by a whole number of pixels
+    per square for small drafts, so they stay crisp, or down for large ones.
+    Only the first ``4 * size`` ends and picks are painted, so the cost is
+    bounded however large the draft is.
+    """
+    arrays = DraftArrays(draft)
+    limit = 4 * size
+    ends = min(arrays.num_ends, limit)
+    picks = min(arrays.num_picks, limit)
+    thumb = Image.new('RGB', (size, size), tuple(as_rgb(background)))
+    if not (ends and picks):
+        return thumb
+    im = Image.fromarray(arrays.sample_colors(slice(0, ends),
+                                              slice(0, picks)))
+    factor = max(1, size // max(ends, picks))
+    if factor > 1:
+        im = im.resize((ends * factor, picks * factor), Image.NEAREST)
+    if max(im.size) > size:
+        scale = size / max(im.size)
+        im = im.resize((max(1, int(round(im.width * scale))),
+                        max(1, int(round(im.height * scale)))), Image.BOX)
+    thumb.paste(im, ((size - im.width) // 2, (size - im.height) // 2))
+    return thumb
+
+
+def thumb_path(relpath, outdir):
+    return batch.output_path(relpath, outdir, 'png')
+
+
+def thumb_one(job):
+    """
+    Make the thumbnail of a single draft. ``job`` is a tuple of ``(infile,
+    outfile, options)``, where ``options`` may hold the ``hash`` of the file
+    when its thumbnail was last made: if the file still has that hash, and
+    the thumbnail exists, it is skipped. Returns a result dict, with the
+    thumbnail's index entry for new thumbnails.
+    """
+    infile, outfile, options = job
+    try:
+        digest = file_hash(infile)
+        if (not options.get('force') and digest == options.get('hash') and
+                os.path.exists(outfile)):
+            return {'infile': infile, 'outfile': outfile,
+                    'status': 'skipped', 'hash': digest}
+        draft = load_draft(infile)
+        data = encode_image(make_thumbnail(draft, options.get('size', 128)),
+                            'png')
+        outdir = os.path.dirname(outfile)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        with open(outfile, 'wb') as f:
+            f.write(data)
+    except Exception as exc:
+        return batch.error_result(infile, exc)
+    return {
+        'infile': infile,
+        'outfile': outfile,
+        'status': 'ok',
+        'hash': digest,
+        'entry': {
+            'title': draft.title,
+            'ends': len(draft.warp),
+            'picks': len(draft.weft),
+            'shafts': len(draft.shafts),
+            'image': 'data:image/png;base64,' +
+                     base64.b64encode(data).decode('ascii'),
+        },
+    }
+
+
+def read_index(outdir):
+    """
+    Return the thumbnail index in ``outdir``, or an empty one.
+    """
+    try:
+        with io.open(os.path.join(outdir, index_name), 'rb') as f:
+            return loads(f.read())
+    except (OSError, IOError, ValueError):
+        return {'size': None, 'thumbnails': {}}
+
+
+def thumbnail_inputs(inputs, outdir):
+    """
+    Expand ``inputs`` as ``batch.expand_inputs()`` does, leaving out the
+    index in ``outdir``, which is JSON but not a draft.
+    """
+    return batch.expand_inputs(inputs,
+                               exclude=[os.path.join(outdir, index_name)])
+
+
+def make_thumbnails(inputs, outdir, size=128, workers=None, force=False,
+                    progress=None, found=None):
+    """
+    Make a ``size`` pixel thumbnail of every draft found in ``inputs``
+    (filenames, directories or glob patterns, as for
+    ``batch.expand_inputs()``), across a process pool of ``workers``.
+    Thumbnails are written to ``outdir`` as PNG files, laid out like the
+    inputs, with an index of them all, ``index.json``. If the inputs have
+    already been expanded by ``thumbnail_inputs()``, pass them as ``found``.
+
+    The index maps each draft's relative path to its title, size, file hash
+    and thumbnail, inline as a data URI, so a UI can show every thumbnail
+    after loading just the index. Drafts whose files haven't changed since
+    their thumbnails were made are skipped, unless ``force`` is set, and
+    drafts which are gone are dropped from the index. Returns the result
+    dicts, as ``batch.run_batch()`` does.
+    """
+    old = read_index(outdir)
+    if old.get('size') != size:
+        force = True
+    entries = old.get('thumbnails', {})
+    jobs = []
+    relpaths = []
+    if found is None:
+        found = thumbnail_inputs(inputs, outdir)
+    for path, relpath in found:
+        entry = entries.get(relpath, {})
+        options = {'size': size, 'force': force, 'hash': entry.get('hash')}
+        jobs.append((path, thumb_path(relpath, outdir), options))
+        relpaths.append(relpath)
+    results = batch.run_batch(thumb_one, jobs, workers=workers,
+                              progress=progress)
+
+    thumbnails = {}
+    for relpath, result in zip(relpaths, results):
+        if result['status'] == 'skipped':
+            thumbnails[relpath] = entries[relpath]
+        elif result['status'] == 'ok':
+            entry = dict(result.pop('entry'))
+            entry['hash'] = result['hash']
+            entry['thumbnail'] = os.path.relpath(result['outfile'], outdir)
+            thumbnails[relpath] = entry
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    index = {'size': size, 'thumbnails': thumbnails}
+    # Write atomically, so a UI never loads a partial index. Temporary files
+    # are private, but the index is as readable as the thumbnails.
+    fd, tmp_path = tempfile.mkstemp(dir=outdir, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(dumps(index).encode('utf-8'))
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, os.path.join(outdir, index_name))
+    return results
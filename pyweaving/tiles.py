@@ -0,0 +1,221 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import math
+import os
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .arrays import DraftArrays
+from .images import encode_image, save_image
+
+
+dzi_template = '''<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="http://schemas.microsoft.com/deepzoom/2008"
+  Format="{format}" Overlap="{overlap}" TileSize="{tile_size}">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+'''
+
+
+class TileRenderer(object):
+    """
+    Render the drawdown of a draft as a pyramid of fixed-size tiles, so huge
+    drafts can be panned and zoomed while only rendering what is visible.
+
+    Level numbering follows DeepZoom: the highest level is the drawdown at
+    ``scale`` pixels per square (as painted by ``ImageRenderer``), and each
+    level below it is half the size, down to a single pixel at level 0.
+    Tiles are rendered on demand, each in memory proportional to the tile
+    size rather than the draft size. Whole pyramids are saved across a pool
+    of ``workers`` threads.
+    """
+    def __init__(self, draft, scale=10, tile_size=256, overlap=0,
+                 format='png', foreground=(127, 127, 127),
+                 background=(255, 255, 255), workers=1):
+        self.arrays = DraftArrays(draft)
+        self.scale = scale
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.format = format
+        self.foreground = foreground
+        self.background = background
+        self.workers = workers
+        self.width, self.height = self.arrays.drawdown_size(scale)
+        self.max_level = int(math.ceil(math.log(max(self.width, self.height),
+                                                2)))
+
+    def level_size(self, level):
+        """
+        Return the ``(width, height)`` of the image at a pyramid level.
+        """
+        factor = 2 ** (self.max_level - level)
+        return (int(math.ceil(self.width / factor)),
+                int(math.ceil(self.height / factor)))
+
+    def level_tiles(self, level):
+        """
+        Return the number of ``(columns, rows)`` of tiles at a level.
+        """
+        width, height = self.level_size(level)
+        return (int(math.ceil(width / self.tile_size)),
+                int(math.ceil(height / self.tile_size)))
+
+    def tile_box(self, level, col, row):
+        """
+        Return the ``(startx, starty, endx, endy)`` pixels of a level covered
+        by a tile, including the overlap with its neighbours.
+        """
+        width, height = self.level_size(level)
+        startx = col * self.tile_size
+        starty = row * self.tile_size
+        endx = min(width, startx + self.tile_size + self.overlap)
+        endy = min(height, starty + self.tile_size + self.overlap)
+        return (max(0, startx - self.overlap), max(0, starty - self.overlap),
+                endx, endy)
+
+    def render_box(self, level, box):
+        """
+        Render any box of pixels at a pyramid level as a PIL image.
+        """
+        startx, starty, endx, endy = box
+        factor = 2 ** (self.max_level - level)
+        size = (endx - startx, endy - starty)
+        if factor <= self.scale:
+            # Squares are at least a pixel: paint at full scale and reduce.
+            pixels = self.arrays.render_drawdown(
+                self.scale, self.foreground,
+                (startx * factor, starty * factor,
+                 min(self.width, endx * factor),
+                 min(self.height, endy * factor)))
+            im = Image.fromarray(pixels)
+            if factor > 1:
+                im = im.reduce(factor)
+            return im
+
+        # Several squares per pixel: sample every Nth interlacement instead of
+        # painting the whole area, then average down to size.
+        squares_per_pixel = factor / self.scale
+        step = int(squares_per_pixel)
+        ends = slice(int(startx * squares_per_pixel),
+                     min(self.arrays.num_ends,
+                         int(math.ceil(endx * squares_per_pixel))),
+                     step)
+        picks = slice(int(starty * squares_per_pixel),
+                      min(self.arrays.num_picks,
+                          int(math.ceil(endy * squares_per_pixel))),
+                      step)
+        colors = self.arrays.sample_colors(ends, picks)
+        if not colors.size:
+            return Image.new('RGB', size, self.foreground)
+        im = Image.fromarray(colors)
+        if im.size != size:
+            im = im.resize(size, Image.BOX)
+        return im
+
+    def tile(self, level, col, row):
+        """
+        Render a single DeepZoom tile as a PIL image. Tiles on the right and
+        bottom edges of a level may be smaller than ``tile_size``.
+        """
+        cols, rows = self.level_tiles(level)
+        if not (0 <= level <= self.max_level and 0 <= col < cols and
+                0 <= row < rows):
+            raise IndexError("no tile %d/%d_%d" % (level, col, row))
+        return self.render_box(level, self.tile_box(level, col, row))
+
+    @property
+    def max_zoom(self):
+        """
+        The highest XYZ zoom. Zoom 0 is the level at which the whole
+        drawdown fits into a single tile.
+        """
+        return max(0, int(math.ceil(math.log(
+            max(self.width, self.height) / self.tile_size, 2))))
+
+    def xyz_tile(self, z, x, y):
+        """
+        Render an XYZ ("slippy map") tile. These are always ``tile_size``
+        square, padded with the background color past the drawdown's edges.
+        """
+        level = self.max_level - self.max_zoom + z
+        im = self.tile(level, x, y)
+        if im.size != (self.tile_size, self.tile_size):
+            padded = Image.new('RGB', (self.tile_size, self.tile_size),
+                               self.background)
+            padded.paste(im, (0, 0))
+            im = padded
+        return im
+
+    def tile_bytes(self, im):
+        return encode_image(im, self.format)
+
+    def dzi(self):
+        """
+        Return the DeepZoom ``.dzi`` descriptor for the pyramid.
+        """
+        return dzi_template.format(format=self.format, overlap=self.overlap,
+                                   tile_size=self.tile_size,
+                                   width=self.width, height=self.height)
+
+    def iter_tiles(self, min_level=0):
+        """
+        Iterate over ``(level, col, row)`` for every tile in the pyramid,
+        from the most detailed level down.
+        """
+        for level in range(self.max_level, min_level - 1, -1):
+            cols, rows = self.level_tiles(level)
+            for row in range(rows):
+                for col in range(cols):
+                    yield level, col, row
+
+    def save_tiles(self, jobs):
+        """
+        Render and save ``(path, render_tile, args)`` jobs, calling
+        ``render_tile(*args)`` for each tile. Directories are made first, then
+        tiles are rendered and written one at a time by each worker.
+        """
+        for path, render_tile, args in jobs:
+            dirname = os.path.dirname(path)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+
+        def save_tile(job):
+            path, render_tile, args = job
+            save_image(render_tile(*args), path, format=self.format)
+
+        if self.workers <= 1:
+            for job in jobs:
+                save_tile(job)
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(save_tile, jobs))
+
+    def save_deepzoom(self, filename):
+        """
+        Write the pyramid in DeepZoom layout: a ``name.dzi`` descriptor, and
+        tiles in ``name_files/<level>/<col>_<row>.<format>``. Tiles are
+        streamed to disk one at a time.
+        """
+        base = os.path.splitext(filename)[0]
+        tiles_dir = base + '_files'
+        self.save_tiles([
+            (os.path.join(tiles_dir, str(level),
+                          '%d_%d.%s' % (col, row, self.format)),
+             self.tile, (level, col, row))
+            for level, col, row in self.iter_tiles()])
+        with open(base + '.dzi', 'w') as f:
+            f.write(self.dzi())
+
+    def save_xyz(self, dirname):
+        """
+        Write the pyramid in XYZ layout: ``<z>/<x>/<y>.<format>``.
+        """
+        first_level = self.max_level - self.max_zoom
+        self.save_tiles([
+            (os.path.join(dirname, str(level - first_level), str(x),
+                          '%d.%s' % (y, self.format)),
+             self.xyz_tile, (level - first_level, x, y))
+            for level, x, y in self.iter_tiles(min_level=first_level)])
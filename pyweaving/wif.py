@@ -1,24 +1,45 @@
 #from __future__ import (absolute_import, division, print_function,
 #                        unicode_literals)
 
+from six.moves import StringIO
 from six.moves.configparser import RawConfigParser
 
 from pyweaving import Draft, __version__
+from pyweaving.formats import read_text, write_text
+
+
+class WIFError(ValueError):
+    """
+    Raised when a WIF document can't be interpreted as a draft. Use
+    ``pyweaving.lint`` for a full list of problems in a document.
+    """
+    pass
+
+
 class WIFReader(object):
     """
-    A reader for a specific WIF file.
+    A reader for a specific WIF document. ``source`` may be a filename, a
+    bytes-like object (bytes, bytearray or memoryview), or a file-like object
+    opened in text or binary mode, so uploads can be parsed without being
+    written to disk first.
     """
 
     # TODO
     # - add support for metadata: author, notes, etc.
-    # - add support for warp/weft spacing and thickness
     # - ensure that we're correctly handling the 'palette form' (might be only
     # RGB?)
 
     allowed_units = ('decipoints', 'inches', 'centimeters')
 
-    def __init__(self, filename):
-        self.filename = filename
+    # Thread sizes are converted to inches.
+    inches_per_unit = {
+        'decipoints': 1 / 720,
+        'inches': 1.0,
+        'centimeters': 1 / 2.54,
+    }
+
+    def __init__(self, source):
+        self.source = source
 
     def getbool(self, section, option):
         if self.config.has_option(section, option):
@@ -26,6 +47,60 @@ class WIFReader(object):
         else:
             return False
 
+    def line_of(self, section, key):
+        """
+        Return the line number of an entry in the document, for error
+        messages, or None if it can't be found.
+        """
+        in_section = False
+        for line_no, line in enumerate(self.text.splitlines(), start=1):
+            line = line.strip()
+            if line.startswith('['):
+                in_section = line[1:].rstrip(']').strip().upper() == section
+            elif in_section and line.split('=', 1)[0].strip() == key:
+                return line_no
+        return None
+
+    def getints(self, section, key, value):
+        """
+        Parse an entry holding a comma separated list of numbers, as in
+        THREADING or TIEUP. An empty value is an empty list, as
+        ``pyweaving.lint`` has it.
+        """
+        value = value.strip()
+        if not value:
+            return []
+        try:
+            return [int(el) for el in value.split(',')]
+        except ValueError:
+            raise WIFError("can't parse %s=%s in [%s] on line %s" % (
+                key, value, section, self.line_of(section, key)))
+
+    def thread_sizes(self, dir, units):
+        """
+        Return a function giving the ``(spacing, thickness)`` of a warp or
+        weft thread number in inches, from the per-thread ``<DIR> SPACING``
+        and ``<DIR> THICKNESS`` sections or the defaults in the ``<DIR>``
+        section. Sizes which aren't given are None.
+        """
+        factor = self.inches_per_unit[units]
+        sizes = []
+        for key in ('Spacing', 'Thickness'):
+            default = None
+            if self.config.has_option(dir, key):
+                default = self.config.getfloat(dir, key) * factor
+            section = '%s %s' % (dir, key.upper())
+            per_thread = {}
+            if self.getbool('CONTENTS', section):
+                for thread_no, value in self.config.items(section):
+                    per_thread[int(thread_no)] = float(value) * factor
+            sizes.append((default, per_thread))
+
+        def lookup(thread_no):
+            return tuple(per_thread.get(thread_no, default)
+                         for default, per_thread in sizes)
+        return lookup
+
     def put_metadata(self, draft):
         draft.date = self.config.get('WIF', 'Date')
         # XXX Name, author, notes, etc.
@@ -33,8 +108,8 @@ class WIFReader(object):
     def put_warp(self, draft, wif_palette):
         warp_thread_count = self.config.getint('WARP', 'Threads')
         warp_units = self.config.get('WARP', 'Units').lower()
-        assert warp_units in self.allowed_units, \
-            "Warp Units of %r is not understood" % warp_units
+        if warp_units not in self.allowed_units:
+            raise WIFError("Warp Units of %r is not understood" % warp_units)
 
         has_warp_colors = self.getbool('CONTENTS', 'WARP COLORS')
 
@@ -46,18 +121,24 @@ class WIFReader(object):
             warp_color_map = None
 
         warp_color = None
+        if self.config.has_option('WARP', 'Color'):
+            # default color for threads missing from the WARP COLORS section
+            warp_color = self.config.getint('WARP', 'Color')
         if not warp_color_map:
-            # try to get warp color from WARP section
             has_warp_colors = False
-            warp_color = self.config.getint('WARP', 'Color')
 
         has_threading = self.getbool('CONTENTS', 'THREADING')
 
         if has_threading:
             threading_map = {}
             for thread_no, value in self.config.items('THREADING'):
-                threading_map[int(thread_no)] = \
-                    [int(sn) for sn in value.split(',')]
+                # An empty entry is an unthreaded end, the same as a
+                # missing one.
+                shaft_nos = self.getints('THREADING', thread_no, value)
+                if shaft_nos:
+                    threading_map[int(thread_no)] = shaft_nos
+
+        sizes = self.thread_sizes('WARP', warp_units)
 
         for thread_no in range(1, warp_thread_count + 1):
             # NOTE: Some crappy software will generate WIFs with way more
@@ -65,7 +146,7 @@ class WIFReader(object):
             # threading. To ignore that, make sure that this thread actually
             # has threading specified: otherwise it's unused.
             if thread_no in threading_map:
-                if has_warp_colors:
+                if has_warp_colors and thread_no in warp_color_map:
                     color = wif_palette[warp_color_map[thread_no]]
                     #color = wif_palette[1]
                     
@@ -75,21 +156,26 @@ class WIFReader(object):
                 if has_threading:
                     shafts = set(draft.shafts[shaft_no - 1]
                                  for shaft_no in threading_map[thread_no])
-                    assert len(shafts) == 1
+                    if len(shafts) != 1:
+                        raise WIFError("warp thread %d is threaded on %d "
+                                       "shafts" % (thread_no, len(shafts)))
                     shaft = list(shafts)[0]
                 else:
                     shaft = None
 
+                spacing, thickness = sizes(thread_no)
                 draft.add_warp_thread(
                     color=color,
                     shaft=shaft,
+                    spacing=spacing,
+                    thickness=thickness,
                 )
 
     def put_weft(self, draft, wif_palette):
         weft_thread_count = self.config.getint('WEFT', 'Threads')
         weft_units = self.config.get('WEFT', 'Units').lower()
-        assert weft_units in self.allowed_units, \
-            "Weft Units of %r is not understood" % weft_units
+        if weft_units not in self.allowed_units:
+            raise WIFError("Weft Units of %r is not understood" % weft_units)
 
         has_weft_colors = self.getbool('CONTENTS', 'WEFT COLORS')
 
@@ -101,10 +187,11 @@ class WIFReader(object):
             weft_color_map = None
 
         weft_color = None
+        if self.config.has_option('WEFT', 'Color'):
+            # default color for threads missing from the WEFT COLORS section
+            weft_color = self.config.getint('WEFT', 'Color')
         if not weft_color_map:
-            # try to get weft color from WEFT section
             has_weft_colors = False
-            weft_color = self.config.getint('WEFT', 'Color')
 
         has_liftplan = self.getbool('CONTENTS', 'LIFTPLAN')
 
@@ -112,24 +199,22 @@ class WIFReader(object):
             liftplan_map = {}
             for thread_no, value in self.config.items('LIFTPLAN'):
                 liftplan_map[int(thread_no)] = \
-                    [int(sn) for sn in value.split(',')]
+                    self.getints('LIFTPLAN', thread_no, value)
 
         has_treadling = self.getbool('CONTENTS', 'TREADLING')
 
         if has_treadling:
             treadling_map = {}
             for thread_no, value in self.config.items('TREADLING'):
-                try:
-                    treadles = [int(tn) for tn in value.split(',')]
-                except ValueError:
-                    pass
-                else:
-                    treadling_map[int(thread_no)] = treadles
+                treadling_map[int(thread_no)] = \
+                    self.getints('TREADLING', thread_no, value)
+
+        sizes = self.thread_sizes('WEFT', weft_units)
 
         for thread_no in range(1, weft_thread_count + 1):
             if (has_liftplan and (thread_no in liftplan_map)) or \
                     (has_treadling and (thread_no in treadling_map)):
-                if has_weft_colors:
+                if has_weft_colors and thread_no in weft_color_map:
                     color = wif_palette[weft_color_map[thread_no]]
                     #color = wif_palette[1]
                 else:
@@ -147,17 +232,19 @@ class WIFReader(object):
                 else:
                     treadles = set()
 
+                spacing, thickness = sizes(thread_no)
                 draft.add_weft_thread(
                     color=color,
                     shafts=shafts,
                     treadles=treadles,
+                    spacing=spacing,
+                    thickness=thickness,
                 )
 
     def put_tieup(self, draft):
         for treadle_no, value in self.config.items('TIEUP'):
             treadle = draft.treadles[int(treadle_no) - 1]
-            shaft_nos = [int(sn) for sn in value.split(',')]
-            for shaft_no in shaft_nos:
+            for shaft_no in self.getints('TIEUP', treadle_no, value):
                 shaft = draft.shafts[shaft_no - 1]
                 treadle.shafts.add(shaft)
 
@@ -165,8 +252,9 @@ class WIFReader(object):
         """
         Perform the actual parsing, and return a Draft instance.
         """
+        self.text = read_text(self.source)
         self.config = RawConfigParser()
-        self.config.read(self.filename)
+        self.config.read_string(self.text)
 
         rising_shed = self.getbool('WEAVING', 'Rising Shed')
         num_shafts = self.config.getint('WEAVING', 'Shafts')
@@ -174,10 +262,10 @@ class WIFReader(object):
 
         liftplan = self.getbool('CONTENTS', 'LIFTPLAN')
         treadling = self.getbool('CONTENTS', 'TREADLING')
-        assert not (liftplan and treadling), \
-            "WIF contains both liftplan and treadling"
-        assert not (liftplan and (num_treadles > 0)), \
-            "WIF contains liftplan and non-zero treadle count"
+        if liftplan and treadling:
+            raise WIFError("WIF contains both liftplan and treadling")
+        if liftplan and (num_treadles > 0):
+            raise WIFError("WIF contains liftplan and non-zero treadle count")
 
         if self.getbool('CONTENTS', 'COLOR PALETTE'):
             palette_range = self.config.get('COLOR PALETTE', 'Range')
@@ -286,6 +374,18 @@ class WIFWriter(object):
                        str(ii),
                        wif_palette[thread.color.rgb])
 
+        for attr in ('spacing', 'thickness'):
+            section = '%s %s' % (dir, attr.upper())
+            values = [(ii, getattr(thread, attr))
+                      for ii, thread in enumerate(threads, start=1)]
+            values = [(ii, value) for ii, value in values
+                      if value is not None]
+            if values:
+                config.set('CONTENTS', section, 1)
+                config.add_section(section)
+                for ii, value in values:
+                    config.set(section, str(ii), '%.6g' % value)
+
     def write_threading(self, config):
         config.set('CONTENTS', 'THREADING', 1)
         config.add_section('THREADING')
@@ -325,7 +425,10 @@ class WIFWriter(object):
             shaft_string = ','.join([str(shaft_no) for shaft_no in shaft_nos])
             config.set('TIEUP', str(ii), shaft_string)
 
-    def write(self, filename, liftplan=False):
+    def dumps(self, liftplan=False):
+        """
+        Return the WIF document for the draft as a string.
+        """
         assert self.draft.start_at_lowest_thread
 
         config = RawConfigParser()
@@ -345,5 +448,13 @@ class WIFWriter(object):
             self.write_treadling(config)
             self.write_tieup(config)
 
-        with open(filename, 'wb') as f:
-            config.write(f)
+        f = StringIO()
+        config.write(f)
+        return f.getvalue()
+
+    def write(self, target, liftplan=False):
+        """
+        Write the WIF document to ``target``, a filename or a file-like object
+        opened in text or binary mode.
+        """
+        write_text(target, self.dumps(liftplan=liftplan))
@@ -25,6 +25,7 @@ setup(name='pyweaving',
       install_requires=[
           'Pillow>=2.1.0',      # Provides PIL
           'six>=1.5.2',
+          'numpy>=1.17',
       ],
       license='MIT',
       packages=find_packages(),